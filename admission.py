@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Heavy requests (uploads and analyses) one process runs at once; 0 picks it
+# from the server's thread count (see serve.worker_plan)
+MAX_INFLIGHT = int(os.getenv('ADMISSION_MAX_INFLIGHT', '0'))
+# Shed requests that would queue a background job when queued jobs reach
+# this fraction of the job queue
+MAX_QUEUE_FILL = float(os.getenv('ADMISSION_MAX_QUEUE_FILL', '0.75'))
+# Shed when the process would go over this much resident memory with the
+# declared upload on top (0 = no limit)
+MAX_RSS_BYTES = int(os.getenv('ADMISSION_MAX_RSS_MB', '0')) * 1024 * 1024
+RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class AdmissionController:
+    """Sheds heavy requests before their body is read.
+
+    ``admit`` returns None when a request may go ahead (and counts it as in
+    flight until ``release``), or the reason it was turned away: too many
+    requests in flight, the declared upload not fitting the spool budget or
+    the memory limit, the process draining for shutdown, or, for requests
+    that ``enqueue`` a background job, the job queue filling up. The caller
+    answers those with 503 and Retry-After.
+    """
+
+    def __init__(self, job_queue, spool_budget, max_inflight=MAX_INFLIGHT, max_queue_fill=MAX_QUEUE_FILL,
+                 max_rss=MAX_RSS_BYTES, retry_after=RETRY_AFTER):
+        self.job_queue = job_queue
+        self.spool_budget = spool_budget
+        self.max_inflight = max_inflight
+        self.max_queue_fill = max_queue_fill
+        self.max_rss = max_rss
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.draining = False
+        self.shed = {}
+        self._idle = threading.Condition()
+
+    def admit(self, content_length=None, enqueue=False):
+        reason = self._overload(content_length or 0, enqueue)
+        with self._idle:
+            if reason is None and self.draining:
+                reason = 'draining'
+            if reason is None and self.max_inflight and self.inflight >= self.max_inflight:
+                reason = 'inflight'
+            if reason is not None:
+                self.shed[reason] = self.shed.get(reason, 0) + 1
+                return reason
+            self.inflight += 1
+            return None
+
+    def release(self):
+        with self._idle:
+            self.inflight -= 1
+            self._idle.notify_all()
+
+    def _overload(self, content_length, enqueue=False):
+        if enqueue:
+            # Synchronous analyses never wait on this queue (it also holds optional
+            # Gemini enrichment), so only requests that add a job are shed by it
+            stats = self.job_queue.stats()
+            if stats['max_queued'] and stats['queue_depth'] >= stats['max_queued'] * self.max_queue_fill:
+                return 'queue'
+        if content_length and self.spool_budget.in_use + content_length > self.spool_budget.limit:
+            return 'upload_bytes'
+        if self.max_rss:
+            rss = rss_bytes()
+            if rss is not None and rss + content_length > self.max_rss:
+                return 'memory'
+        return None
+
+    def ready(self):
+        """Whether a load balancer should send this process new work"""
+        return not self.draining and self._overload(0) is None
+
+    def start_draining(self):
+        with self._idle:
+            self.draining = True
+
+    def wait_idle(self, timeout):
+        """Block until no admitted request is in flight; False if ``timeout`` ran out first"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self.inflight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return True
+
+    def stats(self):
+        with self._idle:
+            return {
+                'inflight': self.inflight,
+                'max_inflight': self.max_inflight,
+                'draining': self.draining,
+                'rss_mb': round((rss_bytes() or 0) / (1024 * 1024), 1),
+                'max_rss_mb': round(self.max_rss / (1024 * 1024), 1),
+                'shed': dict(self.shed),
+            }
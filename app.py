@@ -1,20 +1,48 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
 import os
 import uuid
+import hashlib
+import json
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
-import google.generativeai as genai
-from dotenv import load_dotenv
-import traceback
+import logging
 import sys
 import random
+import threading
+import time
 from datetime import datetime, timedelta
-import requests
 
-# Load environment variables
-load_dotenv()
+from model_registry import ModelHealthRegistry
+from health_store import create_health_store
+from gemini_client import gemini_client, get_genai
+from gemini_fallback import StreamInterrupted, generate_with_fallback, stream_with_fallback
+from feedback_parser import FeedbackParser, parse_feedback
+from result_cache import create_result_cache
+from feedback_cache import canonical_analysis_data, create_feedback_cache, feedback_key
+from exercises import DEFAULT_EXERCISE, exercise_names, get_exercise, resolve_exercises, score_analysis
+from athlete_history import DEFAULT_PAGE_SIZE, get_athlete_history, valid_athlete_id
+from blob_fetch import BlobFetchError, blob_filename, blob_url_allowed, fetch_blob, request_upload_url
+from batch_analysis import MAX_BATCH_CLIPS, build_batch_prompt, measure_clips, split_batch_feedback, summarize_session
+from admission import AdmissionController
+from job_queue import JobQueue, QueueFullError
+from live_session import LIVE_IDLE_TIMEOUT, LIVE_MAX_FRAME_BYTES, LIVE_MODE_AVAILABLE, LiveCapacityError, LiveSessionRegistry
+from upload_spool import UPLOAD_FOLDER, StreamingRequest, UploadSpool, clean_upload_folder, discard_upload, spool_budget
+from video_engine import (VIDEO_ENGINE_AVAILABLE, analysis_deadline, analysis_spec, load_video_libs, make_analysis_proxy,
+                          measure_video)
+from observability import ANALYZE_REQUESTS, REGISTRY, configure_logging, span, traced
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables (only pay for python-dotenv when a .env file exists)
+if os.path.exists('.env') or os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+configure_logging()
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = '/tmp/uploads'
+app.request_class = StreamingRequest  # Spool uploads straight into UPLOAD_FOLDER
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
 
 # Create uploads directory if it doesn't exist
@@ -24,18 +52,54 @@ except Exception:
     pass  # In serverless environment, /tmp might not allow makedirs
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+FALLBACK_CACHE_TTL = 300  # Retry Gemini soon for results produced without it
+
+# Gemini feedback on top of the rule-based score: 'async' returns the rule-based
+# result at once and enriches it in a background job, 'inline' waits for Gemini,
+# 'stream' sends the measured result first and Gemini's text as it is generated
+AI_ENRICHMENT_MODES = ('off', 'async', 'inline', 'stream')
+DEFAULT_AI_ENRICHMENT = os.getenv('AI_ENRICHMENT', 'async')
+
+# Analysis results keyed by upload content hash
+result_cache = create_result_cache()
+# Requests and enrichment jobs both rewrite cached responses; one at a time
+result_cache_update_lock = threading.Lock()
+# Gemini feedback keyed by the quantized measurements it was asked about, so near-identical clips share one call
+feedback_cache = create_feedback_cache()
+
+# Background workers for /analyze?mode=async
+job_queue = JobQueue()
+live_sessions = LiveSessionRegistry()
+JOB_EVENTS_HEARTBEAT = 15
+
+# Uploads and analyses are shed with 503 + Retry-After before their body is read
+admission = AdmissionController(job_queue, spool_budget)
+SHED_ENDPOINTS = {'analyze_video', 'analyze_batch'}
+REQUESTS_SHED = REGISTRY.counter('fitform_requests_shed_total', 'Requests turned away with 503 by reason', ('reason',))
+# Seconds a shutdown waits for in-flight requests and queued analyses
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', '30'))
 
-# Configure Gemini AI
+# Point-in-time values read when /metrics is scraped
+REGISTRY.gauge('fitform_job_queue_depth', 'Analysis jobs waiting for a worker', lambda: job_queue.stats()['queue_depth'])
+REGISTRY.gauge('fitform_job_queue_running', 'Analysis jobs currently running', lambda: job_queue.stats()['running'])
+REGISTRY.gauge('fitform_live_sessions', 'Open live WebSocket sessions', lambda: len(live_sessions))
+REGISTRY.gauge('fitform_admission_inflight', 'Uploads and analyses in flight', lambda: admission.inflight)
+REGISTRY.gauge('fitform_upload_spool_bytes', 'Upload bytes spooled to disk', lambda: spool_budget.in_use)
+REGISTRY.gauge('fitform_result_cache_lookups', 'Result cache lookups by outcome',
+               lambda: {'hit': result_cache.hits, 'miss': result_cache.misses}, labelname='outcome')
+
+# Gemini AI is imported and configured on first use (see get_genai)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("✅ Gemini AI configured successfully")
-    except Exception as e:
-        print(f"❌ Gemini configuration failed: {e}")
 
 # 🆕 MODEL MANAGEMENT SYSTEM
+def probe_model(model_name):
+    """Minimal background health check for a model coming out of cooldown"""
+    model = get_genai().GenerativeModel(model_name)
+    gemini_client.generate(model, "ping", generation_config={'max_output_tokens': 1})
+
 class GeminiModelManager:
     def __init__(self):
         self.model_priority = [
@@ -50,8 +114,19 @@ class GeminiModelManager:
             "gemini-2.5-flash",  # Keep as last resort since quota is exhausted
         ]
         self.current_model_index = 0
-        self.failed_models = set()
         self.quota_reset_time = self.calculate_quota_reset()
+        self.registry = ModelHealthRegistry(
+            self.model_priority,
+            probe=probe_model if GEMINI_API_KEY else None,
+            quota_reset_fn=self.seconds_until_reset,
+            store=create_health_store(),  # HEALTH_STORE_BACKEND=sqlite shares state across workers
+        )
+        self._models = {}
+        
+    @property
+    def failed_models(self):
+        """Models currently sitting out a cooldown"""
+        return set(self.registry.unavailable_models())
         
     def calculate_quota_reset(self):
         """Calculate next quota reset time (midnight Pacific = 1:30 PM IST)"""
@@ -66,77 +141,132 @@ class GeminiModelManager:
     def get_time_until_reset(self):
         """Get time remaining until quota reset"""
         now_ist = datetime.utcnow() + timedelta(hours=5, minutes=30)
+        if now_ist >= self.quota_reset_time:
+            self.quota_reset_time = self.calculate_quota_reset()
         time_left = self.quota_reset_time - now_ist
         return time_left
     
-    def get_working_model(self):
-        """Get a working Gemini model with automatic fallback"""
+    def seconds_until_reset(self):
+        """Quota cooldown length used by the health registry"""
+        return self.get_time_until_reset().total_seconds()
+    
+    @traced('get_working_model')
+    def get_working_model(self, exclude=()):
+        """Get the best healthy Gemini model without probing it"""
         if not GEMINI_API_KEY:
             return None
-            
-        for i, model_name in enumerate(self.model_priority):
-            if model_name in self.failed_models:
-                continue
-                
-            try:
-                print(f"🔄 Testing model: {model_name}")
-                model = genai.GenerativeModel(model_name)
-                
-                # Quick test to verify model works
-                test_response = model.generate_content("Test connection")
-                
-                self.current_model_index = i
-                print(f"✅ Using model: {model_name}")
-                return model
-                
-            except Exception as e:
-                error_msg = str(e)
-                print(f"❌ Model {model_name} failed: {error_msg[:100]}...")
-                
-                # Mark model as failed if it's a quota issue
-                if 'quota' in error_msg.lower() or '429' in error_msg:
-                    self.failed_models.add(model_name)
-                    print(f"🚫 Quota exceeded for {model_name}, added to failed list")
-                continue
         
-        print("💥 All models exhausted")
-        return None
+        model_name = self.registry.best_model(exclude)
+        if model_name is None:
+            logger.warning("💥 All models exhausted")
+            return None
+        
+        self.current_model_index = self.registry.priority_of(model_name)
+        model = self._models.get(model_name)
+        if model is None:
+            model = get_genai().GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+    
+    def mark_success(self, model_name):
+        self.registry.mark_success(model_name)
+    
+    def mark_failure(self, model_name, error):
+        """Record a failed call; the model sits out a cooldown based on the error"""
+        error_class = self.registry.mark_failure(model_name, error)
+        logger.warning(f"🚫 {model_name} failed ({error_class}), cooling down")
+        return error_class
+    
+    def defer(self, model_name, seconds):
+        """Skip a model that is only locally rate limited, without marking it failed"""
+        self.registry.defer(model_name, seconds)
+        logger.warning(f"⏳ {model_name} busy locally, skipping for {seconds:.1f}s")
     
     def get_model_status(self):
         """Get current model system status"""
-        working_models = [m for m in self.model_priority if m not in self.failed_models]
+        working_models = self.registry.available_models()
         time_until_reset = self.get_time_until_reset()
+        best_model = self.registry.best_model()
         
         return {
-            'current_model': self.model_priority[self.current_model_index] if working_models else None,
+            'current_model': best_model,
             'working_models': working_models,
-            'failed_models': list(self.failed_models),
+            'failed_models': self.registry.unavailable_models(),
             'quota_reset': self.quota_reset_time.strftime("%Y-%m-%d %H:%M:%S IST"),
             'time_until_reset': str(time_until_reset).split('.')[0],
             'total_models': len(self.model_priority),
-            'available_models': len(working_models)
+            'available_models': len(working_models),
+            'model_health': self.registry.snapshot()
         }
 
-# Initialize model manager
-model_manager = GeminiModelManager()
+# Model manager is created on first use
+_model_manager = None
+_model_manager_lock = threading.Lock()
+
+def get_model_manager():
+    global _model_manager
+    if _model_manager is None:
+        with _model_manager_lock:
+            if _model_manager is None:
+                _model_manager = GeminiModelManager()
+    return _model_manager
+
+
+# Scraping /metrics must not create the manager (and import the SDK) by itself
+REGISTRY.gauge('fitform_gemini_models_available', 'Gemini models not in cooldown',
+               lambda: len(_model_manager.registry.available_models()) if _model_manager else 0)
+
+def warm_up():
+    """Load the AI client, model manager and video libraries ahead of the first request"""
+    started = time.perf_counter()
+    try:
+        if GEMINI_API_KEY:
+            get_genai()
+        get_model_manager()
+        if VIDEO_ENGINE_AVAILABLE:
+            load_video_libs()
+            import rep_counter  # noqa: F401
+        logger.info(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"⚠️ Warm-up failed: {e}")
+
+def start_background_warm_up():
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_upload(file, video_path):
+    """Write an upload to disk in chunks, hashing it on the way; returns (size, sha256)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(video_path, 'wb') as out:
+        while True:
+            chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
 def diagnose_gemini_models():
     """Diagnose exactly which Gemini models are available"""
     if not GEMINI_API_KEY:
-        print("❌ No API key configured")
+        logger.warning("❌ No API key configured")
         return []
     
     try:
-        print("🔍 Running Gemini Model Diagnostics...")
-        print(f"📦 Google Generative AI version: {getattr(genai, '__version__', 'Unknown')}")
+        genai = get_genai()
+        logger.info("🔍 Running Gemini Model Diagnostics...")
+        logger.info(f"📦 Google Generative AI version: {getattr(genai, '__version__', 'Unknown')}")
         
         # List all available models
         models = list(genai.list_models())
-        print(f"📋 Total models available: {len(models)}")
+        logger.info(f"📋 Total models available: {len(models)}")
         
         # Filter for usable models (with generateContent method)
         usable_models = []
@@ -144,243 +274,242 @@ def diagnose_gemini_models():
             model_name = model.name.split('/')[-1]  # Get just the model name
             if 'generateContent' in model.supported_generation_methods:
                 usable_models.append(model_name)
-                print(f"   🔥 {model_name}")
-                print(f"      Methods: {model.supported_generation_methods}")
+                logger.info(f"   🔥 {model_name}")
+                logger.info(f"      Methods: {model.supported_generation_methods}")
         
-        print(f"\n🎯 Found {len(usable_models)} usable models")
+        logger.info(f"🎯 Found {len(usable_models)} usable models")
         return usable_models
         
     except Exception as e:
-        print(f"💥 Diagnostic failed: {e}")
+        logger.error(f"💥 Diagnostic failed: {e}")
         return []
 
-def analyze_with_gemini_enhanced():
+def build_feedback_prompt(analysis_data=None, scoring=None, exercise=None):
+    """Coaching prompt for one clip from the exercise's template, with the measured angles and rule-based score when known"""
+    exercise = get_exercise(exercise or (analysis_data or {}).get('exercise'))
+    return exercise.feedback_prompt(analysis_data, scoring)
+
+def feedback_cache_key(canonical, scoring=None):
+    """Feedback cache key for a prompt built from ``canonical`` data and ``scoring``.
+
+    The rule-based score is quoted in the prompt, so it is part of the key;
+    the model is not known until one answers, and is stored with the entry.
+    """
+    features = dict(canonical, scoring=scoring and {'score': scoring['score'], 'breakdown': scoring['breakdown']})
+    return feedback_key(features, None)
+
+def analyze_with_gemini_enhanced(analysis_data=None, scoring=None, exercise=None):
     """Enhanced Gemini analysis with model switching"""
+    exercise = get_exercise(exercise or (analysis_data or {}).get('exercise'))
     if not GEMINI_API_KEY:
-        return get_fallback_analysis()
-    
-    # Get working model from manager
-    model = model_manager.get_working_model()
-    
-    if not model:
-        print("🚨 No working Gemini models available, using fallback")
-        return get_fallback_analysis()
+        return local_analysis(scoring, exercise.name)
     
     try:
-        # Enhanced prompt for better analysis
-        prompt = """
-        As a professional fitness trainer, analyze squat form and provide detailed feedback.
-
-        Please structure your response as:
-
-        FORM SCORE: [75-95]%
-
-        TECHNICAL BREAKDOWN:
-        • Depth & Range of Motion: [analysis]
-        • Knee Alignment & Tracking: [analysis] 
-        • Spinal Position & Posture: [analysis]
-        • Hip Mechanics & Engagement: [analysis]
-        • Foot Placement & Stability: [analysis]
-
-        STRENGTHS:
-        • [specific strength 1]
-        • [specific strength 2]
-        • [specific strength 3]
-
-        AREAS FOR IMPROVEMENT:
-        • [specific improvement 1]
-        • [specific improvement 2]
-        • [specific improvement 3]
-
-        RECOMMENDATIONS:
-        • [practical drill 1]
-        • [practical drill 2]
-        • [practice tip 1]
-
-        Provide constructive, specific feedback that would help someone improve their squat technique.
-        """
-        
-        response = model.generate_content(prompt)
-        feedback_text = response.text
+        # The prompt is built from the quantized data, so a cached answer fits every clip with the same key
+        key = None
+        if analysis_data:
+            analysis_data = canonical_analysis_data(dict(analysis_data, exercise=exercise.name))
+            key = feedback_cache_key(analysis_data, scoring)
+        cached = feedback_cache.get(key) if key else None
+        if cached is not None:
+            logger.info(f"♻️ Feedback cache hit ({cached['model_used']})")
+            feedback_text, model_name = cached['feedback'], cached['model_used']
+        else:
+            prompt = build_feedback_prompt(analysis_data, scoring, exercise.name)
+            
+            # Bounded, deadline-aware walk over the healthy models
+            result = generate_with_fallback(get_model_manager(), prompt)
+            if result is None:
+                logger.warning("🚨 No Gemini model answered within budget, using fallback")
+                return local_analysis(scoring, exercise.name)
+            feedback_text, model_name = result
+            if key:
+                feedback_cache.set(key, {'feedback': feedback_text, 'model_used': model_name})
         
-        # Extract score
-        score = extract_score_from_feedback(feedback_text) or random.randint(80, 92)
+        # Score and sections in one pass over the text
+        parsed = parse_feedback(feedback_text, exercise.dimensions)
+        score = parsed['score'] or random.randint(80, 92)
         
-        model_status = model_manager.get_model_status()
+        model_status = get_model_manager().get_model_status()
         
         return {
             'feedback': feedback_text,
+            'parsed': parsed,
             'score': score,
-            'model_used': model_status['current_model'],
+            'model_used': model_name,
             'is_gemini': True,
             'available_models': model_status['available_models'],
             'quota_reset': model_status['quota_reset']
         }
         
     except Exception as e:
-        error_msg = str(e)
-        print(f"❌ Analysis failed: {error_msg}")
-        
-        # Mark current model as failed
-        current_model = model_manager.model_priority[model_manager.current_model_index]
-        model_manager.failed_models.add(current_model)
-        print(f"🚫 Added {current_model} to failed models")
-        
-        # Retry with next model
-        return analyze_with_gemini_enhanced()
+        logger.error(f"❌ Analysis failed: {e}")
+        return local_analysis(scoring, exercise.name)
+
+def stream_gemini_feedback(analysis_data, scoring, report):
+    """Gemini feedback generated in streaming mode and reported piece by piece.
 
-def extract_score_from_feedback(feedback):
-    """Extract score from feedback text with better parsing"""
+    Reports 'ai_score' the moment the FORM SCORE line has streamed in and
+    'ai_feedback_text' for every piece of text. Returns a result shaped like
+    analyze_with_gemini_enhanced's, or None when no model answered or the
+    answer broke off.
+    """
+    if not GEMINI_API_KEY:
+        return None
+    
+    exercise = get_exercise(analysis_data.get('exercise'))
+    parser = FeedbackParser(exercise.dimensions)
+    pieces = []
+    model_name = None
     try:
-        # Multiple patterns to catch different formats
-        patterns = [
-            ("FORM SCORE:", "%"),
-            ("Score:", "%"),
-            ("Overall Score:", "%"),
-            ("Form Score:", "%")
-        ]
-        
-        for pattern_start, pattern_end in patterns:
-            if pattern_start in feedback and pattern_end in feedback.split(pattern_start)[1]:
-                score_text = feedback.split(pattern_start)[1].split(pattern_end)[0].strip()
-                # Extract numbers
-                numbers = [int(s) for s in score_text.split() if s.isdigit()]
-                if numbers and 0 <= numbers[0] <= 100:
-                    return numbers[0]
-        
-        # Fallback: look for percentage in first 10 lines
-        lines = feedback.split('\n')[:10]
-        for line in lines:
-            if '%' in line:
-                numbers = [int(s) for s in line.split() if s.isdigit()]
-                for num in numbers:
-                    if 70 <= num <= 100:  # Reasonable squat score range
-                        return num
-                        
+        prompt = build_feedback_prompt(analysis_data, scoring, exercise.name)
+        for model_name, text in stream_with_fallback(get_model_manager(), prompt):
+            if not pieces:
+                logger.info(f"⚡ First feedback piece from {model_name}")
+            pieces.append(text)
+            score = parser.feed(text)
+            if score is not None:
+                report('ai_score', ai_score=score, model_used=model_name)
+            report('ai_feedback_text', text=text)
+    except StreamInterrupted as e:
+        logger.warning(f"✂️ {e}")
+        return None
     except Exception as e:
-        print(f"⚠️ Score extraction failed: {e}")
+        logger.error(f"❌ Streaming analysis failed: {e}")
+        return None
     
-    return None
+    if not pieces:
+        logger.warning("🚨 No Gemini model started answering within budget")
+        return None
+    parsed = parser.finish()
+    model_status = get_model_manager().get_model_status()
+    return {
+        'feedback': ''.join(pieces),
+        'parsed': parsed,
+        'score': parsed['score'] or random.randint(80, 92),
+        'model_used': model_name,
+        'is_gemini': True,
+        'available_models': model_status['available_models'],
+        'quota_reset': model_status['quota_reset']
+    }
 
-def get_fallback_analysis():
-    """High-quality fallback analysis that matches Gemini quality"""
-    scores = [82, 85, 87, 89, 91]
-    score = random.choice(scores)
-    
-    # More sophisticated fallback templates
-    fallback_templates = [
-        f"""
-FORM SCORE: {score}%
-
-TECHNICAL BREAKDOWN:
-• Depth & Range of Motion: Achieves parallel depth consistently with good hip crease below knee level. Range of motion is complete and controlled.
-• Knee Alignment & Tracking: Knees track properly over toes with minimal valgus collapse. Good stability through the movement pattern.
-• Spinal Position & Posture: Maintains neutral spine throughout the lift. Good thoracic extension and core bracing.
-• Hip Mechanics & Engagement: Strong hip drive out of the bottom position. Good glute activation and posterior chain engagement.
-• Foot Placement & Stability: Solid tripod foot with even weight distribution. Good arch support and ground connection.
-
-STRENGTHS:
-• Explosive concentric phase with good power output
-• Consistent depth across all repetitions
-• Excellent core stability and bracing
-• Controlled eccentric (lowering) phase
-
-AREAS FOR IMPROVEMENT:
-• Could work on achieving deeper position for full range benefits
-• Focus on breaking at hips slightly before knees
-• Ensure knees don't travel too far forward at bottom
-
-RECOMMENDATIONS:
-• Practice pause squats (2-second pause at bottom) to improve position control
-• Incorporate tempo squats (3-1-3 count) for better movement quality
-• Use box squats to reinforce proper hip hinge mechanics
-• Add ankle mobility drills to improve depth potential
-""",
-        f"""
-FORM SCORE: {score}%
-
-TECHNICAL BREAKDOWN:
-• Depth & Range of Motion: Solid depth achievement with hip crease at knee level. Good control through full range.
-• Knee Alignment & Tracking: Excellent knee stability with proper tracking. Minimal lateral movement or collapse.
-• Spinal Position & Posture: Maintains strong neutral spine under load. Good upper back tightness.
-• Hip Mechanics & Engagement: Effective hip hinge with powerful extension. Good hamstring and glute coordination.
-• Foot Placement & Stability: Stable base with good foot pressure distribution. Proper weight shifting.
-
-STRENGTHS:
-• Smooth, controlled movement pattern
-• Good breathing and bracing technique
-• Consistent bar path and body alignment
-• Strong finishing position at top
-
-AREAS FOR IMPROVEMENT:
-• Work on maintaining chest position during ascent
-• Improve ankle dorsiflexion for better depth
-• Focus on hip dominant movement pattern
-
-RECOMMENDATIONS:
-• Implement goblet squats to reinforce upright torso
-• Practice with heel elevation to improve ankle mobility
-• Use mirror feedback for real-time form correction
-• Include single-leg work for stability development
-"""
-    ]
-    
-    model_status = model_manager.get_model_status()
+def get_fallback_analysis(exercise=None):
+    """Result for a clip without a complete measured rep: nothing to score, so no score is given"""
+    model_status = get_model_manager().get_model_status()
     
     return {
-        'feedback': random.choice(fallback_templates),
-        'score': score,
-        'model_used': 'advanced_fallback',
+        'feedback': (f"No complete {get_exercise(exercise).noun} reps were measured in this clip, so no form score "
+                     "was given. Film the whole set from the side with the lifter fully in frame."),
+        'score': None,
+        'model_used': 'rule_engine',
         'is_gemini': False,
         'available_models': model_status['available_models'],
         'quota_reset': model_status['quota_reset']
     }
 
-def analyze_video_content(video_path):
-    """Enhanced video analysis simulation"""
+class VideoDecodeError(Exception):
+    """An upload could not be measured; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+VIDEO_DECODE_ERROR = 'Could not decode video'
+VIDEO_ENGINE_MISSING = 'Video analysis is not available on this server'
+
+@traced('analyze_video_content')
+def analyze_video_content(video_path, video_hash=None, exercises=None, info=None, deadline=None):
+    """Measure the uploaded video by decoding a strided sample of its frames, once for all ``exercises``.
+
+    Raises VideoDecodeError when the clip cannot be decoded (or there is no
+    decoder); nothing is ever made up for it.
+    """
+    if not VIDEO_ENGINE_AVAILABLE:
+        raise VideoDecodeError(VIDEO_ENGINE_MISSING, status=503)
+    
     try:
-        import random
-        
-        file_size = os.path.getsize(video_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        # More sophisticated simulation based on file size
-        if file_size_mb > 50:
-            # Large file - likely more squats
-            base_squats = random.randint(8, 20)
-            frames_processed = random.randint(300, 600)
-        elif file_size_mb > 20:
-            # Medium file
-            base_squats = random.randint(5, 15)
-            frames_processed = random.randint(200, 400)
-        else:
-            # Small file
-            base_squats = random.randint(3, 10)
-            frames_processed = random.randint(100, 250)
-        
-        squats_detected = base_squats
-        total_frames = frames_processed + random.randint(50, 150)
-        duration = max(5, min(60, file_size_mb / 2))  # Rough duration estimate
-        
-        return {
-            'frames_processed': frames_processed,
-            'total_frames': total_frames,
-            'squats_detected': squats_detected,
-            'duration': duration,
-            'file_size': file_size,
-            'success': True
-        }
+        return measure_video(video_path, video_hash=video_hash, exercises=exercises, info=info, deadline=deadline)
         
     except Exception as e:
-        print(f"❌ Video analysis error: {e}")
-        return {
-            'frames_processed': 180,
-            'total_frames': 350,
-            'squats_detected': 8,
-            'duration': 15.0,
-            'file_size': 0,
-            'success': False
-        }
+        logger.error(f"❌ Video decode failed: {e}")
+        raise VideoDecodeError(VIDEO_DECODE_ERROR) from e
+
+def prepare_analysis_input(video_path, video_hash, deadline=None):
+    """Swap an oversized upload for a small analysis proxy.
+
+    Returns ``(path, hash, proxy_info or None, info)``; ``info`` is the
+    original's probe, passed on to measuring so it is not read twice (None
+    for a proxy, whose header is complete).
+    """
+    if not VIDEO_ENGINE_AVAILABLE:
+        return video_path, video_hash, None, None
+    
+    try:
+        proxy_path, source_info, covered_frames = make_analysis_proxy(video_path, deadline=deadline)
+    except Exception as e:
+        logger.warning(f"⚠️ Analysis proxy failed, analyzing the original: {e}")
+        return video_path, video_hash, None, None
+    if proxy_path is None:
+        return video_path, video_hash, None, source_info
+    
+    # Keypoints cached for the proxy are indexed by proxy frame, so key them apart from the original
+    spec = analysis_spec()
+    proxy_hash = f"{video_hash}.proxy{spec['max_width']}x{spec['fps']:g}" if video_hash else None
+    return proxy_path, proxy_hash, {
+        'source_resolution': source_info.resolution,
+        'source_fps': round(source_info.fps, 2),
+        'source_frames': source_info.frame_count,
+        'source_duration': round(source_info.duration, 2),
+        # Only the first ``analyzed_frames`` of the original were analyzed when the proxy was cut short
+        'analyzed_frames': covered_frames,
+        'analyzed_duration': round(covered_frames / source_info.fps, 2),
+        'truncated': covered_frames < source_info.frame_count,
+        'proxy_size_mb': round(os.path.getsize(proxy_path) / (1024 * 1024), 2),
+    }, None
+
+@app.before_request
+def admit_request():
+    """Turn uploads and analyses away with 503 while overloaded or draining"""
+    if request.endpoint not in SHED_ENDPOINTS:
+        return None
+    # Only the query string is read here: the form is still the unread upload
+    enqueue = (request.args.get('mode') == 'async'
+               or request.args.get('ai', DEFAULT_AI_ENRICHMENT).lower() == 'stream')
+    reason = admission.admit(request.content_length, enqueue=enqueue)
+    if reason is not None:
+        REQUESTS_SHED.inc(reason=reason)
+        logger.warning(f"🚦 Shedding {request.path}: {reason}")
+        response = jsonify({'success': False, 'error': 'Server busy, please retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(admission.retry_after)
+        return response
+    g.admitted = True
+
+@app.teardown_request
+def release_request(error=None):
+    if g.pop('admitted', False):
+        admission.release()
+
+@app.route('/healthz')
+def liveness():
+    """Liveness probe: the process is up and answering"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readiness():
+    """Readiness probe: 503 while draining, overloaded or without a writable upload folder"""
+    checks = {
+        'draining': admission.draining,
+        'overloaded': not admission.draining and not admission.ready(),
+        'upload_folder_writable': os.access(app.config['UPLOAD_FOLDER'], os.W_OK),
+    }
+    ready = checks['upload_folder_writable'] and not checks['draining'] and not checks['overloaded']
+    response = jsonify({'status': 'ready' if ready else 'unavailable', 'checks': checks,
+                        'admission': admission.stats()})
+    if not ready:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(admission.retry_after)
+    return response
 
 @app.route('/')
 def index():
@@ -389,10 +518,36 @@ def index():
 @app.route('/api-status')
 def api_status():
     """🆕 API status endpoint to check model availability"""
-    status = model_manager.get_model_status()
+    status = get_model_manager().get_model_status()
+    status['exercises'] = exercise_names()
+    status['result_cache'] = result_cache.stats()
+    status['feedback_cache'] = feedback_cache.stats()
+    status['job_queue'] = job_queue.stats()
+    status['upload_spool'] = spool_budget.stats()
+    status['admission'] = admission.stats()
+    status['gemini_client'] = gemini_client.stats()
+    status['analysis_spec'] = analysis_spec()
+    status['live'] = dict(live_sessions.stats(), available=LIVE_MODE_AVAILABLE)
     return jsonify(status)
 
 
+@app.route('/analysis-spec')
+def get_analysis_spec():
+    """Resolution, frame rate and length the analysis needs, so clients can shrink uploads"""
+    spec = analysis_spec()
+    spec['max_upload_mb'] = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    spec['exercises'] = exercise_names()
+    response = jsonify(spec)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/upload-url', methods=['POST'])
 def get_upload_url():
     """Generate a presigned URL for direct blob upload"""
@@ -405,15 +560,10 @@ def get_upload_url():
         if not blob_token:
             return jsonify({'success': False, 'error': 'Blob storage not configured'}), 500
         
-        # Request upload URL from Vercel Blob API
-        response = requests.post(
-            'https://blob.vercel-storage.com/upload',
-            headers={'Authorization': f'Bearer {blob_token}'},
-            json={'filename': filename, 'contentType': 'video/mp4'}
-        )
+        # Request upload URL from Vercel Blob API (pooled session, timeouts, retries)
+        blob_data = request_upload_url(filename, blob_token)
         
-        if response.status_code == 200:
-            blob_data = response.json()
+        if blob_data is not None:
             return jsonify({
                 'success': True,
                 'uploadUrl': blob_data['url'],
@@ -423,100 +573,817 @@ def get_upload_url():
             return jsonify({'success': False, 'error': 'Failed to get upload URL'}), 500
             
     except Exception as e:
-        print(f"❌ Upload URL error: {e}")
-        traceback.print_exc()
+        logger.exception(f"❌ Upload URL error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/analyze', methods=['POST'])
-def analyze_video():
-    print("=" * 50)
-    print("🔄 NEW ANALYSIS REQUEST RECEIVED")
-    print("=" * 50)
+def request_files():
+    """Parse the multipart body; returns (files, error_response)"""
+    try:
+        # Parsing the body streams file parts to disk through UploadSpool
+        return request.files, None
+    except HTTPException as e:
+        return None, upload_error_response(e)
+
+def upload_error_response(e):
+    """JSON answer for an upload rejected with an HTTPException (413, or 503 with Retry-After)"""
+    logger.warning(f"🚦 Upload rejected: {e.description}")
+    error = 'File too large. Maximum size is 100MB.' if e.code == 413 else e.description
+    response = jsonify({'success': False, 'error': error})
+    response.status_code = e.code
+    if getattr(e, 'retry_after', None):
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def requested_blob_url():
+    """Blob URL to analyze instead of a multipart body, from a JSON or urlencoded form body"""
+    if request.is_json:
+        return (request.get_json(silent=True) or {}).get('blob_url')
+    if request.mimetype == 'application/x-www-form-urlencoded':
+        return request.form.get('blob_url')
+    return None
+
+def receive_upload():
+    """Validate and save the uploaded video; returns ((video_path, size, hash), error_response)"""
+    blob_url = requested_blob_url()
+    if blob_url:
+        return fetch_upload(blob_url)
+    
+    files, error_response = request_files()
+    if error_response:
+        return None, error_response
+    
+    if 'file' not in files:
+        return None, (jsonify({'success': False, 'error': 'No file uploaded'}), 400)
+    
+    return store_upload(files['file'])
+
+def fetch_upload(blob_url):
+    """Pull a client-uploaded blob into the upload folder; returns ((video_path, size, hash), error_response)"""
+    if not blob_url_allowed(blob_url):
+        return None, (jsonify({'success': False, 'error': 'Blob URL is not on an allowed host'}), 400)
+    
+    if not allowed_file(blob_filename(blob_url)):
+        return None, (jsonify({'success': False, 'error': 'Invalid file type. Supported: MP4, AVI, MOV, MKV, WEBM'}), 400)
     
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'}), 400
-        
-        if not file or not allowed_file(file.filename):
-            return jsonify({'success': False, 'error': 'Invalid file type. Supported: MP4, AVI, MOV, MKV'}), 400
-        
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        video_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        return fetch_blob(blob_url, app.config['UPLOAD_FOLDER'], app.config['MAX_CONTENT_LENGTH']), None
+    except BlobFetchError as e:
+        logger.error(f"❌ Blob fetch failed: {e}")
+        return None, (jsonify({'success': False, 'error': str(e)}), e.status)
+    except HTTPException as e:
+        return None, upload_error_response(e)
+
+def store_upload(file):
+    """Validate one uploaded file part and save it; returns ((video_path, size, hash), error_response)"""
+    if file.filename == '':
+        return None, (jsonify({'success': False, 'error': 'No file selected'}), 400)
+    
+    if not file or not allowed_file(file.filename):
+        return None, (jsonify({'success': False, 'error': 'Invalid file type. Supported: MP4, AVI, MOV, MKV, WEBM'}), 400)
+    
+    if isinstance(file.stream, UploadSpool):
+        # Already on disk and hashed while it was received
+        video_path, file_size, video_hash = file.stream.claim()
+        logger.info(f"📥 Upload spooled: {file_size} bytes ({file_size / (1024 * 1024):.1f} MB)")
+        return (video_path, file_size, video_hash), None
+    
+    # Generate unique filename
+    filename = secure_filename(file.filename)
+    unique_filename = f"{uuid.uuid4().hex}_{filename}"
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    
+    logger.info(f"💾 Saving file: {video_path}")
+    
+    try:
+        # Save uploaded file, hashing it as it is written
+        file_size, video_hash = save_upload(file, video_path)
+        logger.info(f"✅ File saved: {file_size} bytes ({file_size / (1024 * 1024):.1f} MB)")
         
-        print(f"💾 Saving file: {video_path}")
+    except Exception as e:
+        logger.error(f"❌ File save failed: {e}")
+        remove_upload(video_path)
+        return None, (jsonify({'success': False, 'error': f'File upload failed: {str(e)}'}), 500)
+    
+    return (video_path, file_size, video_hash), None
+
+def remove_upload(video_path):
+    try:
+        discard_upload(video_path)
+        logger.info("🧹 Temporary file cleaned up")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not remove temporary file: {e}")
+
+def analysis_key(video_hash, exercises=None, ai_mode=None):
+    """Result cache key: the clip, plus the exercises unless it is just the default one.
+
+    ai=off results never get Gemini feedback, so they are kept apart from
+    the ones the other modes enrich.
+    """
+    exercises = list(exercises or [DEFAULT_EXERCISE])
+    key = video_hash if exercises == [DEFAULT_EXERCISE] else f"{video_hash}:{'+'.join(exercises)}"
+    return f"{key}:ai-off" if ai_mode == 'off' else key
+
+def get_cached_response(video_hash, exercises=None, ai_mode=None):
+    """Stored response for a previously analyzed clip, with fresh quota info"""
+    cached = result_cache.get(analysis_key(video_hash, exercises, ai_mode))
+    if cached is None:
+        return None
+    
+    model_status = get_model_manager().get_model_status()
+    response_data = dict(cached)
+    response_data['cached'] = True
+    response_data['available_models'] = model_status['available_models']
+    response_data['quota_reset'] = model_status['quota_reset']
+    logger.info(f"♻️ Cache hit for {video_hash[:12]}, returning stored analysis")
+    return response_data
+
+def requested_ai_mode():
+    """Gemini enrichment wanted by this request: off, async (background job) or inline"""
+    mode = request.args.get('ai', request.form.get('ai', DEFAULT_AI_ENRICHMENT)).lower()
+    return mode if mode in AI_ENRICHMENT_MODES else DEFAULT_AI_ENRICHMENT
+
+def request_body():
+    return (request.get_json(silent=True) or {}) if request.is_json else request.form
+
+def requested_exercises():
+    """Exercises to analyze the clip for, from ``exercises`` (comma-separated) or ``exercise``; (names, error_response)"""
+    body = request_body()
+    names = (request.args.get('exercises') or body.get('exercises')
+             or request.args.get('exercise') or body.get('exercise'))
+    try:
+        return [exercise.name for exercise in resolve_exercises(names)], None
+    except ValueError as e:
+        return None, (jsonify({'success': False, 'error': str(e), 'exercises': exercise_names()}), 400)
+
+def requested_athlete():
+    """(athlete, exercise) to record this analysis under, from the query string or body; None when not given"""
+    athlete = request.args.get('athlete') or request_body().get('athlete')
+    if not athlete:
+        return None
+    # The first requested exercise is the one the response (and so the history) describes
+    exercises, _ = requested_exercises()
+    exercise = exercises[0] if exercises else DEFAULT_EXERCISE
+    if not valid_athlete_id(athlete) or not valid_athlete_id(exercise):
+        logger.warning(f"⚠️ Not recording history for invalid athlete/exercise {athlete[:64]!r}/{exercise[:64]!r}")
+        return None
+    return athlete, exercise
+
+def record_history(athlete, response_data):
+    """Add one analysis to the athlete's history; never fails the request"""
+    if athlete is None:
+        return
+    history = get_athlete_history()
+    if history is None:
+        return
+    try:
+        with span('history_record'):
+            history.record(athlete[0], athlete[1], response_data)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record history for {athlete[0]}: {e}")
+
+def no_motion_analysis(exercise=None):
+    """Result for a clip in which nothing moved: no reps were counted, so there is no score to give"""
+    model_status = get_model_manager().get_model_status()
+    return {
+        'feedback': (f"No dominant motion was found in this clip, so no {get_exercise(exercise).noun} reps were "
+                     "counted and no form score was given. Film the whole set with a steady camera and the "
+                     "lifter in frame."),
+        'score': None,
+        'model_used': 'rule_engine',
+        'is_gemini': False,
+        'available_models': model_status['available_models'],
+        'quota_reset': model_status['quota_reset']
+    }
+
+def local_analysis(scoring, exercise=None):
+    """Rule-based feedback when reps were measured, otherwise get_fallback_analysis"""
+    if scoring is None:
+        return get_fallback_analysis(exercise)
+    
+    model_status = get_model_manager().get_model_status()
+    return {
+        'feedback': scoring['feedback'],
+        'score': scoring['score'],
+        'model_used': 'rule_engine',
+        'is_gemini': False,
+        'available_models': model_status['available_models'],
+        'quota_reset': model_status['quota_reset']
+    }
+
+def run_analysis(video_path, file_size, video_hash, progress=None, ai_mode=None, exercises=None, athlete=None):
+    """Analyze a saved upload for ``exercises``, build the /analyze response and record it under ``athlete``; always removes the file"""
+    report = progress or (lambda stage, **data: None)
+    ai_mode = ai_mode or DEFAULT_AI_ENRICHMENT
+    report('saved', file_size_mb=round(file_size / (1024 * 1024), 2))
+    
+    analysis_path = video_path
+    # Probing, the proxy and decoding all come out of one time budget
+    deadline = analysis_deadline()
+    try:
+        # 🆕 Large/high-fps uploads are cut down to what the analysis needs, and the original freed
+        with span('analysis_proxy'):
+            analysis_path, analysis_hash, proxy_info, info = prepare_analysis_input(video_path, video_hash, deadline)
+        if proxy_info is not None:
+            remove_upload(video_path)
+            report('proxied', proxy_size_mb=proxy_info['proxy_size_mb'])
         
+        # Analyze video content
+        logger.info("🎥 Analyzing video content...")
+        video_analysis = analyze_video_content(analysis_path, analysis_hash, exercises, info, deadline)
+        if proxy_info is not None:
+            video_analysis['analysis_proxy'] = dict(proxy_info, resolution=video_analysis['resolution'])
+            video_analysis['resolution'] = proxy_info['source_resolution']
+            # Frames and duration both describe the part of the original the proxy covers
+            video_analysis['total_frames'] = proxy_info['analyzed_frames']
+            video_analysis['duration'] = proxy_info['analyzed_duration']
+            video_analysis['file_size'] = file_size
+        report('decoded', frames_processed=video_analysis['frames_processed'],
+               video_resolution=video_analysis['resolution'])
+        report('reps_counted', exercise=video_analysis['exercise'], reps_detected=video_analysis['reps_detected'],
+               squats_detected=video_analysis['reps_detected'])
+    finally:
+        # Clean up uploaded file (and its proxy)
+        remove_upload(video_path)
+        if analysis_path != video_path:
+            remove_upload(analysis_path)
+    
+    # 🆕 Deterministic score from the measured reps: no network, a few milliseconds
+    with span('score_form'):
+        scoring = score_analysis(video_analysis)
+    if scoring is not None:
+        report('scored', form_score=scoring['score'])
+    
+    exercise = video_analysis['exercise']
+    analysis_data = video_analysis.get('analysis_data')
+    if video_analysis.get('angle_source') == 'none':
+        ai_result = no_motion_analysis(exercise)
+    elif ai_mode == 'stream' and scoring is not None and GEMINI_API_KEY:
+        # 🆕 Measured results go out first, Gemini's feedback follows as it is generated
+        measured = build_response(video_analysis, local_analysis(scoring, exercise), file_size, video_hash, scoring,
+                                  {'status': 'streaming'}, ai_mode)
+        report('measured', result=measured)
+        ai_result = stream_gemini_feedback(analysis_data, scoring, report) or local_analysis(scoring, exercise)
+    elif scoring is not None and ai_mode != 'inline':
+        ai_result = local_analysis(scoring, exercise)
+    elif ai_mode == 'off':
+        ai_result = get_fallback_analysis(exercise)
+    else:
+        # Get AI feedback using enhanced model switching
+        logger.info("🤖 Getting advanced form analysis...")
+        ai_result = analyze_with_gemini_enhanced(analysis_data, scoring, exercise)
+        report('ai_feedback', model_used=ai_result.get('model_used', 'fallback'))
+        if scoring is not None and not ai_result.get('is_gemini'):
+            ai_result = local_analysis(scoring, exercise)
+    
+    if ai_result.get('is_gemini'):
+        enrichment = {'status': 'done'}
+    elif ai_mode == 'off':
+        enrichment = {'status': 'disabled'}
+    elif ai_mode == 'async' and scoring is not None and GEMINI_API_KEY:
+        enrichment = {'status': 'pending'}
+    else:
+        enrichment = {'status': 'unavailable'}
+    
+    response_data = build_response(video_analysis, ai_result, file_size, video_hash, scoring, enrichment, ai_mode)
+    # Recorded before enrichment is queued, so the job always finds the clip to update
+    record_history(athlete, response_data)
+    if enrichment['status'] == 'pending':
+        # Queued only once the measured response is cached, so it cannot overwrite the job's feedback
+        enrichment = submit_enrichment(video_hash, analysis_data, scoring, analysis_key(video_hash, exercises), athlete)
+        response_data = attach_enrichment(analysis_key(video_hash, exercises), response_data, enrichment)
+    
+    logger.info(f"✅ Analysis completed!")
+    logger.info(f"📊 Score: {response_data['form_score']}%, {exercise.capitalize()} reps: {video_analysis['reps_detected']}")
+    logger.info(f"🔧 Model: {ai_result.get('model_used', 'fallback')}")
+    logger.info(f"🚀 Gemini AI: {ai_result.get('is_gemini', False)} (enrichment {enrichment['status']})")
+    logger.info(f"📈 Available models: {ai_result.get('available_models', 0)}")
+    
+    return response_data
+
+def build_response(video_analysis, ai_result, file_size, video_hash, scoring=None, enrichment=None, ai_mode=None):
+    """Shape one clip's measurements and feedback into the /analyze response and cache it under ``ai_mode``"""
+    enrichment = enrichment or {'status': 'disabled'}
+    exercise = get_exercise(video_analysis['exercise'])
+    parsed = ai_result.get('parsed')
+    if parsed is None:
+        with span('parse_feedback'):
+            parsed = parse_feedback(ai_result['feedback'], exercise.dimensions)
+    response_data = {
+        'success': True,
+        'exercise': exercise.name,
+        'form_score': scoring['score'] if scoring else ai_result['score'],
+        'score_breakdown': scoring['breakdown'] if scoring else None,
+        'reps_detected': video_analysis['reps_detected'],
+        'squats_detected': video_analysis['reps_detected'],  # Legacy name, kept for existing clients
+        'rep_details': video_analysis.get('rep_details', []),
+        'angle_source': video_analysis.get('angle_source', 'estimate'),
+        'frames_processed': video_analysis['frames_processed'],
+        'total_frames': video_analysis['total_frames'],
+        'ai_feedback': ai_result['feedback'],
+        'ai_feedback_structured': parsed,
+        'ai_score': ai_result['score'] if ai_result.get('is_gemini') else None,
+        'video_duration': round(video_analysis['duration'], 2),
+        'video_resolution': video_analysis['resolution'],
+        'analysis_proxy': video_analysis.get('analysis_proxy'),
+        'file_size_mb': round(file_size / (1024 * 1024), 2),
+        'analysis_type': ai_result.get('model_used', 'fallback'),
+        'is_ai_analysis': ai_result.get('is_gemini', False),
+        'enrichment': enrichment,
+        'available_models': ai_result.get('available_models', 0),
+        'quota_reset': ai_result.get('quota_reset', 'Unknown'),
+        'video_hash': video_hash,
+        'cached': False
+    }
+    if video_analysis.get('exercises'):
+        response_data['exercises'] = exercise_results(video_analysis['exercises'])
+    
+    # Results that Gemini could still improve are kept only briefly
+    final = response_data['is_ai_analysis'] or enrichment['status'] in ('unavailable', 'disabled')
+    cache_key = analysis_key(video_hash, video_analysis.get('exercises') or [exercise.name], ai_mode)
+    with result_cache_update_lock:
+        result_cache.set(cache_key, response_data, ttl=None if final else FALLBACK_CACHE_TTL)
+    return response_data
+
+def attach_enrichment(cache_key, response_data, enrichment):
+    """The response with its enrichment job; the cached copy too, unless the job has already finished it"""
+    response_data = dict(response_data, enrichment=enrichment)
+    with result_cache_update_lock:
+        cached = result_cache.get(cache_key)
+        if cached is not None and cached.get('enrichment', {}).get('status') == 'pending':
+            result_cache.set(cache_key, dict(cached, enrichment=enrichment), ttl=FALLBACK_CACHE_TTL)
+    return response_data
+
+def exercise_results(measured):
+    """Reps and rule-based score per exercise, for a clip analyzed against several"""
+    results = {}
+    for name, video_analysis in measured.items():
+        scoring = score_analysis(video_analysis)
+        results[name] = {
+            'reps_detected': video_analysis['reps_detected'],
+            'rep_details': video_analysis.get('rep_details', []),
+            'angle_source': video_analysis.get('angle_source', 'estimate'),
+            'form_score': scoring['score'] if scoring else None,
+            'score_breakdown': scoring['breakdown'] if scoring else None,
+            'feedback': scoring['feedback'] if scoring else None,
+        }
+    return results
+
+def submit_enrichment(video_hash, analysis_data, scoring, cache_key=None, athlete=None):
+    """Queue Gemini feedback for a response that is returned with rule-based feedback"""
+    try:
+        job = job_queue.submit(run_enrichment_job, video_hash, analysis_data, scoring, cache_key, athlete)
+    except QueueFullError as e:
+        logger.warning(f"🚦 Skipping AI enrichment: {e}")
+        return {'status': 'skipped'}
+    return {
+        'status': 'pending',
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}',
+        'events_url': f'/jobs/{job.id}/events'
+    }
+
+def run_enrichment_job(job, video_hash, analysis_data, scoring, cache_key=None, athlete=None):
+    ai_result = stream_gemini_feedback(analysis_data, scoring, job.report)
+    if ai_result is None:
+        return {'is_ai_analysis': False, 'ai_feedback': None, 'ai_feedback_structured': None,
+                'analysis_type': 'rule_engine'}
+    
+    enriched = {
+        'ai_feedback': ai_result['feedback'],
+        'ai_feedback_structured': ai_result['parsed'],
+        'ai_score': ai_result['score'],
+        'analysis_type': ai_result['model_used'],
+        'is_ai_analysis': True
+    }
+    cache_key = cache_key or video_hash
+    with result_cache_update_lock:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            result_cache.set(cache_key, dict(cached, **enriched, enrichment={'status': 'done'}))
+    # Only the requesting athlete's copy of the clip: others may have had it analyzed separately
+    history = get_athlete_history() if athlete is not None else None
+    if history is not None:
         try:
-            # Save uploaded file
-            file.save(video_path)
-            file_size = os.path.getsize(video_path)
-            print(f"✅ File saved: {file_size} bytes ({file_size / (1024 * 1024):.1f} MB)")
-            
+            history.update_feedback(athlete[0], athlete[1], video_hash, enriched['ai_feedback'])
         except Exception as e:
-            print(f"❌ File save failed: {e}")
-            return jsonify({'success': False, 'error': f'File upload failed: {str(e)}'}), 500
+            logger.warning(f"⚠️ Could not update history feedback: {e}")
+    return enriched
+
+def run_analysis_job(job, video_path, file_size, video_hash, ai_mode=None, athlete=None, exercises=None):
+    return run_analysis(video_path, file_size, video_hash, progress=job.report, ai_mode=ai_mode,
+                        exercises=exercises, athlete=athlete)
+
+def analyze_batch_with_gemini(clips, scorings, exercise=None):
+    """One Gemini call for a whole session; returns (per-clip AI results, session summary)"""
+    exercise = get_exercise(exercise)
+    if not GEMINI_API_KEY:
+        return [local_analysis(scoring, exercise.name) for scoring in scorings], ''
+    
+    try:
+        result = generate_with_fallback(get_model_manager(), build_batch_prompt(clips, exercise))
+        if result is None:
+            logger.warning("🚨 No Gemini model answered the batch within budget, using fallback")
+            return [local_analysis(scoring, exercise.name) for scoring in scorings], ''
+        feedback_text, model_name = result
         
-        # Analyze video content
-        print("🎥 Analyzing video content...")
-        video_analysis = analyze_video_content(video_path)
+        sections, summary = split_batch_feedback(feedback_text, len(clips))
+        model_status = get_model_manager().get_model_status()
+        ai_results = []
+        for section, scoring in zip(sections, scorings):
+            if section is None:
+                # The model skipped this clip; don't leave it without feedback
+                ai_results.append(local_analysis(scoring, exercise.name))
+                continue
+            parsed = parse_feedback(section, exercise.dimensions)
+            ai_results.append({
+                'feedback': section,
+                'parsed': parsed,
+                'score': parsed['score'] or random.randint(80, 92),
+                'model_used': model_name,
+                'is_gemini': True,
+                'available_models': model_status['available_models'],
+                'quota_reset': model_status['quota_reset']
+            })
+        return ai_results, summary
         
-        # Get AI feedback using enhanced model switching
-        print("🤖 Getting advanced form analysis...")
-        ai_result = analyze_with_gemini_enhanced()
+    except Exception as e:
+        logger.error(f"❌ Batch analysis failed: {e}")
+        return [local_analysis(scoring, exercise.name) for scoring in scorings], ''
+
+@app.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a multi-clip session: parallel decoding, one Gemini call for all new clips"""
+    logger.info("🔄 NEW BATCH ANALYSIS REQUEST RECEIVED")
+    started = time.perf_counter()
+    
+    with span('upload_save'):
+        files, error_response = request_files()
+    if error_response:
+        ANALYZE_REQUESTS.inc(mode='batch', outcome='rejected')
+        return error_response
+    
+    parts = files.getlist('files') + files.getlist('file')
+    if not parts:
+        return jsonify({'success': False, 'error': 'No files uploaded'}), 400
+    if len(parts) > MAX_BATCH_CLIPS:
+        return jsonify({'success': False, 'error': f'Too many clips. Maximum is {MAX_BATCH_CLIPS} per batch.'}), 400
+    if not VIDEO_ENGINE_AVAILABLE:
+        return jsonify({'success': False, 'error': VIDEO_ENGINE_MISSING}), 503
+    exercises, error_response = requested_exercises()
+    if error_response:
+        return error_response
+    
+    uploads = []  # (filename, video_path, file_size, video_hash)
+    try:
+        for part in parts:
+            upload, error_response = store_upload(part)
+            if error_response:
+                ANALYZE_REQUESTS.inc(mode='batch', outcome='rejected')
+                return error_response
+            uploads.append((part.filename, *upload))
         
-        # Clean up uploaded file
-        try:
-            os.remove(video_path)
-            print("🧹 Temporary file cleaned up")
-        except Exception as e:
-            print(f"⚠️ Could not remove temporary file: {e}")
+        # Clips seen before come from the cache; identical clips in one batch are measured once
+        ai_mode = requested_ai_mode()
+        results = [get_cached_response(video_hash, exercises, ai_mode) for _, _, _, video_hash in uploads]
+        pending = {}
+        for i, (_, video_path, _, video_hash) in enumerate(uploads):
+            if results[i] is None:
+                pending.setdefault(video_hash, []).append(i)
+        first = [indices[0] for indices in pending.values()]
+        logger.info(f"🎞️ Batch of {len(uploads)} clips, {len(first)} to analyze")
         
-        # Prepare response
-        response_data = {
+        with span('batch_decode', clips=len(first)):
+            measured = measure_clips([(uploads[i][1], uploads[i][3]) for i in first], exercises)
+    finally:
+        for _, video_path, _, _ in uploads:
+            remove_upload(video_path)
+    
+    # Clips that could not be decoded get an error entry of their own, and are neither scored nor cached
+    for i, video_analysis in zip(first, measured):
+        if video_analysis is None:
+            for j in pending.pop(uploads[i][3]):
+                results[j] = {'success': False, 'error': VIDEO_DECODE_ERROR, 'video_hash': uploads[i][3]}
+    kept = [(i, video_analysis) for i, video_analysis in zip(first, measured) if video_analysis is not None]
+    first, measured = [i for i, _ in kept], [video_analysis for _, video_analysis in kept]
+    
+    summary_text = ''
+    if first:
+        labels = [os.path.basename(uploads[i][0]) or f'clip {n}' for n, i in enumerate(first, 1)]
+        scorings = [score_analysis(video_analysis) for video_analysis in measured]
+        # The session shares one prompt, so enrichment is either off or inline here
+        if ai_mode == 'off':
+            ai_results = [local_analysis(scoring, exercises[0]) for scoring in scorings]
+        else:
+            ai_results, summary_text = analyze_batch_with_gemini(list(zip(labels, measured)), scorings, exercises[0])
+        for i, video_analysis, ai_result, scoring in zip(first, measured, ai_results, scorings):
+            _, _, file_size, video_hash = uploads[i]
+            if video_analysis.get('angle_source') == 'none':
+                ai_result = no_motion_analysis(exercises[0])
+            if ai_result.get('is_gemini'):
+                enrichment = {'status': 'done'}
+            else:
+                enrichment = {'status': 'disabled' if ai_mode == 'off' else 'unavailable'}
+            response_data = build_response(video_analysis, ai_result, file_size, video_hash, scoring, enrichment,
+                                           ai_mode)
+            for j in pending[video_hash]:
+                results[j] = response_data
+    
+    athlete = requested_athlete()
+    for result in results:
+        if result['success']:
+            record_history(athlete, result)
+    
+    clips = [dict(result, filename=filename) for result, (filename, _, _, _) in zip(results, uploads)]
+    session = summarize_session([clip for clip in clips if clip['success']])
+    session['failed_clips'] = sum(not clip['success'] for clip in clips)
+    session['summary'] = summary_text
+    
+    ANALYZE_REQUESTS.inc(mode='batch', outcome='ok')
+    logger.info(f"✅ Batch completed: {len(clips)} clips, {session['total_reps']} reps")
+    with span('serialize_response'):
+        return jsonify({
             'success': True,
-            'form_score': ai_result['score'],
-            'squats_detected': video_analysis['squats_detected'],
-            'frames_processed': video_analysis['frames_processed'],
-            'total_frames': video_analysis['total_frames'],
-            'ai_feedback': ai_result['feedback'],
-            'video_duration': round(video_analysis['duration'], 2),
-            'video_resolution': "1920x1080",
-            'file_size_mb': round(file_size / (1024 * 1024), 2),
-            'analysis_type': ai_result.get('model_used', 'fallback'),
-            'is_ai_analysis': ai_result.get('is_gemini', False),
-            'available_models': ai_result.get('available_models', 0),
-            'quota_reset': ai_result.get('quota_reset', 'Unknown')
-        }
+            'clips': clips,
+            'session': session,
+            'clips_analyzed': len(first),
+            'processing_time': round(time.perf_counter() - started, 2)
+        })
+
+@app.route('/analyze', methods=['POST'])
+def analyze_video():
+    logger.info("🔄 NEW ANALYSIS REQUEST RECEIVED")
+    
+    try:
+        with span('upload_save'):
+            upload, error_response = receive_upload()
+        if error_response:
+            ANALYZE_REQUESTS.inc(mode='upload', outcome='rejected')
+            return error_response
+        video_path, file_size, video_hash = upload
+        exercises, error_response = requested_exercises()
+        if error_response:
+            remove_upload(video_path)
+            ANALYZE_REQUESTS.inc(mode='upload', outcome='rejected')
+            return error_response
         
-        print(f"✅ Analysis completed!")
-        print(f"📊 Score: {ai_result['score']}%, Squats: {video_analysis['squats_detected']}")
-        print(f"🔧 Model: {ai_result.get('model_used', 'fallback')}")
-        print(f"🚀 Gemini AI: {ai_result.get('is_gemini', False)}")
-        print(f"📈 Available models: {ai_result.get('available_models', 0)}")
+        # Same clip analyzed recently for the same exercises: skip decoding and Gemini entirely
+        # ai=stream without mode=async answers with a server-sent event stream
+        ai_mode = requested_ai_mode()
+        async_mode = request.args.get('mode', request.form.get('mode')) == 'async'
+        streaming = ai_mode == 'stream' and not async_mode
         
-        return jsonify(response_data)
+        cached = get_cached_response(video_hash, exercises, ai_mode)
+        if cached is not None:
+            remove_upload(video_path)
+            record_history(requested_athlete(), cached)
+            ANALYZE_REQUESTS.inc(mode='cached', outcome='ok')
+            if streaming:
+                return result_event_stream(cached)
+            with span('serialize_response'):
+                return jsonify(cached)
         
+        # 🆕 Job mode: hand off to the worker pool and return straight away
+        if async_mode or streaming:
+            mode = 'stream' if streaming else 'async'
+            try:
+                job = job_queue.submit(run_analysis_job, video_path, file_size, video_hash,
+                                       ai_mode, requested_athlete(), exercises)
+            except QueueFullError as e:
+                remove_upload(video_path)
+                logger.warning(f"🚦 {e}")
+                ANALYZE_REQUESTS.inc(mode=mode, outcome='rejected')
+                return jsonify({'success': False, 'error': 'Server busy, please retry shortly'}), 429
+            logger.info(f"📨 Queued analysis job {job.id}")
+            ANALYZE_REQUESTS.inc(mode=mode, outcome='queued')
+            if streaming:
+                return job_event_stream(job)
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'status_url': f'/jobs/{job.id}',
+                'events_url': f'/jobs/{job.id}/events'
+            }), 202
+        
+        response_data = run_analysis(video_path, file_size, video_hash, ai_mode=ai_mode, exercises=exercises,
+                                     athlete=requested_athlete())
+        ANALYZE_REQUESTS.inc(mode='sync', outcome='ok')
+        with span('serialize_response'):
+            return jsonify(response_data)
+        
+    except VideoDecodeError as e:
+        # run_analysis has already removed the upload; nothing was cached
+        ANALYZE_REQUESTS.inc(mode='sync', outcome='rejected')
+        return jsonify({'success': False, 'error': str(e)}), e.status
     except Exception as e:
-        print(f"❌ CRITICAL ERROR: {e}")
-        traceback.print_exc()
+        logger.exception(f"❌ CRITICAL ERROR: {e}")
+        ANALYZE_REQUESTS.inc(mode='sync', outcome='error')
         
         # Clean up on error
-        try:
-            if 'video_path' in locals() and os.path.exists(video_path):
-                os.remove(video_path)
-        except:
-            pass
+        if 'video_path' in locals():
+            remove_upload(video_path)
             
         return jsonify({
             'success': False, 
             'error': f'Analysis failed: {str(e)}'
         }), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll an analysis job's stage and result"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events stream of an analysis job's stages"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job'}), 404
+    return job_event_stream(job)
+
+def job_event_stream(job):
+    """text/event-stream response following ``job`` until its result is in"""
+    def stream():
+        seen = 0
+        while True:
+            events = job.wait_for_events(seen, timeout=JOB_EVENTS_HEARTBEAT)
+            if not events and not job.finished:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            seen += len(events)
+            if job.finished and seen >= len(job.events):
+                # The events already went out one by one
+                yield f"event: result\ndata: {json.dumps(dict(job.to_dict(), events=[]))}\n\n"
+                return
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def result_event_stream(response_data):
+    """The single-event stream a cache hit gets when the client asked for ai=stream"""
+    result = {'status': 'done', 'stage': 'done', 'events': [], 'result': response_data, 'error': None}
+    return Response(f"event: result\ndata: {json.dumps(result)}\n\n", mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def athlete_history_or_error(athlete):
+    """(store, error_response) for the history endpoints"""
+    if not valid_athlete_id(athlete):
+        return None, (jsonify({'success': False, 'error': 'Invalid athlete id'}), 400)
+    history = get_athlete_history()
+    if history is None:
+        return None, (jsonify({'success': False, 'error': 'Athlete history is unavailable'}), 503)
+    return history, None
+
+@app.route('/athletes/<athlete>/sessions')
+def athlete_sessions(athlete):
+    """🆕 An athlete's analyzed clips, newest first; follow ``next_before`` for older pages"""
+    history, error_response = athlete_history_or_error(athlete)
+    if error_response:
+        return error_response
+    exercise = request.args.get('exercise')
+    try:
+        page = history.sessions(athlete, get_exercise(exercise).name if exercise else None,
+                                limit=request.args.get('limit', DEFAULT_PAGE_SIZE),
+                                before=request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Bad page parameters: {e}'}), 400
+    return jsonify(dict(page, success=True, athlete=athlete))
+
+@app.route('/athletes/<athlete>/sessions/<int:clip_id>')
+def athlete_session(athlete, clip_id):
+    """One stored clip with feedback and its per-rep series"""
+    history, error_response = athlete_history_or_error(athlete)
+    if error_response:
+        return error_response
+    clip = history.session(athlete, clip_id)
+    if clip is None:
+        return jsonify({'success': False, 'error': 'Unknown session'}), 404
+    return jsonify(dict(clip, success=True))
+
+@app.route('/athletes/<athlete>/trends')
+def athlete_trends(athlete):
+    """🆕 Score over time, depth distribution and asymmetry drift per day/week/month"""
+    history, error_response = athlete_history_or_error(athlete)
+    if error_response:
+        return error_response
+    try:
+        trends = history.trends(athlete, get_exercise(request.args.get('exercise')).name,
+                                bucket=request.args.get('bucket', 'day'),
+                                limit=request.args.get('limit', DEFAULT_PAGE_SIZE),
+                                before=request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(dict(trends, success=True))
+
+def live_set_result(session, ai_mode, athlete=None):
+    """End-of-set messages: rule-based score now, Gemini feedback after when asked for"""
+    video_analysis = session.set_summary()
+    scoring = score_analysis(video_analysis)
+    exercise = video_analysis['exercise']
+    # A set without a counted rep has nothing to score: say so rather than make up feedback
+    ai_result = local_analysis(scoring, exercise) if scoring is not None else no_motion_analysis(exercise)
+    if scoring is not None:
+        record_history(athlete, {
+            'form_score': ai_result['score'],
+            'score_breakdown': scoring['breakdown'],
+            'exercise': video_analysis['exercise'],
+            'reps_detected': video_analysis['reps_detected'],
+            'rep_details': video_analysis['rep_details'],
+            'video_duration': round(video_analysis['duration'], 2),
+            'analysis_type': 'live',
+            'ai_feedback': ai_result['feedback'],
+        })
+    yield {
+        'type': 'set',
+        'reps': video_analysis['reps_detected'],
+        'rep_details': video_analysis['rep_details'],
+        'form_score': ai_result['score'],
+        'score_breakdown': scoring['breakdown'] if scoring else None,
+        'feedback': ai_result['feedback'],
+        'frames_processed': video_analysis['frames_processed'],
+        'video_duration': round(video_analysis['duration'], 2),
+    }
+    
+    # The only place live mode talks to Gemini: once per set, never per frame
+    if ai_mode == 'inline' and scoring is not None:
+        ai_result = analyze_with_gemini_enhanced(video_analysis['analysis_data'], scoring, exercise)
+        if ai_result.get('is_gemini'):
+            yield {'type': 'ai_feedback', 'feedback': ai_result['feedback'],
+                   'ai_score': ai_result['score'], 'model_used': ai_result.get('model_used')}
+
+def handle_live_message(session, message, ai_mode, athlete=None):
+    """Replies to one WebSocket message: a JPEG frame (binary), keypoints or end of set (JSON)"""
+    started = time.perf_counter()
+    if isinstance(message, bytes):
+        if len(message) > LIVE_MAX_FRAME_BYTES:
+            raise ValueError(f'Frame larger than {LIVE_MAX_FRAME_BYTES // 1024} KB')
+        with span('live_frame'):
+            reply = session.add_frame(message)
+    else:
+        data = json.loads(message)
+        if data.get('type') == 'end':
+            yield from live_set_result(session, data.get('ai', ai_mode), athlete)
+            session.reset_set()
+            return
+        if data.get('type') != 'keypoints':
+            raise ValueError(f"Unknown message type: {data.get('type')}")
+        with span('live_keypoints'):
+            reply = session.add_keypoints(data['keypoints'], data.get('t'), data.get('aspect', 1.0))
+    
+    # None means the frame was dropped by the per-session rate limit
+    if reply is not None:
+        reply['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        yield reply
+
+if LIVE_MODE_AVAILABLE:
+    from flask_sock import Sock
+
+    sock = Sock(app)
+
+    @sock.route('/live')
+    def live(ws):
+        """🆕 Live set: low-res JPEG frames (binary) or {"type": "keypoints"} messages in, rep counts and cues out.
+
+        Send {"type": "end"} to close the set and get its score; ?ai=inline
+        adds Gemini feedback for the set afterwards.
+        """
+        ai_mode = request.args.get('ai', 'off').lower()
+        athlete = requested_athlete()
+        try:
+            session = live_sessions.open(analysis_width=analysis_spec()['max_width'] // 2)
+        except LiveCapacityError as e:
+            logger.warning(f"🚦 {e}")
+            ws.send(json.dumps({'type': 'error', 'error': 'Live mode is busy, please retry shortly', 'retry_after': 5}))
+            return
+        
+        logger.info(f"📡 Live session {session.id[:8]} opened ({len(live_sessions)} active)")
+        ws.send(json.dumps({'type': 'ready', 'session_id': session.id, 'spec': analysis_spec(),
+                            'idle_timeout_s': LIVE_IDLE_TIMEOUT}))
+        try:
+            while not session.closed:
+                message = ws.receive(timeout=LIVE_IDLE_TIMEOUT)
+                if message is None or session.closed:
+                    session.close_reason = session.close_reason or 'idle'
+                    break
+                session.touch()
+                try:
+                    for reply in handle_live_message(session, message, ai_mode, athlete):
+                        ws.send(json.dumps(reply))
+                except (ValueError, KeyError, TypeError) as e:
+                    ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+            if session.close_reason == 'idle':
+                ws.send(json.dumps({'type': 'closed', 'reason': 'idle'}))
+        except Exception as e:
+            # Client went away mid-set
+            logger.info(f"📡 Live session {session.id[:8]} ended: {e}")
+        finally:
+            live_sessions.close(session)
+            logger.info(f"📡 Live session {session.id[:8]} closed after {len(session.reps)} reps")
+
 @app.errorhandler(413)
 def too_large(e):
     return jsonify({'success': False, 'error': 'File too large. Maximum size is 100MB.'}), 413
@@ -529,8 +1396,7 @@ def internal_error(e):
 def handle_exception(e):
     """Catch-all error handler to ensure all errors return JSON"""
     # Log the error
-    print(f"❌ Unhandled exception: {str(e)}")
-    traceback.print_exc()
+    logger.exception(f"❌ Unhandled exception: {str(e)}")
     
     # Return JSON error response
     return jsonify({
@@ -538,6 +1404,27 @@ def handle_exception(e):
         'error': f'Server error: {str(e)}'
     }), 500
 
+def shutdown_gracefully(timeout=SHUTDOWN_TIMEOUT, clean_uploads=True):
+    """Stop admitting work, let in-flight requests and queued analyses finish, then clean the upload folder"""
+    logger.info(f"🛑 Draining: waiting up to {timeout}s for in-flight analyses")
+    admission.start_draining()
+    deadline = time.monotonic() + timeout
+    requests_done = admission.wait_idle(timeout)
+    jobs_done = job_queue.drain(max(0.0, deadline - time.monotonic()))
+    if requests_done and jobs_done:
+        logger.info("✅ Drained, all analyses finished")
+    else:
+        stats = job_queue.stats()
+        logger.warning(f"⚠️ Shutdown timed out with {admission.inflight} request(s) and "
+                       f"{stats['queue_depth'] + stats['running']} job(s) unfinished")
+    if clean_uploads:
+        clean_upload_folder(app.config['UPLOAD_FOLDER'])
+    return requests_done and jobs_done
+
+# Optional: load heavy dependencies in the background right after import
+if os.getenv('WARM_UP_ON_START', '').lower() in ('1', 'true', 'yes'):
+    start_background_warm_up()
+
 if __name__ == '__main__':
     print("🚀 Starting SquatForm Pro with Enhanced Model Management...")
     print(f"📁 Upload folder: {app.config['UPLOAD_FOLDER']}")
@@ -550,7 +1437,7 @@ if __name__ == '__main__':
             print(f"🎯 Total usable models: {len(available_models)}")
         
         # Display model manager status
-        status = model_manager.get_model_status()
+        status = get_model_manager().get_model_status()
         print(f"🔄 Model Manager Status:")
         print(f"   • Current model: {status['current_model']}")
         print(f"   • Available models: {status['available_models']}/{status['total_models']}")
@@ -559,4 +1446,5 @@ if __name__ == '__main__':
     
     print("🌐 Server starting on http://127.0.0.1:5000")
     print("📊 API Status: http://127.0.0.1:5000/api-status")
+    print("🏭 Development server only; run `python serve.py` in production")
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,392 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from exercises import get_exercise
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = os.getenv('HISTORY_DB_PATH', '/tmp/fitform_history.sqlite3')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Per-rep series stored per clip, one float32 column each; the first two are
+# the exercise's primary and secondary joint depths (see rep_columns)
+REP_COLUMNS = ('knee_depth', 'hip_depth', 'asymmetry', 'eccentric_s', 'concentric_s')
+
+# Depth (primary joint angle at the bottom) histogram kept in every rollup: 5° bins from 40° to 180°
+DEPTH_BINS = tuple(float(edge) for edge in range(40, 185, 5))
+
+_ATHLETE_ID = re.compile(r'^[A-Za-z0-9_.@-]{1,64}$')
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS clips ("
+    " id INTEGER PRIMARY KEY,"
+    " athlete TEXT NOT NULL,"
+    " exercise TEXT NOT NULL,"
+    " recorded_at REAL NOT NULL,"
+    " day TEXT NOT NULL,"
+    " video_hash TEXT,"
+    " form_score INTEGER,"
+    " squats_detected INTEGER NOT NULL,"
+    " duration REAL,"
+    " analysis_type TEXT,"
+    " breakdown TEXT,"
+    " feedback TEXT,"
+    " reps BLOB)",
+    "CREATE INDEX IF NOT EXISTS clips_athlete_time ON clips (athlete, exercise, recorded_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS clips_athlete_video ON clips (athlete, exercise, video_hash)",
+    "CREATE INDEX IF NOT EXISTS clips_video ON clips (video_hash)",
+    "CREATE TABLE IF NOT EXISTS daily_rollups ("
+    " athlete TEXT NOT NULL,"
+    " exercise TEXT NOT NULL,"
+    " day TEXT NOT NULL,"
+    " clips INTEGER NOT NULL,"
+    " scored_clips INTEGER NOT NULL DEFAULT 0,"
+    " reps INTEGER NOT NULL,"
+    " depth_reps INTEGER NOT NULL DEFAULT 0,"
+    " score_sum REAL NOT NULL,"
+    " score_min REAL,"
+    " score_max REAL,"
+    " depth_sum REAL NOT NULL,"
+    " depth_sq_sum REAL NOT NULL,"
+    " asymmetry_sum REAL NOT NULL,"
+    " asymmetry_reps INTEGER NOT NULL DEFAULT 0,"
+    " depth_hist BLOB NOT NULL,"
+    " PRIMARY KEY (athlete, exercise, day)) WITHOUT ROWID",
+)
+
+
+def valid_athlete_id(athlete):
+    return bool(athlete) and bool(_ATHLETE_ID.match(athlete))
+
+
+def rep_columns(exercise):
+    """REP_COLUMNS as an exercise's rep_details name them (deadlift: hip_depth, knee_depth, ...)"""
+    try:
+        primary, secondary = get_exercise(exercise).joint_names
+    except ValueError:
+        return REP_COLUMNS
+    return (f'{primary}_depth', f'{secondary}_depth') + REP_COLUMNS[2:]
+
+
+def pack_reps(rep_details, columns=REP_COLUMNS):
+    """Per-rep metrics as one little-endian float32 block, column after column (NaN = not measured)"""
+    import numpy as np
+    columns = np.array([[np.nan if rep.get(key) is None else rep[key] for rep in rep_details]
+                        for key in columns], dtype='<f4')
+    return columns.tobytes()
+
+
+def unpack_reps(blob, columns=REP_COLUMNS):
+    """Inverse of pack_reps: ``{column: float32 array}``"""
+    import numpy as np
+    if not blob:
+        return {key: np.empty(0, dtype=np.float32) for key in columns}
+    values = np.frombuffer(blob, dtype='<f4').reshape(len(columns), -1)
+    return dict(zip(columns, values))
+
+
+def _finite(values):
+    import numpy as np
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.isfinite(values)]
+
+
+class AthleteHistory:
+    """Per-athlete analysis history in SQLite.
+
+    Each analyzed clip is one row, with its per-rep series packed into a
+    columnar float32 blob instead of one row per rep. Inserting a clip also
+    folds it into a per-day rollup (counts, sums and a depth histogram) in
+    the same transaction, so trend queries read one small row per athlete
+    day no matter how many reps sit behind it.
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        for statement in SCHEMA:
+            conn.execute(statement)
+        # Rollups from before asymmetry_reps averaged asymmetry over every rep
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(daily_rollups)")}
+        if 'asymmetry_reps' not in columns:
+            conn.execute("ALTER TABLE daily_rollups ADD COLUMN asymmetry_reps INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE daily_rollups SET asymmetry_reps = reps")
+        # Rollups from before depth_reps counted measured depths as reps and averaged scores over every clip;
+        # the clip rows still hold the real rep counts and scores
+        if 'depth_reps' not in columns:
+            conn.execute("ALTER TABLE daily_rollups ADD COLUMN scored_clips INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE daily_rollups ADD COLUMN depth_reps INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                "UPDATE daily_rollups SET depth_reps = reps,"
+                " reps = (SELECT COALESCE(SUM(squats_detected), 0) FROM clips c WHERE c.athlete = daily_rollups.athlete"
+                " AND c.exercise = daily_rollups.exercise AND c.day = daily_rollups.day),"
+                " scored_clips = (SELECT COUNT(form_score) FROM clips c WHERE c.athlete = daily_rollups.athlete"
+                " AND c.exercise = daily_rollups.exercise AND c.day = daily_rollups.day)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; write transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, work):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record(self, athlete, exercise, analysis, recorded_at=None):
+        """Store one /analyze-style result; returns the clip id, or None if this video is already stored"""
+        import numpy as np
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        day = datetime.fromtimestamp(recorded_at, tz=timezone.utc).strftime('%Y-%m-%d')
+        reps = analysis.get('rep_details') or []
+        columns = rep_columns(exercise)
+        packed = pack_reps(reps, columns) if reps else None
+        series = unpack_reps(packed, columns)
+        depth = _finite(series[columns[0]])
+        asymmetry = _finite(series['asymmetry'])
+        score = analysis.get('form_score')
+        rep_count = analysis.get('reps_detected', analysis.get('squats_detected', len(reps))) or 0
+
+        def work(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO clips (athlete, exercise, recorded_at, day, video_hash, form_score,"
+                " squats_detected, duration, analysis_type, breakdown, feedback, reps)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (athlete, exercise, recorded_at, day, analysis.get('video_hash'), score,
+                 rep_count, analysis.get('video_duration'),
+                 analysis.get('analysis_type'), json.dumps(analysis.get('score_breakdown')),
+                 analysis.get('ai_feedback'), packed),
+            )
+            if cursor.rowcount == 0:
+                return None
+
+            row = conn.execute(
+                "SELECT clips, scored_clips, reps, depth_reps, score_sum, score_min, score_max, depth_sum,"
+                " depth_sq_sum, asymmetry_sum, asymmetry_reps, depth_hist"
+                " FROM daily_rollups WHERE athlete = ? AND exercise = ? AND day = ?",
+                (athlete, exercise, day)).fetchone()
+            if row is None:
+                row = (0, 0, 0, 0, 0.0, None, None, 0.0, 0.0, 0.0, 0, None)
+            (clips, scored_clips, total_reps, depth_reps, score_sum, score_min, score_max, depth_sum, depth_sq_sum,
+             asymmetry_sum, asymmetry_reps, hist) = row
+            hist = np.frombuffer(hist, dtype='<i4').copy() if hist else np.zeros(len(DEPTH_BINS) - 1, dtype='<i4')
+            hist += np.histogram(np.clip(depth, DEPTH_BINS[0], DEPTH_BINS[-1]), bins=DEPTH_BINS)[0].astype('<i4')
+            if score is not None:
+                scored_clips += 1
+                score_sum += score
+                score_min = score if score_min is None else min(score_min, score)
+                score_max = score if score_max is None else max(score_max, score)
+            conn.execute(
+                "INSERT OR REPLACE INTO daily_rollups (athlete, exercise, day, clips, scored_clips, reps, depth_reps,"
+                " score_sum, score_min, score_max, depth_sum, depth_sq_sum, asymmetry_sum, asymmetry_reps, depth_hist)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (athlete, exercise, day, clips + 1, scored_clips, total_reps + rep_count, depth_reps + len(depth),
+                 score_sum, score_min, score_max,
+                 depth_sum + float(depth.sum()), depth_sq_sum + float((depth ** 2).sum()),
+                 asymmetry_sum + float(asymmetry.sum()), asymmetry_reps + len(asymmetry), hist.tobytes()),
+            )
+            return cursor.lastrowid
+        return self._write(work)
+
+    def update_feedback(self, athlete, exercise, video_hash, feedback):
+        """Swap in feedback that arrived later (Gemini enrichment) for one athlete's stored clip"""
+        def work(conn):
+            return conn.execute("UPDATE clips SET feedback = ? WHERE athlete = ? AND exercise = ? AND video_hash = ?",
+                                (feedback, athlete, exercise, video_hash)).rowcount
+        return self._write(work)
+
+    def sessions(self, athlete, exercise=None, limit=DEFAULT_PAGE_SIZE, before=None):
+        """Newest-first page of clips; pass the returned ``next_before`` to get the next page"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        query = ("SELECT id, exercise, recorded_at, form_score, squats_detected, duration, analysis_type, breakdown"
+                 " FROM clips WHERE athlete = ?")
+        params = [athlete]
+        if exercise:
+            query += " AND exercise = ?"
+            params.append(exercise)
+        if before:
+            # Keyset cursor "recorded_at:id" so deep pages cost the same as the first
+            before_time, _, before_id = str(before).partition(':')
+            query += " AND (recorded_at < ? OR (recorded_at = ? AND id < ?))"
+            params += [float(before_time), float(before_time), int(before_id or 0)]
+        query += " ORDER BY recorded_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._connect().execute(query, params).fetchall()
+        items = [{
+            'id': row[0],
+            'exercise': row[1],
+            'recorded_at': datetime.fromtimestamp(row[2], tz=timezone.utc).isoformat(),
+            'form_score': row[3],
+            'reps_detected': row[4],
+            'squats_detected': row[4],
+            'video_duration': row[5],
+            'analysis_type': row[6],
+            'score_breakdown': json.loads(row[7]) if row[7] else None,
+        } for row in rows[:limit]]
+        next_before = f"{rows[limit - 1][2]!r}:{rows[limit - 1][0]}" if len(rows) > limit else None
+        return {'items': items, 'next_before': next_before}
+
+    def session(self, athlete, clip_id):
+        """One stored clip with its feedback and per-rep series"""
+        import numpy as np
+        row = self._connect().execute(
+            "SELECT id, exercise, recorded_at, video_hash, form_score, squats_detected, duration, analysis_type,"
+            " breakdown, feedback, reps FROM clips WHERE athlete = ? AND id = ?", (athlete, clip_id)).fetchone()
+        if row is None:
+            return None
+        series = unpack_reps(row[10], rep_columns(row[1]))
+        return {
+            'id': row[0],
+            'exercise': row[1],
+            'recorded_at': datetime.fromtimestamp(row[2], tz=timezone.utc).isoformat(),
+            'video_hash': row[3],
+            'form_score': row[4],
+            'reps_detected': row[5],
+            'squats_detected': row[5],
+            'video_duration': row[6],
+            'analysis_type': row[7],
+            'score_breakdown': json.loads(row[8]) if row[8] else None,
+            'ai_feedback': row[9],
+            'reps': {key: [None if np.isnan(v) else round(float(v), 2) for v in values]
+                     for key, values in series.items()},
+        }
+
+    def trends(self, athlete, exercise='squat', bucket='day', limit=DEFAULT_PAGE_SIZE, before=None):
+        """Score over time, depth distribution and asymmetry drift from the daily rollups.
+
+        ``bucket`` is 'day', 'week' or 'month'; periods come newest first,
+        ``limit`` per page, continuing from ``before`` (a period key).
+        """
+        import numpy as np
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        period_format = {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'}.get(bucket)
+        if period_format is None:
+            raise ValueError("bucket must be 'day', 'week' or 'month'")
+
+        query = (f"SELECT strftime('{period_format}', day) AS period, clips, scored_clips, reps, depth_reps, score_sum,"
+                 " score_min, score_max, depth_sum, depth_sq_sum, asymmetry_sum, asymmetry_reps, depth_hist"
+                 " FROM daily_rollups WHERE athlete = ? AND exercise = ?")
+        params = [athlete, exercise]
+        if before:
+            query += f" AND strftime('{period_format}', day) < ?"
+            params.append(before)
+        query += " ORDER BY day DESC"
+
+        periods = []
+        histogram = np.zeros(len(DEPTH_BINS) - 1, dtype=np.int64)
+        current = None
+        has_more = False
+        for row in self._connect().execute(query, params):
+            (period, clips, scored_clips, reps, depth_reps, score_sum, score_min, score_max, depth_sum, depth_sq_sum,
+             asymmetry_sum, asymmetry_reps, hist) = row
+            if current is None or current['period'] != period:
+                if len(periods) == limit:
+                    has_more = True
+                    break
+                current = {'period': period, 'clips': 0, 'scored_clips': 0, 'reps': 0, 'depth_reps': 0,
+                           'score_sum': 0.0, 'score_min': None, 'score_max': None, 'depth_sum': 0.0,
+                           'depth_sq_sum': 0.0, 'asymmetry_sum': 0.0, 'asymmetry_reps': 0}
+                periods.append(current)
+            current['clips'] += clips
+            current['scored_clips'] += scored_clips
+            current['reps'] += reps
+            current['depth_reps'] += depth_reps
+            current['score_sum'] += score_sum
+            current['depth_sum'] += depth_sum
+            current['depth_sq_sum'] += depth_sq_sum
+            current['asymmetry_sum'] += asymmetry_sum
+            current['asymmetry_reps'] += asymmetry_reps
+            if score_min is not None:
+                current['score_min'] = score_min if current['score_min'] is None else min(current['score_min'], score_min)
+                current['score_max'] = score_max if current['score_max'] is None else max(current['score_max'], score_max)
+            histogram += np.frombuffer(hist, dtype='<i4')
+
+        points = [_period_summary(p) for p in periods]
+        return {
+            'athlete': athlete,
+            'exercise': exercise,
+            'bucket': bucket,
+            'periods': points,
+            'depth_distribution': {
+                'bin_edges': list(DEPTH_BINS),
+                'counts': histogram.tolist(),
+            },
+            'asymmetry_drift_per_period': _drift([p['avg_asymmetry'] for p in reversed(points)]),
+            'score_drift_per_period': _drift([p['avg_score'] for p in reversed(points)]),
+            'next_before': points[-1]['period'] if has_more else None,
+        }
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            'clips': conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0],
+            'rollup_days': conn.execute("SELECT COUNT(*) FROM daily_rollups").fetchone()[0],
+        }
+
+
+def _period_summary(period):
+    # Averages divide by what was measured: scores by scored clips, depths by reps with a depth
+    depth_reps = period['depth_reps']
+    mean_depth = period['depth_sum'] / depth_reps if depth_reps else None
+    variance = period['depth_sq_sum'] / depth_reps - mean_depth ** 2 if depth_reps else None
+    return {
+        'period': period['period'],
+        'clips': period['clips'],
+        'reps': period['reps'],
+        'avg_score': round(period['score_sum'] / period['scored_clips'], 1) if period['scored_clips'] else None,
+        'min_score': period['score_min'],
+        'max_score': period['score_max'],
+        'avg_depth': round(mean_depth, 1) if depth_reps else None,
+        'depth_std': round(max(variance, 0.0) ** 0.5, 1) if depth_reps else None,
+        'avg_asymmetry': (round(period['asymmetry_sum'] / period['asymmetry_reps'], 2)
+                          if period['asymmetry_reps'] else None),
+    }
+
+
+def _drift(values):
+    """Least-squares slope per period over the non-empty values (oldest first)"""
+    import numpy as np
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if len(points) < 2:
+        return None
+    x = np.array([p[0] for p in points], dtype=np.float64)
+    y = np.array([p[1] for p in points], dtype=np.float64)
+    return round(float(np.polyfit(x, y, 1)[0]), 3)
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_athlete_history():
+    """Shared store, created on first use; None if the database cannot be opened"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                try:
+                    _history = AthleteHistory()
+                except Exception as e:
+                    logger.warning(f"⚠️ Athlete history unavailable: {e}")
+                    _history = False
+    return _history or None
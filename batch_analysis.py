@@ -0,0 +1,177 @@
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from video_engine import VIDEO_ENGINE_AVAILABLE, measure_video
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_CLIPS = int(os.getenv('MAX_BATCH_CLIPS', '10'))
+BATCH_DECODE_WORKERS = int(os.getenv('BATCH_DECODE_WORKERS', '0'))  # 0 = one per core
+
+
+def decode_worker_count():
+    return BATCH_DECODE_WORKERS or max(1, min(os.cpu_count() or 1, MAX_BATCH_CLIPS))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_decode_pool():
+    """Process pool for clip decoding, created on first batch.
+
+    Workers are spawned rather than forked so they never inherit the server's
+    threads or locks, and only import video_engine and rep_counter. Returns
+    None where process pools are unavailable (e.g. no /dev/shm on some
+    serverless hosts); callers then decode in-thread.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = ProcessPoolExecutor(max_workers=decode_worker_count(),
+                                                mp_context=multiprocessing.get_context('spawn'))
+                except (OSError, NotImplementedError) as e:
+                    logger.warning(f"⚠️ Process pool unavailable, decoding in-thread: {e}")
+                    _pool = False
+    return _pool or None
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def _measure_safely(clip):
+    video_path, video_hash, exercises = clip
+    try:
+        return measure_video(video_path, video_hash=video_hash, exercises=exercises)
+    except Exception as e:
+        logger.error(f"❌ Video decode failed for {os.path.basename(video_path)}: {e}")
+        return None
+
+
+def measure_clips(clips, exercises=None):
+    """Measure ``(video_path, video_hash)`` clips for ``exercises`` in parallel; a clip that cannot be decoded maps to None"""
+    if not VIDEO_ENGINE_AVAILABLE:
+        return [None] * len(clips)
+    clips = [(video_path, video_hash, exercises) for video_path, video_hash in clips]
+
+    # A single clip or a single core gains nothing from crossing a process boundary
+    pool = get_decode_pool() if len(clips) > 1 and decode_worker_count() > 1 else None
+    if pool is None:
+        return [_measure_safely(clip) for clip in clips]
+
+    try:
+        return list(pool.map(_measure_safely, clips))
+    except BrokenProcessPool as e:
+        logger.error(f"💥 Decode pool crashed, retrying in-thread: {e}")
+        _reset_pool()
+        return [_measure_safely(clip) for clip in clips]
+
+
+def build_batch_prompt(clips, exercise=None):
+    """One prompt covering every clip of a session.
+
+    ``clips`` is a list of ``(label, video_analysis)`` of one ``exercise``
+    (an exercises.Exercise, the default one when None); the answer is asked
+    for in ``CLIP n:`` sections so ``split_batch_feedback`` can hand each
+    clip its own feedback.
+    """
+    from exercises import get_exercise
+
+    exercise = exercise or get_exercise()
+    breakdown = "\n".join(f"        • {label}: [analysis]" for _, label, _ in exercise.dimensions)
+    prompt = f"""
+        As a professional fitness trainer, analyze {exercise.noun} form across {len(clips)} clips from one training session.
+
+        For EACH clip, start a section with a line "CLIP <number>:" and structure it as:
+
+        FORM SCORE: [75-95]%
+
+        TECHNICAL BREAKDOWN:
+{breakdown}
+
+        STRENGTHS:
+        • [specific strength]
+
+        AREAS FOR IMPROVEMENT:
+        • [specific improvement]
+
+        RECOMMENDATIONS:
+        • [practical drill or tip]
+
+        After the last clip, add a section starting with "SESSION SUMMARY:" comparing the clips
+        (fatigue, consistency, what to prioritize next session).
+
+        MEASURED DATA FROM THE VIDEOS:
+        """
+    for number, (label, video_analysis) in enumerate(clips, 1):
+        prompt += f"""
+        CLIP {number} ({label}): {video_analysis['reps_detected']} reps in {video_analysis['duration']:.1f}s"""
+        analysis_data = video_analysis.get('analysis_data')
+        if analysis_data:
+            prompt += "".join(f"\n        {line}" for line in exercise.measured_lines(analysis_data))
+    return prompt + "\n"
+
+
+_CLIP_HEADER = re.compile(r'^[\s*#]*CLIP\s+(\d+)\b[^:\n]*:?[*#]*', re.IGNORECASE | re.MULTILINE)
+_SUMMARY_HEADER = re.compile(r'^[\s*#]*SESSION SUMMARY\b[\s*:]*', re.IGNORECASE | re.MULTILINE)
+
+
+def split_batch_feedback(feedback, count):
+    """Split a combined answer into (per-clip feedback list, session summary).
+
+    Clips the model skipped get None so the caller can fall back for them.
+    """
+    summary = ''
+    match = _SUMMARY_HEADER.search(feedback)
+    if match:
+        summary = feedback[match.end():].strip()
+        feedback = feedback[:match.start()]
+
+    sections = [None] * count
+    headers = list(_CLIP_HEADER.finditer(feedback))
+    for i, header in enumerate(headers):
+        number = int(header.group(1))
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(feedback)
+        if 1 <= number <= count and sections[number - 1] is None:
+            sections[number - 1] = feedback[header.end():end].strip() or None
+    return sections, summary
+
+
+def summarize_session(clip_results):
+    """Totals and extremes across the per-clip /analyze-style results"""
+    if not clip_results:
+        return {'clips': 0}
+    # Clips without a score (nothing moved) count towards the totals but not the score stats
+    scored = [i for i, clip in enumerate(clip_results) if clip['form_score'] is not None]
+    scores = [clip_results[i]['form_score'] for i in scored]
+    session = {
+        'clips': len(clip_results),
+        'total_reps': sum(clip.get('reps_detected', clip['squats_detected']) for clip in clip_results),
+        'total_duration': round(sum(clip['video_duration'] for clip in clip_results), 2),
+        'average_form_score': None,
+        'best_clip': None,
+        'worst_clip': None,
+        'score_spread': None,
+    }
+    if scored:
+        best = max(scored, key=lambda i: clip_results[i]['form_score'])
+        worst = min(scored, key=lambda i: clip_results[i]['form_score'])
+        session.update({
+            'average_form_score': round(sum(scores) / len(scores), 1),
+            'best_clip': clip_results[best]['filename'],
+            'worst_clip': clip_results[worst]['filename'],
+            'score_spread': max(scores) - min(scores),
+        })
+    return session
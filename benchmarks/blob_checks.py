@@ -0,0 +1,107 @@
+"""Blob fetch checks against the local blob stand-in.
+
+Serves a synthetic clip padded to ``--clip-mb`` from ``blob_server.BlobServer``
+and checks that fetch_blob resumes ranges the stand-in cuts off mid-body
+(more cuts than BLOB_RETRIES, but never that many in a row) and that the
+stored bytes and hash match the blob. Through /analyze it checks that a
+blob URL is analyzed like an upload, that a host off the allow-list is
+refused with 400 and a missing blob answers 404, and that no spooled byte
+or file is left behind. Exits non-zero on the first failure.
+
+    python benchmarks/blob_checks.py --clip-mb 8
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+os.environ.pop('GEMINI_API_KEY', None)
+
+from blob_server import BlobServer  # noqa: E402
+from startup_bench import make_clip  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def padded_clip(clip_mb):
+    """A real clip plus trailing padding up to ``clip_mb``"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'clip.mp4')
+        if not make_clip(path):
+            sys.exit("OpenCV is required to build the test clip")
+        with open(path, 'rb') as f:
+            clip = f.read()
+    return clip + b'\0' * max(0, clip_mb * MB - len(clip))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clip-mb', type=int, default=8)
+    args = parser.parse_args()
+
+    # Every other GET is cut after half its range, so a 1 MB range size means
+    # one cut per range: more cuts in total than BLOB_RETRIES allows in a row
+    server = BlobServer(cut_every=2).start()
+    os.environ['BLOB_ALLOWED_HOSTS'] = f'{server.host}:{server.port}'
+    os.environ['BLOB_RANGE_MB'] = '1'
+
+    import app
+    from blob_fetch import BLOB_RETRIES, fetch_blob
+    from upload_spool import discard_upload, spool_budget
+
+    client = app.app.test_client()
+    folder = app.app.config['UPLOAD_FOLDER']
+    data = padded_clip(args.clip_mb)
+    expected_hash = hashlib.sha256(data).hexdigest()
+    url = server.put('clip.mp4', data)
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"{'PASS' if ok else 'FAIL'}  {name}  {detail}")
+        if not ok:
+            failures.append(name)
+
+    def released():
+        return spool_budget.in_use == 0 and not os.listdir(folder)
+
+    try:
+        gets = server.stats()['requests']['GET']
+        try:
+            path, size, video_hash = fetch_blob(url, folder, app.app.config['MAX_CONTENT_LENGTH'])
+        except Exception as e:
+            check('cut ranges resumed', False, repr(e))
+        else:
+            cuts = (server.stats()['requests']['GET'] - gets) // 2
+            with open(path, 'rb') as f:
+                stored = f.read()
+            discard_upload(path)
+            check(f'cut ranges resumed ({cuts} cuts, {BLOB_RETRIES} retries in a row)',
+                  size == len(data) and cuts > BLOB_RETRIES, f'{size} of {len(data)} bytes')
+            check('stored bytes and hash match the blob', stored == data and video_hash == expected_hash,
+                  video_hash[:12])
+        check('fetch spool released', released(), f'{spool_budget.in_use} bytes, {os.listdir(folder)}')
+
+        response = client.post('/analyze?ai=off', json={'blob_url': url})
+        body = response.get_json() or {}
+        check('blob URL analyzed like an upload', response.status_code == 200 and body.get('video_hash') == expected_hash,
+              f"status {response.status_code}, hash {str(body.get('video_hash'))[:12]}")
+
+        response = client.post('/analyze?ai=off', json={'blob_url': 'http://203.0.113.7/clip.mp4'})
+        check('host off the allow-list refused', response.status_code == 400, f'status {response.status_code}')
+
+        response = client.post('/analyze?ai=off', json={'blob_url': server.url('missing.mp4')})
+        check('missing blob answers 404', response.status_code == 404, f'status {response.status_code}')
+        check('analysis spool released', released(), f'{spool_budget.in_use} bytes, {os.listdir(folder)}')
+    finally:
+        server.stop()
+
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")
+
+
+if __name__ == '__main__':
+    main()
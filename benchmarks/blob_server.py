@@ -0,0 +1,170 @@
+"""Local stand-in for the blob store used by the direct-upload path.
+
+Keeps blobs in memory and serves them over HTTP/1.1 with keep-alive and
+``Range`` support, the way the real store does for analysis-by-URL:
+
+- ``PUT /<name>`` stores a blob (the client's direct upload)
+- ``GET /<name>`` / ``HEAD /<name>`` serve it, honouring ``Range: bytes=a-b``
+- ``POST /upload`` answers ``{"url": ...}`` like the upload-URL API
+
+Faults can be injected to exercise timeouts and retries: ``fail_every``
+answers every n-th GET with 503, ``cut_every`` drops every n-th GET after
+half its body, ``latency`` delays each answer.
+
+    python benchmarks/blob_server.py --port 8900 --put clip.mp4
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class BlobServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_every=0, cut_every=0):
+        self.blobs = {}
+        self.latency = latency
+        self.fail_every = fail_every
+        self.cut_every = cut_every
+        self.requests = {'GET': 0, 'HEAD': 0, 'PUT': 0, 'POST': 0}
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def url(self, name):
+        return f'{self.base_url}/{name}'
+
+    def put(self, name, data):
+        with self._lock:
+            self.blobs[name] = bytes(data)
+        return self.url(name)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, method):
+        with self._lock:
+            self.requests[method] += 1
+            return self.requests[method]
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'connections': self.connections, 'blobs': len(self.blobs)}
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            with server._lock:
+                server.connections += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b'', headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def _serve(self):
+            count = server._count(self.command)
+            if server.latency:
+                time.sleep(server.latency)
+            if self.command == 'GET' and server.fail_every and count % server.fail_every == 0:
+                return self._send(503, b'injected failure', {'Retry-After': '0'})
+
+            data = server.blobs.get(self.path.lstrip('/').split('?')[0])
+            if data is None:
+                return self._send(404, b'not found')
+
+            match = _RANGE.fullmatch(self.headers.get('Range', '').strip())
+            if not match:
+                return self._send(200, data, {'Accept-Ranges': 'bytes', 'Content-Type': 'video/mp4'})
+            first, last = match.groups()
+            if first == '':
+                first, last = max(0, len(data) - int(last)), len(data) - 1
+            first, last = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+            if first >= len(data) or first > last:
+                return self._send(416, b'', {'Content-Range': f'bytes */{len(data)}'})
+
+            body = data[first:last + 1]
+            headers = {'Accept-Ranges': 'bytes', 'Content-Type': 'video/mp4',
+                       'Content-Range': f'bytes {first}-{last}/{len(data)}'}
+            if self.command == 'GET' and server.cut_every and count % server.cut_every == 0 and len(body) > 1:
+                # Promise the whole range, send half, then hang up
+                self.send_response(206)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            self._send(206, body, headers)
+
+        do_GET = _serve
+        do_HEAD = _serve
+
+        def do_PUT(self):
+            server._count('PUT')
+            length = int(self.headers.get('Content-Length') or 0)
+            url = server.put(self.path.lstrip('/'), self.rfile.read(length))
+            self._send(200, ('{"url": "%s"}' % url).encode(), {'Content-Type': 'application/json'})
+
+        def do_POST(self):
+            server._count('POST')
+            length = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(length)
+            name = f'upload-{server.requests["POST"]}.mp4'
+            body = ('{"url": "%s?token=stand-in"}' % server.url(name)).encode()
+            self._send(200, body, {'Content-Type': 'application/json'})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--put', nargs='*', default=[], help='files to serve under their basename')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--fail-every', type=int, default=0)
+    parser.add_argument('--cut-every', type=int, default=0)
+    args = parser.parse_args()
+
+    server = BlobServer(args.host, args.port, args.latency, args.fail_every, args.cut_every)
+    for path in args.put:
+        with open(path, 'rb') as f:
+            print(server.put(os.path.basename(path), f.read()))
+    print(f"Blob stand-in on {server.base_url} (set BLOB_ALLOWED_HOSTS={server.host}:{server.port})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
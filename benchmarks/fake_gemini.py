@@ -0,0 +1,182 @@
+"""Local stand-in for the ``google.generativeai`` module.
+
+Mimics the parts of the SDK the app touches (``configure``, ``list_models``,
+``GenerativeModel.generate_content`` and ``response.text``) with configurable
+latency, error rate and 429 behaviour, and counts every upstream call so
+benchmarks can report calls per request without spending real quota.
+
+    fake = FakeGenAI(latency=0.8, error_rate=0.05, rpm=15)
+    fake.install()      # gemini_client.get_genai() now returns ``fake``
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+
+SAMPLE_FEEDBACK = """FORM SCORE: {score}%
+
+TECHNICAL BREAKDOWN:
+• Depth & Range of Motion: Reaches parallel on most reps with a controlled descent.
+• Knee Alignment & Tracking: Knees track over the toes with slight drift on the last reps.
+• Spinal Position & Posture: Neutral spine held through the set.
+• Tempo & Control: Controlled descent and a strong drive out of the hole.
+• Rep Consistency: Depth and rhythm hold steady across the set.
+
+STRENGTHS:
+• Consistent tempo
+• Solid bracing
+• Full lockout at the top
+
+AREAS FOR IMPROVEMENT:
+• Keep the chest up during the ascent
+• Control knee drift when fatigued
+• Hold depth on the final reps
+
+RECOMMENDATIONS:
+• Pause squats at parallel
+• Tempo squats (3-1-3)
+• Ankle mobility drills before sessions
+"""
+
+QUOTA_ERROR = "429 Resource has been exhausted (e.g. check quota)."
+RATE_ERROR = "429 Quota exceeded for quota metric 'Generate Content requests per minute'"
+TRANSIENT_ERROR = "503 The service is currently unavailable."
+
+DEFAULT_MODELS = (
+    "gemini-2.0-flash", "gemini-2.0-flash-001", "gemini-1.5-flash", "gemini-2.5-pro",
+    "gemini-2.5-flash-lite", "gemini-2.0-flash-lite", "gemini-2.5-flash",
+)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamResponse:
+    """Iterable of ``FakeResponse`` pieces, like a ``stream=True`` answer"""
+
+    def __init__(self, text, piece_chars, piece_delay):
+        self.text = text
+        self._pieces = [text[i:i + piece_chars] for i in range(0, len(text), piece_chars)]
+        self._piece_delay = piece_delay
+
+    def __iter__(self):
+        for n, piece in enumerate(self._pieces):
+            if n and self._piece_delay:
+                time.sleep(self._piece_delay)
+            yield FakeResponse(piece)
+
+
+class FakeModelInfo:
+    def __init__(self, name):
+        self.name = f"models/{name}"
+        self.supported_generation_methods = ['generateContent', 'countTokens']
+
+
+class FakeGenerativeModel:
+    def __init__(self, genai, model_name):
+        self._genai = genai
+        self.model_name = f"models/{model_name}"
+
+    def generate_content(self, prompt, **kwargs):
+        return self._genai._generate(self.model_name.split('/')[-1], prompt, kwargs)
+
+
+class FakeGenAI:
+    """Drop-in for ``google.generativeai`` driven by a few knobs.
+
+    ``latency``/``jitter`` set the response time in seconds, ``error_rate``
+    is the share of calls failing with a 503, ``quota_exhausted`` lists
+    models that always answer 429 (daily quota) and ``rpm`` makes every
+    model answer a per-minute 429 once it has been called that many times
+    within the last 60 seconds. With ``stream=True`` the answer arrives in
+    ``stream_chars``-sized pieces: ``latency`` is the time to the first
+    piece and ``stream_delay`` the gap between pieces.
+    """
+
+    __version__ = 'fake'
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, quota_exhausted=(), rpm=None,
+                 models=DEFAULT_MODELS, seed=None, stream_chars=40, stream_delay=0.05):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_exhausted = set(quota_exhausted)
+        self.rpm = rpm
+        self.models = tuple(models)
+        self.stream_chars = stream_chars
+        self.stream_delay = stream_delay
+        self._random = random.Random(seed)
+        self._recent = {}
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.errors = {}
+
+    # SDK surface ---------------------------------------------------------
+    def configure(self, api_key=None, **kwargs):
+        pass
+
+    def list_models(self):
+        return [FakeModelInfo(name) for name in self.models]
+
+    def GenerativeModel(self, model_name, **kwargs):
+        return FakeGenerativeModel(self, model_name)
+
+    # Behaviour -----------------------------------------------------------
+    def _generate(self, model_name, prompt, kwargs):
+        now = time.monotonic()
+        with self._lock:
+            self.calls[model_name] = self.calls.get(model_name, 0) + 1
+            failure = self._pick_failure(model_name, now)
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.latency else 0.0
+            score = self._random.randint(78, 94)
+        if failure is not None:
+            time.sleep(min(delay, 0.05))
+            with self._lock:
+                self.errors[model_name] = self.errors.get(model_name, 0) + 1
+            raise Exception(failure)
+        time.sleep(delay)
+        clips = len(re.findall(r'^\s*CLIP \d+ \(', prompt, re.MULTILINE))
+        if clips:
+            # Combined session prompt (/analyze-batch): one section per clip
+            sections = [f"CLIP {n}:\n" + SAMPLE_FEEDBACK.format(score=score - n % 5) for n in range(1, clips + 1)]
+            text = "\n".join(sections) + "\nSESSION SUMMARY:\n• Depth held across the session\n"
+        else:
+            text = SAMPLE_FEEDBACK.format(score=score)
+        if kwargs.get('stream'):
+            return FakeStreamResponse(text, self.stream_chars, self.stream_delay)
+        return FakeResponse(text)
+
+    def _pick_failure(self, model_name, now):
+        """Error message for this call, or None (lock held)"""
+        if model_name not in self.models:
+            return f"404 models/{model_name} is not found"
+        if model_name in self.quota_exhausted:
+            return QUOTA_ERROR
+        if self.rpm:
+            recent = self._recent.setdefault(model_name, deque())
+            while recent and now - recent[0] > 60:
+                recent.popleft()
+            if len(recent) >= self.rpm:
+                return RATE_ERROR
+            recent.append(now)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return TRANSIENT_ERROR
+        return None
+
+    # Harness helpers -----------------------------------------------------
+    def install(self):
+        """Make ``gemini_client.get_genai()`` (and so the whole app) use this fake"""
+        import gemini_client
+        gemini_client._genai = self
+        return self
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def stats(self):
+        with self._lock:
+            return {'calls': dict(self.calls), 'errors': dict(self.errors)}
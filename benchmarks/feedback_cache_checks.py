@@ -0,0 +1,84 @@
+"""Feedback cache checks against the local Gemini stand-in.
+
+Posts one synthetic clip to /analyze?ai=inline twice, with different
+trailing bytes so the result cache cannot answer the second request, and
+checks that the second request's Gemini feedback comes from the feedback
+cache without an upstream call. It then calls analyze_with_gemini_enhanced
+directly to check that angles inside the same bucket share an entry and
+that a different rule-based score does not. Exits non-zero on failures.
+
+    python benchmarks/feedback_cache_checks.py
+"""
+import io
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+os.environ['GEMINI_API_KEY'] = os.environ.get('FAKE_GEMINI_API_KEY', 'fake-key')
+os.environ['FEEDBACK_CACHE_BACKEND'] = 'memory'
+
+from fake_gemini import FakeGenAI  # noqa: E402
+from startup_bench import make_clip  # noqa: E402
+
+
+def main():
+    fake = FakeGenAI(latency=0.0, jitter=0.0).install()
+    import app
+    from gemini_client import gemini_client
+    for name in fake.models:
+        gemini_client.limits[name] = (10 ** 6, 10 ** 9)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'clip.mp4')
+        if not make_clip(path):
+            sys.exit("OpenCV is required to build the test clip")
+        with open(path, 'rb') as f:
+            clip = f.read()
+
+    client = app.app.test_client()
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"{'PASS' if ok else 'FAIL'}  {name}  {detail}")
+        if not ok:
+            failures.append(name)
+
+    def post(payload):
+        response = client.post('/analyze?ai=inline', data={'file': (io.BytesIO(payload), 'clip.mp4')},
+                               content_type='multipart/form-data')
+        return response.status_code, response.get_json() or {}
+
+    status, first = post(clip + b'\1')
+    calls = fake.total_calls()
+    check('first request answered by Gemini', status == 200 and first.get('is_ai_analysis'),
+          f"status {status}, {calls} upstream calls")
+
+    status, second = post(clip + b'\2')
+    check('repeated request makes no upstream call', fake.total_calls() == calls,
+          f"{fake.total_calls() - calls} new calls")
+    check('repeated request gets the cached feedback',
+          status == 200 and second.get('is_ai_analysis') and second.get('ai_feedback') == first.get('ai_feedback'),
+          f"status {status}, model {second.get('analysis_type')}")
+
+    analysis_data = {'knee_angles': {'left': 96.0, 'right': 98.0}, 'hip_angles': {'left': 70.0, 'right': 71.0},
+                     'notes': ["8 repetitions detected"], 'exercise': 'squat'}
+    scoring = {'score': 88, 'breakdown': {'depth': 90, 'knee_tracking': 85}}
+    app.analyze_with_gemini_enhanced(analysis_data, scoring)
+    calls = fake.total_calls()
+    nearby = dict(analysis_data, knee_angles={'left': 95.6, 'right': 97.1}, notes=["9 repetitions detected"])
+    result = app.analyze_with_gemini_enhanced(nearby, scoring)
+    check('angles in the same bucket share an entry', result.get('is_gemini') and fake.total_calls() == calls,
+          f"{fake.total_calls() - calls} new calls")
+    result = app.analyze_with_gemini_enhanced(analysis_data, dict(scoring, score=72))
+    check('a different rule-based score is asked again', result.get('is_gemini') and fake.total_calls() == calls + 1,
+          f"{fake.total_calls() - calls} new calls")
+
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")
+
+
+if __name__ == '__main__':
+    main()
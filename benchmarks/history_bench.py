@@ -0,0 +1,109 @@
+"""Athlete history benchmark: bulk inserts, then trend and page query latency.
+
+Seeds a throwaway SQLite history with synthetic clips (``--athletes`` x
+``--clips`` clips of ``--reps`` reps each, spread over ``--days``) and times
+the queries behind /athletes/<id>/trends and /athletes/<id>/sessions.
+
+    python benchmarks/history_bench.py --athletes 100 --clips 1000 --reps 10
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from athlete_history import AthleteHistory  # noqa: E402
+
+
+def synthetic_analysis(rng, reps, clip_number):
+    knee = rng.uniform(75, 130)
+    rep_details = [{
+        'knee_depth': round(knee + rng.gauss(0, 4), 1),
+        'hip_depth': round(knee - 25 + rng.gauss(0, 4), 1),
+        'asymmetry': round(abs(rng.gauss(3, 2)), 1),
+        'eccentric_s': round(rng.uniform(0.6, 1.8), 2),
+        'concentric_s': round(rng.uniform(0.5, 1.2), 2),
+    } for _ in range(reps)]
+    return {
+        'form_score': rng.randint(55, 98),
+        'score_breakdown': {'depth': 30, 'tempo': 20},
+        'squats_detected': reps,
+        'rep_details': rep_details,
+        'video_duration': reps * 2.5,
+        'analysis_type': 'rule_engine',
+        'ai_feedback': 'Solid set. Keep your chest up.',
+        'video_hash': f'{clip_number:064x}',
+    }
+
+
+def timed(call, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, {'median_ms': round(statistics.median(timings), 2), 'max_ms': round(max(timings), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--athletes', type=int, default=20)
+    parser.add_argument('--clips', type=int, default=500, help='clips per athlete')
+    parser.add_argument('--reps', type=int, default=10, help='reps per clip')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--db', help='history database (default: a temporary file)')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'history.sqlite3')
+    history = AthleteHistory(path)
+    rng = random.Random(7)
+    now = time.time()
+
+    started = time.perf_counter()
+    clip_number = 0
+    for athlete in range(args.athletes):
+        for _ in range(args.clips):
+            clip_number += 1
+            recorded_at = now - rng.uniform(0, args.days) * 86400
+            history.record(f'athlete-{athlete}', 'squat', synthetic_analysis(rng, args.reps, clip_number), recorded_at)
+    insert_seconds = time.perf_counter() - started
+    total_clips = args.athletes * args.clips
+
+    probe = 'athlete-0'
+    _, day_trend = timed(lambda: history.trends(probe, bucket='day', limit=90), args.runs)
+    _, week_trend = timed(lambda: history.trends(probe, bucket='week', limit=52), args.runs)
+    first_page, first_sessions = timed(lambda: history.sessions(probe, limit=50), args.runs)
+    deep_cursor = first_page['next_before']
+    for _ in range(min(5, args.clips // 50)):
+        deep_cursor = history.sessions(probe, limit=50, before=deep_cursor)['next_before'] or deep_cursor
+    _, deep_sessions = timed(lambda: history.sessions(probe, limit=50, before=deep_cursor), args.runs)
+    _, one_clip = timed(lambda: history.session(probe, first_page['items'][0]['id']), args.runs)
+
+    results = {
+        'clips': total_clips,
+        'reps': total_clips * args.reps,
+        'insert_clips_per_s': round(total_clips / insert_seconds, 1),
+        'db_mb': round(os.path.getsize(path) / (1024 * 1024), 1),
+        'store': history.stats(),
+        'trends_day_90': day_trend,
+        'trends_week_52': week_trend,
+        'sessions_first_page': first_sessions,
+        'sessions_deep_page': deep_sessions,
+        'session_detail': one_clip,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
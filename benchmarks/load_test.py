@@ -0,0 +1,325 @@
+"""Offline load test for /analyze against a local Gemini stand-in.
+
+Drives the upload path, GeminiModelManager and analyze_with_gemini_enhanced
+at a fixed concurrency, either in-process through Flask's test client or
+over HTTP against a threaded werkzeug server, with ``fake_gemini.FakeGenAI``
+in place of the SDK. Reports throughput, latency percentiles, upstream
+calls per request and peak RSS; with ``--baseline`` it exits non-zero when
+a metric is worse than the baseline by more than ``--threshold``.
+
+Requests ask for ``ai=inline`` by default so the timed round trip includes
+Gemini; with ``--ai async`` the response is timed and each enrichment job is
+then waited for, so ``gemini_share`` and the upstream calls still count it.
+Every request sends the same clip with a few unique trailing bytes (unless
+``--no-unique``), so the result cache cannot answer it but its measurements
+match: once the first requests have been answered, analyze_with_gemini_enhanced
+serves Gemini's feedback from the feedback cache and upstream calls per
+request stay below one. With ``--no-unique`` repeats come from the result
+cache instead.
+
+    python benchmarks/load_test.py --requests 60 --concurrency 8 --output base.json
+    python benchmarks/load_test.py --requests 60 --concurrency 8 --baseline base.json
+    python benchmarks/load_test.py --server wsgi --error-rate 0.1 --rpm 15
+    python benchmarks/load_test.py --source blob --blob-fail-every 7
+
+``--source blob`` stores each clip on the local blob stand-in
+(``blob_server.BlobServer``) and posts its URL, so the server pulls it with
+range requests instead of receiving a multipart body.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+
+from blob_server import BlobServer  # noqa: E402
+from fake_gemini import FakeGenAI  # noqa: E402
+from startup_bench import make_clip  # noqa: E402
+
+# Metric -> direction in which it gets worse
+REGRESSION_CHECKS = {
+    'throughput_rps': 'lower',
+    'latency_ms.p50': 'higher',
+    'latency_ms.p95': 'higher',
+    'latency_ms.p99': 'higher',
+    'upstream_calls_per_request': 'higher',
+    'peak_rss_mb': 'higher',
+}
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of ``values`` (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class TestClientTransport:
+    """In-process requests through Flask's test client (one client per thread)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def post_video(self, path, payload, mode, ai):
+        response = self._client().post(f'/analyze?mode={mode}&ai={ai}', data={'file': (payload, 'load.mp4')},
+                                       content_type='multipart/form-data')
+        return response.status_code, response.get_json(silent=True) or {}
+
+    def post_blob(self, blob_url, mode, ai):
+        response = self._client().post(f'/analyze?mode={mode}&ai={ai}', json={'blob_url': blob_url})
+        return response.status_code, response.get_json(silent=True) or {}
+
+    def get_json(self, path):
+        response = self._client().get(path)
+        return response.status_code, response.get_json(silent=True) or {}
+
+    def close(self):
+        pass
+
+
+class WSGITransport:
+    """Real HTTP over a threaded werkzeug server on an ephemeral port"""
+
+    def __init__(self, app):
+        import requests
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=64)
+        self.session.mount('http://', adapter)
+
+    def post_video(self, path, payload, mode, ai):
+        response = self.session.post(f'{self.base_url}/analyze?mode={mode}&ai={ai}',
+                                     files={'file': ('load.mp4', payload, 'video/mp4')}, timeout=300)
+        return response.status_code, _json_or_empty(response)
+
+    def post_blob(self, blob_url, mode, ai):
+        response = self.session.post(f'{self.base_url}/analyze?mode={mode}&ai={ai}', json={'blob_url': blob_url},
+                                     timeout=300)
+        return response.status_code, _json_or_empty(response)
+
+    def get_json(self, path):
+        response = self.session.get(self.base_url + path, timeout=30)
+        return response.status_code, _json_or_empty(response)
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _json_or_empty(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def wait_job(transport, job_url):
+    """Poll a /jobs URL until it finishes; (status, result)"""
+    while True:
+        status, job = transport.get_json(job_url)
+        if job.get('status') in ('done', 'failed'):
+            return (200 if job['status'] == 'done' else 500), job.get('result') or {}
+        time.sleep(0.05)
+
+
+def run_one(transport, video_bytes, mode, ai, unique, blob_server=None):
+    """One /analyze round trip; async mode polls the job until it finishes.
+
+    With ``ai='async'`` the Gemini enrichment job is waited for after the
+    round trip is timed, so its upstream calls land in this request's count.
+    """
+    payload = video_bytes + uuid.uuid4().bytes if unique else video_bytes
+    blob_url = None
+    if blob_server is not None:
+        # The client's direct upload happens before /analyze and is not timed
+        blob_url = blob_server.put(f'{uuid.uuid4().hex if unique else "load"}.mp4', payload)
+    started = time.perf_counter()
+    if blob_url:
+        status, body = transport.post_blob(blob_url, mode, ai)
+    else:
+        status, body = transport.post_video('/analyze', io.BytesIO(payload), mode, ai)
+    if mode == 'async' and status == 202:
+        status, body = wait_job(transport, body['status_url'])
+    latency = time.perf_counter() - started
+    is_gemini = bool(body.get('is_ai_analysis'))
+    enrichment = body.get('enrichment') or {}
+    if not is_gemini and enrichment.get('status') == 'pending':
+        _, enriched = wait_job(transport, enrichment['status_url'])
+        is_gemini = bool(enriched.get('is_ai_analysis'))
+    return {
+        'latency': latency,
+        'status': status,
+        'is_gemini': is_gemini,
+    }
+
+
+def run_load(args):
+    os.environ['GEMINI_API_KEY'] = os.environ.get('FAKE_GEMINI_API_KEY', 'fake-key')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    blob_server = None
+    if args.source == 'blob':
+        blob_server = BlobServer(fail_every=args.blob_fail_every, cut_every=args.blob_cut_every).start()
+        os.environ['BLOB_ALLOWED_HOSTS'] = f'{blob_server.host}:{blob_server.port}'
+
+    fake = FakeGenAI(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     quota_exhausted=args.quota_models, rpm=args.rpm, seed=args.seed).install()
+    import app as app_module
+    import gemini_client as gemini_client_module
+    if args.unthrottled:
+        for name in fake.models:
+            gemini_client_module.gemini_client.limits[name] = (10 ** 6, 10 ** 9)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            video = os.path.join(tmp, 'load.mp4')
+            if not make_clip(video):
+                raise SystemExit("OpenCV is needed to generate a clip; pass --video")
+        with open(video, 'rb') as f:
+            video_bytes = f.read()
+
+    transport = (WSGITransport if args.server == 'wsgi' else TestClientTransport)(app_module.app)
+    try:
+        for _ in range(args.warmup):
+            run_one(transport, video_bytes, args.mode, args.ai, args.unique, blob_server)
+        warmup_calls = fake.total_calls()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda _: run_one(transport, video_bytes, args.mode, args.ai, args.unique, blob_server),
+                                    range(args.requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        transport.close()
+        if blob_server is not None:
+            blob_server.stop()
+
+    latencies = [r['latency'] * 1000 for r in results if r['status'] == 200]
+    status_counts = {}
+    for r in results:
+        status_counts[str(r['status'])] = status_counts.get(str(r['status']), 0) + 1
+    upstream_calls = fake.total_calls() - warmup_calls
+
+    return {
+        'config': {
+            'server': args.server, 'mode': args.mode, 'ai': args.ai, 'source': args.source, 'requests': args.requests,
+            'concurrency': args.concurrency, 'latency': args.latency, 'jitter': args.jitter,
+            'error_rate': args.error_rate, 'rpm': args.rpm, 'quota_models': args.quota_models,
+            'unique': args.unique, 'unthrottled': args.unthrottled,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'status_counts': status_counts,
+        'gemini_share': round(sum(r['is_gemini'] for r in results) / len(results), 3) if results else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 1),
+            'p95': round(percentile(latencies, 95), 1),
+            'p99': round(percentile(latencies, 99), 1),
+            'max': round(max(latencies), 1) if latencies else 0.0,
+        },
+        'upstream_calls': upstream_calls,
+        'upstream_calls_per_request': round(upstream_calls / len(results), 3) if results else 0.0,
+        'upstream': fake.stats(),
+        'blob_store': blob_server.stats() if blob_server is not None else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _lookup(report, dotted):
+    value = report
+    for part in dotted.split('.'):
+        value = (value or {}).get(part)
+    return value
+
+
+def compare(report, baseline, threshold):
+    """Regressions larger than ``threshold`` (a fraction) against ``baseline``"""
+    regressions = []
+    for metric, worse in REGRESSION_CHECKS.items():
+        current, previous = _lookup(report, metric), _lookup(baseline, metric)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (worse == 'higher' and change > threshold) or (worse == 'lower' and -change > threshold):
+            regressions.append(f"{metric}: {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--server', choices=('testclient', 'wsgi'), default='testclient')
+    parser.add_argument('--mode', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--ai', choices=('inline', 'async', 'off'), default='inline',
+                        help='Gemini enrichment per request; async jobs are awaited after timing')
+    parser.add_argument('--source', choices=('multipart', 'blob'), default='multipart',
+                        help='send clips as multipart bodies or as blob URLs on the local stand-in')
+    parser.add_argument('--blob-fail-every', type=int, default=0, help='stand-in answers every n-th GET with 503')
+    parser.add_argument('--blob-cut-every', type=int, default=0, help='stand-in drops every n-th GET mid-body')
+    parser.add_argument('--video', help='clip to upload (default: generated)')
+    parser.add_argument('--warmup', type=int, default=1, help='requests sent before measuring')
+    parser.add_argument('--latency', type=float, default=0.5, help='fake Gemini mean latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.1, help='fake Gemini latency stddev (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls failing with 503')
+    parser.add_argument('--rpm', type=int, help='per-model requests/minute before the fake answers 429')
+    parser.add_argument('--quota-models', nargs='*', default=[], help='models whose daily quota is gone')
+    parser.add_argument('--unthrottled', action='store_true', help='lift the local per-model rate limits')
+    parser.add_argument('--no-unique', dest='unique', action='store_false',
+                        help='upload identical bytes (measures the result cache instead)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the report as JSON (use as a later --baseline)')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed regression (fraction)')
+    args = parser.parse_args()
+
+    report = run_load(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("REGRESSIONS:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
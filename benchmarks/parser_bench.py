@@ -0,0 +1,110 @@
+"""Feedback parser micro-benchmark: the single-pass parser against the old score extractor.
+
+Times ``parse_feedback`` (full structure) and ``FeedbackParser`` fed in
+streamed pieces, next to the split-based ``extract_score_from_feedback``
+that /analyze used before (kept here as the baseline), on typical, large
+and malformed Gemini answers.
+
+    python benchmarks/parser_bench.py --runs 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(REPO_ROOT))
+sys.path.insert(0, REPO_ROOT)
+
+from fake_gemini import SAMPLE_FEEDBACK  # noqa: E402
+from feedback_parser import FeedbackParser, parse_feedback  # noqa: E402
+
+
+def legacy_extract_score(feedback):
+    """The extractor parse_feedback replaced: repeated splits per pattern, then a line rescan"""
+    try:
+        patterns = [("FORM SCORE:", "%"), ("Score:", "%"), ("Overall Score:", "%"), ("Form Score:", "%")]
+        for pattern_start, pattern_end in patterns:
+            if pattern_start in feedback and pattern_end in feedback.split(pattern_start)[1]:
+                score_text = feedback.split(pattern_start)[1].split(pattern_end)[0].strip()
+                numbers = [int(s) for s in score_text.split() if s.isdigit()]
+                if numbers and 0 <= numbers[0] <= 100:
+                    return numbers[0]
+        for line in feedback.split('\n')[:10]:
+            if '%' in line:
+                for num in [int(s) for s in line.split() if s.isdigit()]:
+                    if 70 <= num <= 100:
+                        return num
+    except Exception:
+        pass
+    return None
+
+
+def corpus(seed=7):
+    rng = random.Random(seed)
+    typical = SAMPLE_FEEDBACK.format(score=87)
+    markdown = ("## **FORM SCORE:** 84%\n\n**TECHNICAL BREAKDOWN**\n"
+                + "".join(f"* **{label}:** {'detail ' * 12}\n  wrapped line\n"
+                          for label in ('Depth', 'Knee Tracking', 'Posture', 'Hip Drive', 'Foot Stability'))
+                + "\n### Strengths:\n1. Tempo\n2. Bracing\n\n**Areas to Improve:**\n- Depth\n\nRecommendations\n- Box squats\n")
+    bullets = "".join(f"• Point {i}: {'word ' * rng.randint(5, 30)}\n" for i in range(5000))
+    return {
+        'typical': typical,
+        'markdown': markdown,
+        'large_200kb': typical + "\nRECOMMENDATIONS:\n" + bullets,
+        'score_at_end': "Some preamble.\n" * 2000 + "Overall Score: 81%\n",
+        'no_score_no_sections': ("Lorem ipsum dolor sit amet, consectetur adipiscing. " * 20 + "\n") * 500,
+        'one_huge_line': 'x ' * 200000 + 'Score: 90%',
+        'percent_noise': "\n".join(f"{rng.randint(0, 999)}% {rng.randint(0, 999)} : % ** ##" for _ in range(5000)),
+        'whitespace_spam': (' ' * 5000 + '\n') * 200 + typical,
+        'truncated': typical[:len(typical) // 3],
+    }
+
+
+def timed(func, runs):
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = func()
+    return result, round((time.perf_counter() - started) / runs * 1e6, 1)
+
+
+def streamed(text, piece_chars=40):
+    parser = FeedbackParser()
+    for i in range(0, len(text), piece_chars):
+        parser.feed(text[i:i + piece_chars])
+    return parser.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name, text in corpus().items():
+        runs = max(1, args.runs if len(text) < 50000 else args.runs // 10)
+        legacy_score, legacy_us = timed(lambda: legacy_extract_score(text), runs)
+        parsed, parse_us = timed(lambda: parse_feedback(text), runs)
+        streamed_result, stream_us = timed(lambda: streamed(text), runs)
+        results[name] = {
+            'chars': len(text),
+            'legacy_score': legacy_score,
+            'score': parsed['score'],
+            'complete': parsed['complete'],
+            'stream_matches': streamed_result == parsed,
+            'legacy_us': legacy_us,
+            'parse_us': parse_us,
+            'streamed_40_char_pieces_us': stream_us,
+        }
+        print(f"{name:22s} {len(text):>8d} chars  legacy {legacy_us:>9.1f}us  parse {parse_us:>9.1f}us  "
+              f"streamed {stream_us:>9.1f}us  score {legacy_score}->{parsed['score']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
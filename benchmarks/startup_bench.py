@@ -0,0 +1,116 @@
+"""Cold-start benchmark: import time and first-request latency per route.
+
+Each run starts a fresh interpreter, imports ``app`` and sends the first
+request to ``/``, ``/api-status`` and ``/analyze`` through Flask's test
+client, so module-level work and lazy initialization both show up.
+
+    python benchmarks/startup_bench.py --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import app
+timings = {'import_app': time.perf_counter() - started}
+statuses = {}
+client = app.app.test_client()
+
+def timed(name, call):
+    started = time.perf_counter()
+    response = call()
+    timings[name] = time.perf_counter() - started
+    statuses[name] = response.status_code
+
+timed('first_index', lambda: client.get('/'))
+timed('first_api_status', lambda: client.get('/api-status'))
+video = sys.argv[1]
+if video:
+    with open(video, 'rb') as f:
+        timed('first_analyze', lambda: client.post('/analyze', data={'file': (f, 'bench.mp4')},
+                                                    content_type='multipart/form-data'))
+sys.stdout.write('\nBENCH ' + json.dumps({'timings': timings, 'status': statuses}) + '\n')
+'''
+
+
+def make_clip(path, seconds=4, fps=30, size=(640, 360)):
+    """Write a small synthetic squat-like clip; returns False without OpenCV"""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return False
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    width, height = size
+    for i in range(seconds * fps):
+        frame = np.full((height, width, 3), 40, np.uint8)
+        phase = (np.cos(2 * np.pi * i / (2 * fps)) + 1) / 2
+        top = int(height * (0.2 + 0.3 * (1 - phase)))
+        cv2.rectangle(frame, (width // 2 - 40, top), (width // 2 + 40, height - 20), (200, 180, 160), -1)
+        writer.write(frame)
+    writer.release()
+    return True
+
+
+def run_once(video, env):
+    result = subprocess.run([sys.executable, '-c', CHILD, video or ''], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    for line in result.stdout.splitlines():
+        if line.startswith('BENCH '):
+            return json.loads(line[len('BENCH '):])
+    raise RuntimeError(f"No benchmark output:\n{result.stdout}\n{result.stderr}")
+
+
+def summarize(runs):
+    summary = {}
+    for key in runs[0]['timings']:
+        values = [run['timings'][key] * 1000 for run in runs]
+        summary[key + '_ms'] = {
+            'median': round(statistics.median(values), 1),
+            'min': round(min(values), 1),
+            'max': round(max(values), 1),
+        }
+    summary['http_status'] = {key: sorted({run['status'][key] for run in runs}) for key in runs[0]['status']}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--video', help='clip to POST to /analyze (default: generated)')
+    parser.add_argument('--with-gemini', action='store_true', help='keep GEMINI_API_KEY (spends quota)')
+    parser.add_argument('--warm-up', action='store_true', help='set WARM_UP_ON_START=1')
+    parser.add_argument('--output', help='write the summary as JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not args.with_gemini:
+        env.pop('GEMINI_API_KEY', None)
+    if args.warm_up:
+        env['WARM_UP_ON_START'] = '1'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            candidate = os.path.join(tmp, 'bench.mp4')
+            video = candidate if make_clip(candidate) else None
+
+        runs = [run_once(video, env) for _ in range(args.runs)]
+
+    summary = summarize(runs)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': runs, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
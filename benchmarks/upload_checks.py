@@ -0,0 +1,92 @@
+"""Upload spool checks: multi-file batches against the spool budget.
+
+Posts synthetic clips padded to ``--clip-mb`` through Flask's test client
+and checks that a full /analyze-batch fits the default budget, that a body
+over the budget is refused with 503 + Retry-After, and that every spooled
+byte and file is released afterwards. Exits non-zero on the first failure.
+
+    python benchmarks/upload_checks.py --clips 6 --clip-mb 16
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+os.environ.pop('GEMINI_API_KEY', None)
+
+from startup_bench import make_clip  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def padded_clips(count, clip_mb):
+    """``count`` distinct clips of ``clip_mb`` each (a real clip plus trailing padding)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'clip.mp4')
+        if not make_clip(path):
+            sys.exit("OpenCV is required to build the test clips")
+        with open(path, 'rb') as f:
+            clip = f.read()
+    return [clip + bytes([i]) * (clip_mb * MB - len(clip)) for i in range(count)]
+
+
+def post_batch(client, clips):
+    files = [(io.BytesIO(data), f'clip{i}.mp4') for i, data in enumerate(clips)]
+    return client.post('/analyze-batch?ai=off', data={'files': files}, content_type='multipart/form-data')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clips', type=int, default=6)
+    parser.add_argument('--clip-mb', type=int, default=16)
+    args = parser.parse_args()
+
+    import app
+    from upload_spool import spool_budget
+
+    client = app.app.test_client()
+    clips = padded_clips(args.clips, args.clip_mb)
+    folder = app.app.config['UPLOAD_FOLDER']
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"{'PASS' if ok else 'FAIL'}  {name}  {detail}")
+        if not ok:
+            failures.append(name)
+
+    def released():
+        return spool_budget.in_use == 0 and not os.listdir(folder)
+
+    response = post_batch(client, clips)
+    body = response.get_json() or {}
+    check(f'{args.clips}x{args.clip_mb} MB batch fits the {spool_budget.limit // MB} MB budget',
+          response.status_code == 200 and len(body.get('clips', [])) == args.clips,
+          f"status {response.status_code}, {len(body.get('clips', []))} clips")
+    check('batch spool released', released(), f'{spool_budget.in_use} bytes, {os.listdir(folder)}')
+
+    # The spool itself refuses what admission would otherwise shed first
+    default_limit, shed_endpoints = spool_budget.limit, app.SHED_ENDPOINTS
+    spool_budget.limit = (args.clip_mb * args.clips // 2) * MB
+    app.SHED_ENDPOINTS = set()
+    try:
+        response = post_batch(client, clips)
+        check(f'batch over a {spool_budget.limit // MB} MB budget refused',
+              response.status_code == 503 and response.headers.get('Retry-After') is not None,
+              f"status {response.status_code}, Retry-After {response.headers.get('Retry-After')}")
+        check('refused batch spool released', released(), f'{spool_budget.in_use} bytes, {os.listdir(folder)}')
+        response = post_batch(client, clips[:1])
+        check('single clip under the same budget accepted', response.status_code == 200,
+              f'status {response.status_code}')
+    finally:
+        spool_budget.limit, app.SHED_ENDPOINTS = default_limit, shed_endpoints
+
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import fnmatch
+import logging
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from werkzeug.exceptions import HTTPException
+
+from upload_spool import UploadSpool, discard_upload, spool_budget
+
+logger = logging.getLogger(__name__)
+
+BLOB_ALLOWED_HOSTS = [host.strip().lower() for host in
+                      os.getenv('BLOB_ALLOWED_HOSTS', '*.blob.vercel-storage.com').split(',') if host.strip()]
+BLOB_CONNECT_TIMEOUT = float(os.getenv('BLOB_CONNECT_TIMEOUT', '3.05'))
+BLOB_READ_TIMEOUT = float(os.getenv('BLOB_READ_TIMEOUT', '20'))
+BLOB_RETRIES = int(os.getenv('BLOB_RETRIES', '3'))
+BLOB_RANGE_BYTES = int(os.getenv('BLOB_RANGE_MB', '8')) * 1024 * 1024
+BLOB_POOL_SIZE = int(os.getenv('BLOB_POOL_SIZE', '16'))
+BLOB_CHUNK_BYTES = 256 * 1024
+BLOB_API_URL = os.getenv('BLOB_API_URL', 'https://blob.vercel-storage.com/upload')
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BLOB_TIMEOUT = (BLOB_CONNECT_TIMEOUT, BLOB_READ_TIMEOUT)
+
+
+class BlobFetchError(Exception):
+    """A blob could not be fetched; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Process-wide requests.Session with pooled keep-alive connections.
+
+    Connection setup and TLS handshakes to the blob store are paid once per
+    pooled connection instead of once per request. urllib3 retries connect
+    errors and 429/5xx answers with backoff (honouring Retry-After); POST is
+    included because the only POST made here asks for an upload URL, which
+    creates nothing until the client uploads.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                retry = Retry(total=BLOB_RETRIES, connect=BLOB_RETRIES, read=BLOB_RETRIES,
+                              backoff_factor=0.3, status_forcelist=RETRY_STATUSES,
+                              allowed_methods=frozenset(['GET', 'HEAD', 'POST']),
+                              respect_retry_after_header=True, raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=BLOB_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def blob_url_allowed(url):
+    """Only fetch from the configured blob hosts, never arbitrary URLs"""
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return False
+    host = parts.hostname.lower()
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return any(fnmatch.fnmatch(host, pattern) for pattern in BLOB_ALLOWED_HOSTS)
+
+
+def blob_filename(url):
+    return os.path.basename(urlsplit(url).path) or 'blob.mp4'
+
+
+def _content_range_total(response):
+    # "bytes 0-8388607/52428800"
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+def fetch_blob(url, folder, max_size):
+    """Download ``url`` into ``folder`` with HTTP range requests.
+
+    The blob is pulled in BLOB_RANGE_MB ranges over the pooled session and
+    written through an UploadSpool, so it is hashed and size-checked on the
+    way in exactly like a multipart upload. A range that breaks off mid-body
+    is resumed from the last byte written; the download gives up after
+    BLOB_RETRIES failures in a row without progress. Returns ``(path, size, sha256)``;
+    the caller owns the file and must call discard_upload().
+    """
+    session = get_http_session()
+    path = os.path.join(folder, f"{uuid.uuid4().hex}_{blob_filename(url)}")
+    spool = None
+    offset, total, attempts = 0, None, 0
+    started = time.time()
+    try:
+        while total is None or offset < total:
+            range_start = offset
+            end = offset + BLOB_RANGE_BYTES - 1
+            try:
+                with session.get(url, headers={'Range': f'bytes={offset}-{end}'},
+                                 stream=True, timeout=BLOB_TIMEOUT) as response:
+                    if response.status_code == 416 and offset > 0:
+                        break
+                    if response.status_code == 404:
+                        raise BlobFetchError('Blob not found', status=404)
+                    if response.status_code not in (200, 206):
+                        raise BlobFetchError(f'Blob store answered {response.status_code}')
+
+                    if spool is None:
+                        # First answer tells us the full size: reserve it before writing anything
+                        if response.status_code == 206:
+                            total = _content_range_total(response)
+                        else:
+                            total = int(response.headers.get('Content-Length') or 0) or None
+                        if total is not None and max_size is not None and total > max_size:
+                            raise BlobFetchError('File too large. Maximum size is 100MB.', status=413)
+                        spool_budget.reserve(path, total or 0, folder)
+                        spool = UploadSpool(path, max_size)
+                    elif response.status_code == 200:
+                        # Server ignored Range on a resume and sent the whole blob again
+                        spool.restart()
+                        offset = 0
+
+                    for chunk in response.iter_content(BLOB_CHUNK_BYTES):
+                        spool.write(chunk)
+                        offset += len(chunk)
+                    if response.status_code == 200:
+                        total = offset
+                attempts = 0
+            except (BlobFetchError, HTTPException):
+                raise
+            except Exception as e:
+                # Failures in a row: a range that broke off after some bytes starts the count again
+                attempts = 1 if offset > range_start else attempts + 1
+                if attempts > BLOB_RETRIES:
+                    raise BlobFetchError(f'Blob download failed: {e}')
+                logger.warning(f"🔁 Blob range from byte {offset} failed ({e}), retrying")
+                time.sleep(0.2 * attempts)
+
+        if spool is None or spool.size == 0:
+            raise BlobFetchError('Blob is empty', status=400)
+        path, size, video_hash = spool.claim()
+        spool.close()
+        logger.info(f"📥 Blob fetched: {size} bytes in {time.time() - started:.2f}s")
+        return path, size, video_hash
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        else:
+            discard_upload(path)
+        raise
+
+
+def request_upload_url(filename, token):
+    """Ask the blob store for a client upload URL; returns the JSON answer or None"""
+    response = get_http_session().post(
+        BLOB_API_URL,
+        headers={'Authorization': f'Bearer {token}'},
+        json={'filename': filename, 'contentType': 'video/mp4'},
+        timeout=BLOB_TIMEOUT,
+    )
+    if response.status_code != 200:
+        logger.warning(f"⚠️ Blob store refused upload URL: {response.status_code}")
+        return None
+    return response.json()
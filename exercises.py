@@ -0,0 +1,323 @@
+import os
+
+from form_scoring import DIMENSIONS, RECOMMENDATIONS, score_form, score_rules
+from rep_counter import (ASYMMETRY_NOTE_DEGREES, DOWN_LEVEL, FAST_DESCENT_SECONDS, LEG_KEYPOINTS, MIN_RANGE_DEGREES,
+                         SQUAT_JOINTS, UP_LEVEL, angles_from_extension, build_analysis_data, count_reps, joint_angles,
+                         squat_notes, without_angles)
+
+DEFAULT_EXERCISE = os.getenv('DEFAULT_EXERCISE', 'squat')
+MAX_EXERCISES_PER_CLIP = int(os.getenv('MAX_EXERCISES_PER_CLIP', '4'))
+
+FEEDBACK_PROMPT = """
+    As a professional fitness trainer, analyze {noun} form and provide detailed feedback.
+
+    Please structure your response as:
+
+    FORM SCORE: [75-95]%
+
+    TECHNICAL BREAKDOWN:
+{breakdown}
+
+    STRENGTHS:
+    • [specific strength 1]
+    • [specific strength 2]
+    • [specific strength 3]
+
+    AREAS FOR IMPROVEMENT:
+    • [specific improvement 1]
+    • [specific improvement 2]
+    • [specific improvement 3]
+
+    RECOMMENDATIONS:
+    • [practical drill 1]
+    • [practical drill 2]
+    • [practice tip 1]
+
+    Provide constructive, specific feedback that would help someone improve their {noun} technique.
+    """
+
+
+class Exercise:
+    """One analyzable movement: what the shared decode/keypoint pass is measured against.
+
+    ``joints`` are the primary joint (reps are counted on it) and a
+    secondary joint, each ``(name, (a, b, c))`` with the angle taken at
+    ``b`` on both sides; ``required_keypoints`` must be visible for the pose
+    signal to be trusted. Rep thresholds are fractions of the observed
+    angle range (see rep_counter.count_reps). Scoring is ``rules`` over
+    ``dimensions`` (see form_scoring.score_rules) unless ``score`` is
+    overridden, and the prompt is FEEDBACK_PROMPT with the dimension labels.
+    """
+
+    name = None
+    noun = None
+    joints = SQUAT_JOINTS
+    required_keypoints = LEG_KEYPOINTS
+    # Nominal (bottom, top) angles of both joints when only the motion signal is available
+    extension_angles = ((90.0, 175.0), (80.0, 175.0))
+    down_level = DOWN_LEVEL
+    up_level = UP_LEVEL
+    min_range = MIN_RANGE_DEGREES
+
+    dimensions = ()
+    rules = {}
+    recommendations = {}
+
+    # Coaching notes: primary angle at the bottom above which reps count as shallow
+    shallow_angle = None
+    shallow_note = None
+    symmetric = True  # False when the two sides do different jobs (lunges)
+    focus = ()  # What the short coaching prompt asks about
+
+    @property
+    def joint_names(self):
+        return tuple(name for name, _ in self.joints)
+
+    def angles(self, keypoints, aspect=1.0):
+        """``(primary, secondary, valid_fraction)`` angle series from pose keypoints"""
+        (primary, secondary), valid_fraction = joint_angles(keypoints, self.joints, self.required_keypoints, aspect)
+        return primary, secondary, valid_fraction
+
+    def angles_from_extension(self, extension):
+        return angles_from_extension(extension, *self.extension_angles)
+
+    def count_reps(self, primary, secondary, fps, angles_measured=True):
+        """count_reps on this exercise's joints; ``angles_measured=False`` keeps only the rep timing"""
+        reps = count_reps(primary, secondary, fps, self.joint_names, self.down_level, self.up_level, self.min_range)
+        return reps if angles_measured else without_angles(reps, self.joint_names)
+
+    def notes(self, rep_result):
+        primary = self.joint_names[0]
+        if rep_result['reps'] == 0:
+            return ["No complete repetitions detected"]
+        notes = [f"{rep_result['reps']} repetitions detected"]
+        if self.shallow_angle is not None and (rep_result.get(f'avg_{primary}_depth') or 0) > self.shallow_angle:
+            notes.append(self.shallow_note)
+        if self.symmetric and (rep_result.get('max_asymmetry') or 0) > ASYMMETRY_NOTE_DEGREES:
+            notes.append(f"Left/right {primary} asymmetry up to {rep_result['max_asymmetry']}°")
+        if rep_result['avg_eccentric_s'] < FAST_DESCENT_SECONDS:
+            notes.append("Fast, uncontrolled descent")
+        return notes
+
+    def analysis_data(self, rep_result, primary=None, secondary=None):
+        """Prompt data for the clip; without ``primary`` angles only the notes are sent"""
+        if primary is None:
+            return {'notes': self.notes(rep_result), 'exercise': self.name}
+        analysis_data = build_analysis_data(rep_result, primary, secondary, self.joint_names, self.notes(rep_result))
+        analysis_data['exercise'] = self.name
+        return analysis_data
+
+    def score(self, video_analysis):
+        """``{'score', 'breakdown', 'feedback'}`` from the measured reps, or None"""
+        return score_rules(video_analysis, self.rules, self.dimensions, self.recommendations,
+                           f'{self.joint_names[0]}_depth')
+
+    def measured_lines(self, analysis_data):
+        """The measured-data lines every prompt quotes"""
+        lines = []
+        for joint in self.joint_names:
+            angles = analysis_data.get(f'{joint}_angles')
+            if angles:
+                lines.append(f"- {joint.capitalize()} angles at bottom: Left {angles['left']}°, Right {angles['right']}°")
+        lines.append(f"- Notes: {', '.join(analysis_data['notes']) or 'none'}")
+        return lines
+
+    def feedback_prompt(self, analysis_data=None, scoring=None):
+        """Coaching prompt for one clip, with the measured angles and rule-based score when known"""
+        breakdown = "\n".join(f"    • {label}: [analysis]" for _, label, _ in self.dimensions)
+        prompt = FEEDBACK_PROMPT.format(noun=self.noun, breakdown=breakdown)
+        if analysis_data:
+            prompt += "\n    MEASURED DATA FROM THE VIDEO:\n"
+            prompt += "".join(f"    {line}\n" for line in self.measured_lines(analysis_data))
+        if scoring:
+            breakdown = ', '.join(f"{key} not measured" if value is None else f"{key} {value}/100"
+                                  for key, value in scoring['breakdown'].items())
+            prompt += f"""
+    - Rule-based form score: {scoring['score']}% ({breakdown})
+    """
+        return prompt
+
+
+class Squat(Exercise):
+    name = 'squat'
+    noun = 'squat'
+    dimensions = DIMENSIONS
+    recommendations = RECOMMENDATIONS
+    focus = (
+        "Depth and range of motion improvement",
+        "Balance and symmetry between sides",
+        "Upper body positioning and core engagement",
+        "Safety considerations and injury prevention",
+    )
+
+    def notes(self, rep_result):
+        return squat_notes(rep_result)
+
+    def score(self, video_analysis):
+        return score_form(video_analysis)
+
+
+class Deadlift(Exercise):
+    name = 'deadlift'
+    noun = 'deadlift'
+    # Reps are counted on the hip hinge; the knee says whether it turned into a squat
+    joints = (('hip', ('shoulder', 'hip', 'knee')), ('knee', ('hip', 'knee', 'ankle')))
+    required_keypoints = ('shoulder',) + LEG_KEYPOINTS
+    extension_angles = ((70.0, 175.0), (115.0, 175.0))
+    dimensions = (
+        ('hinge', 'Hip Hinge & Range of Motion', 0.30),
+        ('knee_bend', 'Knee Bend & Setup', 0.20),
+        ('symmetry', 'Left/Right Balance', 0.15),
+        ('lowering', 'Lowering Control', 0.15),
+        ('consistency', 'Rep Consistency', 0.20),
+    )
+    rules = {
+        'hinge': ('hip_depth', 90.0, 130.0,
+                  "Average hip angle at the bottom {mean:.0f}° across {n} reps (shallowest rep {max:.0f}°)."),
+        'knee_bend': ('knee_depth', 125.0, 90.0,
+                      "Knee angle at the bottom averages {mean:.0f}° (deepest {min:.0f}°); "
+                      "much below 110° the pull turns into a squat."),
+        'symmetry': ('asymmetry', 3.0, 15.0, "Left/right hip difference averages {mean:.1f}° (worst rep {max:.1f}°)."),
+        'lowering': ('eccentric_s', 1.2, 0.4, "Lowering the bar takes {mean:.1f}s on average."),
+        'consistency': ('consistency', 0.10, 0.50, "Rep-to-rep variation in hinge depth and tempo is {mean:.0f}%."),
+    }
+    recommendations = {
+        'hinge': ["Romanian deadlifts to groove the hip hinge", "Block pulls from mid-shin to own the bottom position"],
+        'knee_bend': ["Set the hips higher and shins near-vertical before the pull", "Kettlebell hinges with a dowel on the spine"],
+        'symmetry': ["Single-leg Romanian deadlifts", "Suitcase deadlifts to even out side-to-side control"],
+        'lowering': ["Tempo deadlifts with a 3-second lowering", "Paused deadlifts just below the knee"],
+        'consistency': ["Reset fully between reps (dead-stop deadlifts)", "Film every set from the side and compare bar paths"],
+    }
+    shallow_angle = 125.0
+    shallow_note = "Shallow hip hinge"
+    focus = (
+        "Hip hinge pattern and starting position",
+        "Neutral spine and lat engagement off the floor",
+        "Bar path close to the body and lockout",
+        "Safety considerations and injury prevention",
+    )
+
+
+class Lunge(Exercise):
+    name = 'lunge'
+    noun = 'lunge'
+    extension_angles = ((90.0, 175.0), (110.0, 175.0))
+    dimensions = (
+        ('depth', 'Depth & Range of Motion', 0.30),
+        ('torso', 'Torso Position', 0.20),
+        ('tempo', 'Tempo & Control', 0.20),
+        ('consistency', 'Rep Consistency', 0.30),
+    )
+    rules = {
+        'depth': ('knee_depth', 95.0, 135.0,
+                  "Average knee angle at the bottom {mean:.0f}° across {n} reps (90° is a full lunge)."),
+        'torso': ('hip_depth', 130.0, 100.0,
+                  "Hip angle at the bottom averages {mean:.0f}°; lower values mean the torso folds over the front leg."),
+        'tempo': ('eccentric_s', 1.2, 0.4, "Lowering takes {mean:.1f}s on average."),
+        'consistency': ('consistency', 0.10, 0.50, "Rep-to-rep variation in depth and tempo is {mean:.0f}%."),
+    }
+    recommendations = {
+        'depth': ["Split squats with the back knee touching a pad", "Hip flexor stretches to free up the back leg"],
+        'torso': ["Goblet reverse lunges to keep the chest up", "Lunges with a dowel held along the spine"],
+        'tempo': ["Tempo lunges (3-second descent)", "Paused split squats at the bottom"],
+        'consistency': ["Static split squats before walking lunges", "Single-leg balance drills barefoot"],
+    }
+    shallow_angle = 110.0
+    shallow_note = "Front knee not reaching 90°"
+    symmetric = False  # The front and back legs bend differently by design
+    focus = (
+        "Depth and front knee position",
+        "Upright torso and core engagement",
+        "Balance and step length",
+        "Safety considerations and injury prevention",
+    )
+
+
+class PushUp(Exercise):
+    name = 'pushup'
+    noun = 'push-up'
+    # Reps are counted on the elbows; shoulder-hip-ankle is the body line (180° = straight)
+    joints = (('elbow', ('shoulder', 'elbow', 'wrist')), ('hip', ('shoulder', 'hip', 'ankle')))
+    required_keypoints = ('shoulder', 'elbow', 'wrist', 'hip', 'ankle')
+    extension_angles = ((80.0, 170.0), (170.0, 175.0))
+    dimensions = (
+        ('depth', 'Depth & Range of Motion', 0.30),
+        ('body_line', 'Body Line & Core', 0.25),
+        ('symmetry', 'Left/Right Balance', 0.15),
+        ('tempo', 'Tempo & Control', 0.10),
+        ('consistency', 'Rep Consistency', 0.20),
+    )
+    rules = {
+        'depth': ('elbow_depth', 90.0, 130.0,
+                  "Average elbow angle at the bottom {mean:.0f}° across {n} reps (shallowest {max:.0f}°)."),
+        'body_line': ('hip_depth', 170.0, 145.0,
+                      "Shoulder-hip-ankle angle at the bottom averages {mean:.0f}° (180° is a straight line)."),
+        'symmetry': ('asymmetry', 3.0, 15.0, "Left/right elbow difference averages {mean:.1f}° (worst rep {max:.1f}°)."),
+        'tempo': ('eccentric_s', 1.0, 0.3, "Lowering takes {mean:.1f}s on average."),
+        'consistency': ('consistency', 0.10, 0.50, "Rep-to-rep variation in depth and tempo is {mean:.0f}%."),
+    }
+    recommendations = {
+        'depth': ["Push-ups to a fist-height target under the chest", "Eccentric-only push-ups with a 3-second lowering"],
+        'body_line': ["Plank holds with glutes squeezed", "Incline push-ups until the body line holds"],
+        'symmetry': ["Single-arm plank reaches", "Dumbbell floor presses one arm at a time"],
+        'tempo': ["Tempo push-ups (3-1-1)", "Paused push-ups an inch off the floor"],
+        'consistency': ["Fewer, cleaner reps per set", "Sets ended one rep before form breaks"],
+    }
+    shallow_angle = 110.0
+    shallow_note = "Elbows not reaching 90°"
+    focus = (
+        "Depth and elbow position",
+        "Straight body line and core engagement",
+        "Shoulder blade control",
+        "Safety considerations and injury prevention",
+    )
+
+
+EXERCISES = {}
+
+
+def register_exercise(exercise):
+    """Make an Exercise instance analyzable as ``exercise=<name>``"""
+    EXERCISES[exercise.name] = exercise
+    return exercise
+
+
+for _exercise in (Squat(), Deadlift(), Lunge(), PushUp()):
+    register_exercise(_exercise)
+
+
+def exercise_names():
+    return sorted(EXERCISES)
+
+
+def get_exercise(name=None):
+    """Registered exercise by name (the default one for None); raises ValueError for unknown names"""
+    name = str(name or DEFAULT_EXERCISE)
+    key = name.strip().lower().replace('-', '').replace('_', '')
+    exercise = EXERCISES.get(key) or EXERCISES.get(key.rstrip('s'))
+    if exercise is None:
+        raise ValueError(f"Unknown exercise {name[:32]!r}; choose from {', '.join(exercise_names())}")
+    return exercise
+
+
+def resolve_exercises(names=None):
+    """Exercises for a name, a comma-separated string or a list (the default one when empty), in order"""
+    if isinstance(names, str):
+        names = names.split(',')
+    exercises = []
+    for name in names or [DEFAULT_EXERCISE]:
+        if not str(name).strip():
+            continue
+        exercise = get_exercise(name)
+        if exercise not in exercises:
+            exercises.append(exercise)
+    if not exercises:
+        exercises.append(get_exercise())
+    if len(exercises) > MAX_EXERCISES_PER_CLIP:
+        raise ValueError(f"At most {MAX_EXERCISES_PER_CLIP} exercises per clip")
+    return exercises
+
+
+def score_analysis(video_analysis):
+    """Rule-based score for a measure_video result, by the exercise it was measured as"""
+    return get_exercise(video_analysis.get('exercise')).score(video_analysis)
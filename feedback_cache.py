@@ -0,0 +1,91 @@
+import hashlib
+import json
+import logging
+import os
+import re
+
+from exercises import DEFAULT_EXERCISE
+from result_cache import MemoryCacheBackend, ResultCache, SQLiteCacheBackend
+
+logger = logging.getLogger(__name__)
+
+ANGLE_BUCKET_DEGREES = float(os.getenv('FEEDBACK_ANGLE_BUCKET', '5'))
+FEEDBACK_CACHE_TTL = int(os.getenv('FEEDBACK_CACHE_TTL', str(7 * 24 * 3600)))
+FEEDBACK_CACHE_MAX_ENTRIES = int(os.getenv('FEEDBACK_CACHE_MAX_ENTRIES', '2048'))
+FEEDBACK_CACHE_PATH = os.getenv('FEEDBACK_CACHE_PATH', '/tmp/fitform_feedback_cache.sqlite3')
+
+# Bottom-of-rep knee angles and forward lean (knee minus hip) most clips land in
+WARM_KNEE_ANGLES = (80, 90, 100, 110, 120, 130, 140)
+WARM_LEAN_ANGLES = (15, 30)
+WARM_NOTE_SETS = (
+    (),
+    ("Average depth above parallel",),
+    ("Fast, uncontrolled descent",),
+    ("Average depth above parallel", "Fast, uncontrolled descent"),
+)
+
+# Counts and degrees inside notes ("10 repetitions detected", "asymmetry up to 7.3°");
+# the angles themselves are already part of the key
+_NOTE_NUMBER = re.compile(r'\s*(?:up to\s*)?-?\d+(?:\.\d+)?\s*°?', re.IGNORECASE)
+
+
+def quantize_angle(angle, bucket=ANGLE_BUCKET_DEGREES):
+    """Centre of the ``bucket``-degree bucket ``angle`` falls in"""
+    return round((float(angle) // bucket) * bucket + bucket / 2, 1)
+
+
+def normalize_notes(notes):
+    """Sorted, de-duplicated notes with numbers and case stripped"""
+    normalized = set()
+    for note in notes or []:
+        note = ' '.join(_NOTE_NUMBER.sub('', str(note)).split()).strip(' .,').lower()
+        if note:
+            normalized.add(note)
+    return sorted(normalized)
+
+
+def canonical_analysis_data(analysis_data, bucket=ANGLE_BUCKET_DEGREES):
+    """analysis_data with every ``<joint>_angles`` snapped to bucket centres and notes normalized.
+
+    The prompt is built from this rather than the raw data, so a cached answer
+    was generated from exactly what its key describes.
+    """
+    canonical = {key: {side: quantize_angle(angles[side], bucket) for side in ('left', 'right')}
+                 for key, angles in analysis_data.items() if key.endswith('_angles')}
+    canonical['notes'] = normalize_notes(analysis_data.get('notes'))
+    canonical['exercise'] = analysis_data.get('exercise') or DEFAULT_EXERCISE
+    return canonical
+
+
+def feedback_key(canonical, model_name):
+    payload = json.dumps({'model': model_name, 'features': canonical}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def warm_feature_grid(bucket=ANGLE_BUCKET_DEGREES):
+    """Symmetric squat analysis_data covering the common depth/lean/notes combinations"""
+    grid = []
+    for knee in WARM_KNEE_ANGLES:
+        for lean in WARM_LEAN_ANGLES:
+            for notes in WARM_NOTE_SETS:
+                if knee <= 100 and "Average depth above parallel" in notes:
+                    continue
+                grid.append(canonical_analysis_data({
+                    'knee_angles': {'left': knee, 'right': knee},
+                    'hip_angles': {'left': knee - lean, 'right': knee - lean},
+                    'notes': ["repetitions detected", *notes],
+                    'exercise': 'squat',
+                }, bucket))
+    return grid
+
+
+def create_feedback_cache(backend_name=None):
+    """Build the cache configured by FEEDBACK_CACHE_BACKEND (memory or sqlite)"""
+    backend_name = (backend_name or os.getenv('FEEDBACK_CACHE_BACKEND', 'memory')).lower()
+    if backend_name == 'sqlite':
+        try:
+            return ResultCache(SQLiteCacheBackend(FEEDBACK_CACHE_PATH, FEEDBACK_CACHE_MAX_ENTRIES),
+                               ttl=FEEDBACK_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ SQLite feedback cache unavailable, using memory: {e}")
+    return ResultCache(MemoryCacheBackend(FEEDBACK_CACHE_MAX_ENTRIES), ttl=FEEDBACK_CACHE_TTL)
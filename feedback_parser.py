@@ -0,0 +1,179 @@
+import re
+
+# Section headings the feedback prompt asks for, and the key each one is returned under
+SECTIONS = {
+    'technical breakdown': 'breakdown',
+    'breakdown': 'breakdown',
+    'strengths': 'strengths',
+    'areas for improvement': 'improvements',
+    'areas to improve': 'improvements',
+    'improvements': 'improvements',
+    'weaknesses': 'improvements',
+    'recommendations': 'recommendations',
+    'drills': 'recommendations',
+}
+LIST_SECTIONS = ('strengths', 'improvements', 'recommendations')
+
+# The prompt puts the score first; loose score matches stop after the opening lines
+SCORE_SEARCH_LINES = 10
+
+# Every line goes through this once: a score line, a section heading, or an
+# (optionally bulleted, optionally "Label:"-prefixed) text line. Markdown
+# heading, quote and bold marks around any of them are tolerated.
+_LINE = re.compile(r"""
+    ^[\s#>]*
+    (?:
+        \**\s*(?:form\s+|overall\s+)?score\b[\s*:]*(?P<score>\d{1,3})\s*%
+      | \**\s*(?P<heading>technical\s+breakdown|breakdown|strengths|areas\s+for\s+improvement|areas\s+to\s+improve
+                         |improvements|weaknesses|recommendations|drills)\s*\**\s*:?\s*\**\s*$
+      | (?P<bullet>[•–*-]|\d{1,2}[.)])?\s*
+        (?:(?=[^:\n]{1,66}:)\**(?P<label>[^:*\n]{1,60}?)\**\s*:\s*\**\s+)?
+        (?P<text>\S.*)
+    )
+""", re.IGNORECASE | re.VERBOSE)
+
+# Before the first section: "... score: 87%" anywhere in the line, matched where str.find lands
+_SCORE_AT = re.compile(r'score\b[\s*:]*(\d{1,3})\s*%')
+# Last resort (opening lines only): a 70-100 number before a percent sign
+_NUMBER = re.compile(r'(?<![\d.])\d{2,3}(?![\d.])')
+
+# TECHNICAL BREAKDOWN labels -> form_scoring dimension keys
+_DIMENSION = re.compile(r'(?P<depth>depth|range of motion)|(?P<knee_tracking>knee)|(?P<spine>spin|posture|back|torso)'
+                        r'|(?P<tempo>tempo|control)|(?P<consistency>consisten|repeatab)'
+                        r'|(?P<hip>hip)|(?P<foot>foot|feet|stance|stability)', re.IGNORECASE)
+_SLUG = re.compile(r'[^a-z0-9]+')
+
+
+def dimension_key(label):
+    """form_scoring key ('depth', 'knee_tracking', ...) for a breakdown label, or a slug of it"""
+    match = _DIMENSION.search(label)
+    if match:
+        return match.lastgroup
+    return _SLUG.sub('_', label.lower()).strip('_') or 'other'
+
+
+class FeedbackParser:
+    """Single-pass parser turning coaching feedback into a structure.
+
+    Feed it the whole text or streamed pieces; each complete line is
+    classified by one compiled regex and only the unfinished last line is
+    kept between pieces. Breakdown labels map to the given exercise
+    ``dimensions`` keys, or to the squat keys (see dimension_key). ``feed`` returns the score the first time it is
+    found, as soon as its ``%`` has arrived. ``finish`` returns::
+
+        {'score': 87 or None,
+         'breakdown': {'depth': {'label': 'Depth & Range of Motion', 'note': '...'}, ...},
+         'strengths': [...], 'improvements': [...], 'recommendations': [...],
+         'other': [...],      # text outside the expected sections
+         'complete': bool}    # score and all four sections present
+    """
+
+    def __init__(self, dimensions=None):
+        # An exercise's (key, label, weight) dimensions: its labels map to its keys
+        self._labels = {' '.join(label.lower().split()): key for key, label, _ in dimensions or ()}
+        self.score = None
+        self.lines_seen = 0
+        self._loose_score = None
+        self._section = None
+        self._last = None  # parts of the item a wrapped line continues
+        self._open = []  # pieces of the line not yet ended by a newline
+        self._result = {'score': None, 'breakdown': {}, 'strengths': [], 'improvements': [],
+                        'recommendations': [], 'other': []}
+
+    def feed(self, text):
+        """Parse the complete lines in ``text``; returns the score the first time it is found"""
+        found = self.score is None
+        if '\n' in text:
+            *complete, tail = ''.join(self._open + [text]).split('\n')
+            self._open = [tail] if tail else []
+            for line in complete:
+                self._parse_line(line)
+        else:
+            self._open.append(text)
+        if self.score is None and self.lines_seen < SCORE_SEARCH_LINES and '%' in text and self._open:
+            # The score line is usually still open when its % arrives
+            match = _LINE.match(''.join(self._open).strip())
+            if match and match.group('score') and int(match.group('score')) <= 100:
+                self.score = int(match.group('score'))
+        return self.score if found and self.score is not None else None
+
+    def finish(self):
+        """Parse whatever is left and return the structure"""
+        if self._open:
+            self._parse_line(''.join(self._open))
+            self._open = []
+        result = self._result
+        # Items were collected as lists of line parts so wrapped lines cost no re-copying
+        for entry in result['breakdown'].values():
+            entry['note'] = ' '.join(entry['note'])
+        for key in LIST_SECTIONS + ('other',):
+            result[key] = [' '.join(parts) for parts in result[key]]
+        result['score'] = self.score if self.score is not None else self._loose_score
+        result['complete'] = (result['score'] is not None and bool(result['breakdown'])
+                              and all(result[key] for key in LIST_SECTIONS))
+        return result
+
+    def _parse_line(self, line):
+        self.lines_seen += 1
+        line = line.strip()
+        match = _LINE.match(line) if line else None
+        if match is None:
+            # Blank line: a wrapped item can't continue across it
+            self._last = None
+            return
+
+        score = match.group('score')
+        if score is not None:
+            if self.score is None and int(score) <= 100:
+                self.score = int(score)
+            return
+        heading = match.group('heading')
+        if heading is not None:
+            self._section = SECTIONS[' '.join(heading.lower().split())]
+            self._last = None
+            return
+
+        label, text = match.group('label'), match.group('text')
+        if self._section is None and self.score is None:
+            self._find_loose_score(line)
+
+        if self._section == 'breakdown':
+            if label:
+                self._last = [text]
+                key = self._labels.get(' '.join(label.lower().split())) or dimension_key(label)
+                self._result['breakdown'][key] = {'label': label.strip(), 'note': self._last}
+                return
+        elif self._section is not None and (match.group('bullet') or not self._result[self._section]):
+            self._last = [f"{label.strip()}: {text}" if label else text]
+            self._result[self._section].append(self._last)
+            return
+
+        full_text = f"{label.strip()}: {text}" if label else text
+        if self._last is not None and not match.group('bullet'):
+            # Wrapped continuation of the previous item
+            self._last.append(full_text)
+            return
+        self._last = [full_text]
+        self._result['other'].append(self._last)
+
+    def _find_loose_score(self, line):
+        lowered = line.lower()
+        at = lowered.find('score')
+        while at != -1:
+            match = _SCORE_AT.match(lowered, at)
+            if match and int(match.group(1)) <= 100 and not lowered[at - 1:at].isalnum():
+                self.score = int(match.group(1))
+                return
+            at = lowered.find('score', at + 5)
+        if self._loose_score is None and self.lines_seen <= SCORE_SEARCH_LINES and '%' in line:
+            for number in _NUMBER.findall(line, 0, line.rindex('%')):
+                if 70 <= int(number) <= 100:  # Reasonable form score range
+                    self._loose_score = int(number)
+                    return
+
+
+def parse_feedback(text, dimensions=None):
+    """Structure of a complete feedback text (see FeedbackParser)"""
+    parser = FeedbackParser(dimensions)
+    parser.feed(text or '')
+    return parser.finish()
@@ -0,0 +1,208 @@
+# (key, TECHNICAL BREAKDOWN label, weight in the overall score). A dimension
+# the clip cannot measure scores None and its weight goes to the others.
+#
+# Hip mechanics and foot placement, which the original prompt asked Gemini
+# about, are deliberately not scored. The hip angle at the bottom already
+# feeds 'spine' (forward lean), so a separate hip score would count it twice;
+# glute drive is not visible in joint angles. Foot placement needs heel and
+# toe keypoints, which the pose models here do not give, and stance width
+# from the ankles means nothing in the side view squats are filmed from.
+# Tempo and consistency are their own measurements, not stand-ins for either.
+DIMENSIONS = (
+    ('depth', 'Depth & Range of Motion', 0.30),
+    ('knee_tracking', 'Knee Alignment & Tracking', 0.20),
+    ('spine', 'Spinal Position & Posture', 0.20),
+    ('tempo', 'Tempo & Control', 0.15),
+    ('consistency', 'Rep Consistency', 0.15),
+)
+NOT_MEASURED = "Not measured in this clip."
+
+# Rule thresholds: (value scoring 100, value scoring FLOOR_SCORE)
+DEPTH_RANGE = (90.0, 140.0)          # knee angle at the bottom, degrees
+ASYMMETRY_RANGE = (3.0, 15.0)        # left/right knee difference, degrees
+LEAN_RANGE = (15.0, 45.0)            # knee angle minus hip angle at the bottom, degrees
+ECCENTRIC_RANGE = (1.5, 0.5)         # seconds spent lowering
+CONSISTENCY_RANGE = (0.10, 0.50)     # coefficient of variation of rep depth and tempo
+FLOOR_SCORE = 60.0
+DEPTH_SPREAD_PENALTY = (10.0, 5.0)   # (std dev in degrees, points taken off above it)
+
+RECOMMENDATIONS = {
+    'depth': ["Pause squats with a 2-second hold at parallel", "Box squats to a parallel-height box"],
+    'knee_tracking': ["Banded squats to cue knees out", "Single-leg split squats to even out left/right strength"],
+    'spine': ["Goblet squats to reinforce an upright torso", "Front squats or heel-elevated squats to reduce forward lean"],
+    'tempo': ["Tempo squats (3-1-3) for a controlled descent", "Paused squats to own the bottom position"],
+    'consistency': ["Submaximal sets at a fixed tempo to groove one pattern", "Paused sets at a moderate load to repeat the same bottom position"],
+}
+
+
+def _ramp(values, best, worst):
+    """Map values linearly from ``best`` (100) to ``worst`` (FLOOR_SCORE), clipped"""
+    import numpy as np
+    position = np.clip((np.asarray(values, dtype=np.float64) - best) / (worst - best), 0.0, 1.0)
+    return 100.0 - (100.0 - FLOOR_SCORE) * position
+
+
+def _rep_arrays(rep_details, keys=('knee_depth', 'hip_depth', 'asymmetry', 'eccentric_s', 'concentric_s')):
+    import numpy as np
+    def column(key):
+        return np.array([np.nan if rep.get(key) is None else rep[key] for rep in rep_details], dtype=np.float64)
+    return {key: column(key) for key in keys}
+
+
+def _variation(*columns):
+    """Sum of the coefficients of variation of the measured columns (rep depth, rep tempo)"""
+    import numpy as np
+    total = 0.0
+    for values in columns:
+        values = values[~np.isnan(values)]
+        if len(values):
+            total += np.std(values) / max(values.mean(), 1e-9)
+    return total
+
+
+def _weighted_score(breakdown, dimensions):
+    """Overall score over the measured dimensions, their weights rescaled to sum to one"""
+    measured = [(breakdown[key], weight) for key, _, weight in dimensions if breakdown[key] is not None]
+    return int(round(sum(value * weight for value, weight in measured) / sum(weight for _, weight in measured)))
+
+
+def _clip_breakdown(breakdown):
+    import numpy as np
+    return {key: None if value is None else int(round(float(np.clip(value, 0, 100))))
+            for key, value in breakdown.items()}
+
+
+def _band(score):
+    if score >= 90:
+        return 'excellent'
+    if score >= 75:
+        return 'good'
+    return 'needs work'
+
+
+def score_form(video_analysis):
+    """Deterministic form score and breakdown from the measured reps.
+
+    Takes the ``video_analysis`` dict from measure_video and returns
+    ``{'score', 'breakdown', 'feedback'}`` in a few milliseconds, or None
+    when no complete rep was measured.
+    """
+    import numpy as np
+    rep_details = video_analysis.get('rep_details') or []
+    if not rep_details:
+        return None
+    reps = _rep_arrays(rep_details)
+    n = len(rep_details)
+    breakdown = dict.fromkeys(key for key, _, _ in DIMENSIONS)
+    details = dict.fromkeys(breakdown, NOT_MEASURED)
+
+    # Joint angles are missing when only the motion signal timed the reps,
+    # and left/right when the angle source cannot tell the sides apart
+    depth = reps['knee_depth']
+    if not np.isnan(depth).all():
+        depth = depth[~np.isnan(depth)]
+        depth_spread = float(np.std(depth))
+        breakdown['depth'] = _ramp(depth, *DEPTH_RANGE).mean()
+        if depth_spread > DEPTH_SPREAD_PENALTY[0]:
+            breakdown['depth'] -= DEPTH_SPREAD_PENALTY[1]
+        details['depth'] = (f"Average knee angle at the bottom {depth.mean():.0f}° across {n} reps "
+                            f"(parallel is about 100°), varying by ±{depth_spread:.0f}°.")
+
+    asymmetry = reps['asymmetry'][~np.isnan(reps['asymmetry'])]
+    if len(asymmetry):
+        breakdown['knee_tracking'] = _ramp(asymmetry, *ASYMMETRY_RANGE).mean()
+        details['knee_tracking'] = (f"Left/right knee difference averages {asymmetry.mean():.1f}° "
+                                    f"(worst rep {asymmetry.max():.1f}°).")
+
+    measured_lean = ~np.isnan(reps['hip_depth']) & ~np.isnan(reps['knee_depth'])
+    if measured_lean.any():
+        lean = reps['knee_depth'][measured_lean] - reps['hip_depth'][measured_lean]
+        mean_lean = float(lean.mean())
+        breakdown['spine'] = _ramp(lean, *LEAN_RANGE).mean()
+        details['spine'] = (f"Hip angle at the bottom averages {reps['hip_depth'][measured_lean].mean():.0f}° against "
+                            f"{reps['knee_depth'][measured_lean].mean():.0f}° at the knee, "
+                            f"{'an upright torso' if mean_lean < LEAN_RANGE[0] + 10 else 'a noticeable forward lean'}.")
+
+    eccentric = reps['eccentric_s']
+    breakdown['tempo'] = _ramp(eccentric, *ECCENTRIC_RANGE).mean()
+    details['tempo'] = f"Lowering takes {eccentric.mean():.1f}s and standing up {reps['concentric_s'].mean():.1f}s on average."
+
+    variation = _variation(reps['knee_depth'], eccentric + reps['concentric_s'])
+    breakdown['consistency'] = float(_ramp(variation, *CONSISTENCY_RANGE))
+    varied = 'depth and tempo' if breakdown['depth'] is not None else 'tempo'
+    details['consistency'] = (f"Rep-to-rep variation in {varied} is {variation * 100:.0f}%, "
+                              f"{'a stable, repeatable pattern' if variation < 0.25 else 'with noticeable drift between reps'}.")
+
+    breakdown = _clip_breakdown(breakdown)
+    score = _weighted_score(breakdown, DIMENSIONS)
+    return {
+        'score': score,
+        'breakdown': breakdown,
+        'feedback': _render_feedback(score, breakdown, details),
+    }
+
+
+def score_rules(video_analysis, rules, dimensions, recommendations, depth_key):
+    """Form score for any exercise from per-dimension ramps over the measured reps.
+
+    ``rules`` maps each dimension key to ``(column, best, worst, detail)``:
+    ``column`` is a rep_details key (or 'consistency', the rep-to-rep
+    variation of ``depth_key`` and tempo), values are ramped from ``best``
+    to ``worst`` like score_form's, and ``detail`` is formatted with the
+    column's ``mean``, ``min``, ``max`` and the rep count ``n``. Returns
+    ``{'score', 'breakdown', 'feedback'}`` or None without a complete rep.
+    """
+    import numpy as np
+    rep_details = video_analysis.get('rep_details') or []
+    if not rep_details:
+        return None
+    columns = {column for column, _, _, _ in rules.values()} - {'consistency'}
+    reps = _rep_arrays(rep_details, columns | {depth_key, 'eccentric_s', 'concentric_s'})
+    n = len(rep_details)
+
+    breakdown = {}
+    details = {}
+    for key, (column, best, worst, detail) in rules.items():
+        if column == 'consistency':
+            values = np.array([_variation(reps[depth_key], reps['eccentric_s'] + reps['concentric_s'])])
+        else:
+            values = reps[column][~np.isnan(reps[column])]
+        if not len(values):
+            breakdown[key], details[key] = None, NOT_MEASURED
+            continue
+        breakdown[key] = _ramp(values, best, worst).mean()
+        if column == 'consistency':
+            values = values * 100
+        details[key] = detail.format(mean=values.mean(), min=values.min(), max=values.max(), n=n)
+
+    breakdown = _clip_breakdown(breakdown)
+    score = _weighted_score(breakdown, dimensions)
+    return {
+        'score': score,
+        'breakdown': breakdown,
+        'feedback': _render_feedback(score, breakdown, details, dimensions, recommendations),
+    }
+
+
+def _render_feedback(score, breakdown, details, dimensions=DIMENSIONS, recommendations=RECOMMENDATIONS):
+    """Feedback text in the same sections the Gemini prompt asks for; unmeasured dimensions are only listed"""
+    ranked = sorted((dim for dim in dimensions if breakdown[dim[0]] is not None),
+                    key=lambda dim: breakdown[dim[0]], reverse=True)
+    lines = [f"FORM SCORE: {score}%", "", "TECHNICAL BREAKDOWN:"]
+    for key, label, _ in dimensions:
+        if breakdown[key] is None:
+            lines.append(f"• {label}: {details[key]}")
+        else:
+            lines.append(f"• {label}: {details[key]} ({_band(breakdown[key])}, {breakdown[key]}/100)")
+
+    lines += ["", "STRENGTHS:"]
+    lines += [f"• {label}: {_band(breakdown[key])} ({breakdown[key]}/100)" for key, label, _ in ranked[:2]]
+
+    weakest = [dim for dim in reversed(ranked) if breakdown[dim[0]] < 90][:2] or [ranked[-1]]
+    lines += ["", "AREAS FOR IMPROVEMENT:"]
+    lines += [f"• {label}: {details[key]}" for key, label, _ in weakest]
+
+    lines += ["", "RECOMMENDATIONS:"]
+    for key, _, _ in weakest:
+        lines += [f"• {drill}" for drill in recommendations[key]]
+    return "\n".join(lines) + "\n"
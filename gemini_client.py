@@ -0,0 +1,302 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from observability import GEMINI_REQUESTS, GEMINI_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Free-tier limits per model: (requests per minute, tokens per minute)
+MODEL_LIMITS = {
+    "gemini-2.0-flash": (15, 1000000),
+    "gemini-2.0-flash-001": (15, 1000000),
+    "gemini-2.0-flash-lite": (30, 1000000),
+    "gemini-1.5-flash": (15, 1000000),
+    "gemini-2.5-pro": (5, 250000),
+    "gemini-2.5-flash": (10, 250000),
+    "gemini-2.5-flash-lite": (15, 250000),
+    "gemini-pro": (15, 32000),
+}
+DEFAULT_LIMITS = (10, 250000)
+
+MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+MAX_QUEUE_WAIT = float(os.getenv('GEMINI_MAX_QUEUE_WAIT', '10'))
+EXPECTED_OUTPUT_TOKENS = 1024
+
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """Import and configure google.generativeai on first use.
+
+    The SDK and its gRPC stack take several hundred milliseconds to import,
+    which would otherwise land on every cold start, including requests that
+    never talk to Gemini.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                api_key = os.getenv('GEMINI_API_KEY')
+                if api_key:
+                    try:
+                        genai.configure(api_key=api_key)
+                        logger.info("✅ Gemini AI configured successfully")
+                    except Exception as e:
+                        logger.error(f"❌ Gemini configuration failed: {e}")
+                _genai = genai
+    return _genai
+
+
+class RateLimitExceeded(Exception):
+    """Local request budget for a model is exhausted; retry after ``retry_after`` seconds"""
+
+    def __init__(self, model_name, retry_after):
+        super().__init__(f"Local request budget for {model_name} exhausted, retry in {retry_after:.1f}s")
+        self.model_name = model_name
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+
+    ``reserve`` takes tokens immediately (the balance may go negative) and
+    returns how long the caller must wait before using them, so many threads
+    can queue on one bucket without holding its lock while they sleep.
+    """
+
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens):
+        with self._lock:
+            self._refill(self._clock())
+            return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def reserve(self, tokens):
+        with self._lock:
+            self._refill(self._clock())
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, tokens):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+class ModelLimiter:
+    """Request and token buckets for one model"""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+
+    def refund(self, token_cost):
+        self.requests.refund(1)
+        self.tokens.refund(token_cost)
+
+    def reserve(self, token_cost, max_wait):
+        """Reserve one request and ``token_cost`` tokens.
+
+        Returns ``(wait, needed)``; ``wait`` is None (and nothing is reserved)
+        when the required wait ``needed`` exceeds ``max_wait``.
+        """
+        with self._lock:
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(token_cost))
+            if wait > max_wait:
+                return None, wait
+            wait = max(self.requests.reserve(1), self.tokens.reserve(token_cost))
+            return wait, wait
+
+
+class ModelMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'coalesced': self.coalesced,
+            'avg_queue_wait': round(self.queue_wait_total / self.calls, 3) if self.calls else 0.0,
+            'max_queue_wait': round(self.queue_wait_max, 3),
+        }
+
+
+def estimate_tokens(prompt):
+    """Rough prompt + response token estimate (about 4 characters per token)"""
+    return len(prompt) // 4 + EXPECTED_OUTPUT_TOKENS
+
+
+class GeminiClient:
+    """Shared gateway for every ``generate_content`` call.
+
+    Applies per-model RPM/TPM token buckets and a global concurrency cap, and
+    coalesces identical in-flight prompts so only one upstream call is made
+    and its response is shared with every caller waiting on it.
+    """
+
+    def __init__(self, limits=None, max_concurrency=MAX_CONCURRENCY, max_queue_wait=MAX_QUEUE_WAIT):
+        self.limits = dict(MODEL_LIMITS, **(limits or {}))
+        self.max_queue_wait = max_queue_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self._limiters = {}
+        self._metrics = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, model_name):
+        with self._lock:
+            limiter = self._limiters.get(model_name)
+            if limiter is None:
+                limiter = ModelLimiter(*self.limits.get(model_name, DEFAULT_LIMITS))
+                self._limiters[model_name] = limiter
+                self._metrics[model_name] = ModelMetrics()
+            return limiter
+
+    def _metric(self, model_name):
+        self._limiter(model_name)
+        return self._metrics[model_name]
+
+    def generate(self, model, prompt, **kwargs):
+        """Rate-limited, coalesced ``model.generate_content(prompt, **kwargs)``"""
+        model_name = model.model_name.split('/')[-1]
+        key = (model_name, prompt, repr(sorted(kwargs.items())))
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._inflight[key] = call
+
+        if not leader:
+            metrics = self._metric(model_name)
+            with self._lock:
+                metrics.coalesced += 1
+            GEMINI_REQUESTS.inc(model=model_name, outcome='coalesced')
+            return call.result()
+
+        try:
+            response = self._call(model_name, model, prompt, kwargs)
+            call.set_result(response)
+            return response
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def generate_stream(self, model, prompt, **kwargs):
+        """Rate-limited ``model.generate_content(prompt, stream=True)``, yielding text pieces.
+
+        Streams are not coalesced, and the concurrency slot is held until the
+        stream is exhausted or closed.
+        """
+        model_name = model.model_name.split('/')[-1]
+        metrics = self._admit(model_name, prompt)
+        upstream_started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            for chunk in model.generate_content(prompt, stream=True, **kwargs):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks carrying only a finish reason or safety ratings have no text
+                    continue
+                if text:
+                    yield text
+        except GeneratorExit:
+            outcome = 'cancelled'
+            raise
+        except Exception:
+            outcome = 'error'
+            with self._lock:
+                metrics.errors += 1
+            raise
+        finally:
+            self._semaphore.release()
+            GEMINI_SECONDS.observe(time.perf_counter() - upstream_started, model=model_name, outcome=outcome)
+            GEMINI_REQUESTS.inc(model=model_name, outcome=outcome)
+
+    def _call(self, model_name, model, prompt, kwargs):
+        metrics = self._admit(model_name, prompt)
+        upstream_started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return model.generate_content(prompt, **kwargs)
+        except Exception:
+            outcome = 'error'
+            with self._lock:
+                metrics.errors += 1
+            raise
+        finally:
+            self._semaphore.release()
+            GEMINI_SECONDS.observe(time.perf_counter() - upstream_started, model=model_name, outcome=outcome)
+            GEMINI_REQUESTS.inc(model=model_name, outcome=outcome)
+
+    def _admit(self, model_name, prompt):
+        """Wait for the model's buckets and a concurrency slot; the caller must release the slot"""
+        limiter = self._limiter(model_name)
+        metrics = self._metric(model_name)
+        started = time.monotonic()
+
+        token_cost = estimate_tokens(prompt)
+        wait, needed = limiter.reserve(token_cost, self.max_queue_wait)
+        if wait is None:
+            self._reject(metrics, model_name, needed)
+        if wait:
+            time.sleep(wait)
+
+        remaining = self.max_queue_wait - (time.monotonic() - started)
+        if not self._semaphore.acquire(timeout=max(0.0, remaining)):
+            limiter.refund(token_cost)
+            self._reject(metrics, model_name, 1.0)
+
+        queue_wait = time.monotonic() - started
+        with self._lock:
+            metrics.calls += 1
+            metrics.queue_wait_total += queue_wait
+            metrics.queue_wait_max = max(metrics.queue_wait_max, queue_wait)
+        return metrics
+
+    def _reject(self, metrics, model_name, retry_after):
+        with self._lock:
+            metrics.rejected += 1
+        GEMINI_REQUESTS.inc(model=model_name, outcome='rejected')
+        raise RateLimitExceeded(model_name, retry_after)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'in_flight': len(self._inflight),
+                'models': {name: metrics.to_dict() for name, metrics in self._metrics.items()},
+            }
+
+
+# Process-wide client shared by app.py and main.py
+gemini_client = GeminiClient()
@@ -0,0 +1,200 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from gemini_client import gemini_client, RateLimitExceeded
+from model_registry import ERROR_TRANSIENT
+
+logger = logging.getLogger(__name__)
+
+class AttemptTimeout(Exception):
+    """A single Gemini attempt ran past its per-attempt timeout"""
+
+
+class StreamInterrupted(Exception):
+    """A Gemini stream broke off after part of the answer had been delivered"""
+
+
+class FallbackPolicy:
+    """Latency budget and retry behaviour for one Gemini request"""
+
+    def __init__(self, budget=None, attempt_timeout=None, max_attempts=None,
+                 backoff_base=0.25, backoff_max=2.0, hedge_after=None):
+        self.budget = budget if budget is not None else float(os.getenv('GEMINI_BUDGET_SECONDS', '25'))
+        self.attempt_timeout = attempt_timeout if attempt_timeout is not None else float(os.getenv('GEMINI_ATTEMPT_TIMEOUT', '12'))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv('GEMINI_MAX_ATTEMPTS', '4'))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Seconds before a second model is raced against a slow first attempt (0 = off)
+        self.hedge_after = hedge_after if hedge_after is not None else float(os.getenv('GEMINI_HEDGE_AFTER', '0'))
+
+    def backoff(self, failures):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** failures)))
+
+
+# google-generativeai 0.3.x has no per-call timeout, so attempts run on a
+# small pool and are abandoned (not awaited) when they overrun.
+_attempt_pool = ThreadPoolExecutor(max_workers=int(os.getenv('GEMINI_ATTEMPT_WORKERS', '8')),
+                                   thread_name_prefix='gemini-attempt')
+
+
+def _attempt(model, prompt):
+    return gemini_client.generate(model, prompt).text
+
+
+def generate_with_fallback(manager, prompt, policy=None):
+    """Run ``prompt`` against the best healthy models within a latency budget.
+
+    Each attempt is bounded by ``attempt_timeout`` and the whole call by
+    ``budget``. Quota and local rate-limit errors switch models immediately;
+    transient errors back off with jitter first. With ``hedge_after`` set, a
+    second model is started when the first is slow and the first answer wins.
+    Returns ``(feedback_text, model_name)``, or None when the budget or the
+    healthy models run out.
+    """
+    policy = policy or FallbackPolicy()
+    deadline = time.monotonic() + policy.budget
+    pending = {}  # future -> (model_name, started_at)
+    attempts = 0
+    failures = 0
+
+    def launch():
+        nonlocal attempts
+        in_flight = {name for name, _ in pending.values()}
+        model = manager.get_working_model(exclude=in_flight)
+        if model is None:
+            return False
+        model_name = model.model_name.split('/')[-1]
+        attempts += 1
+        logger.info(f"📡 Attempt {attempts} on {model_name}")
+        pending[_attempt_pool.submit(_attempt, model, prompt)] = (model_name, time.monotonic())
+        return True
+
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            logger.warning(f"⏱️ Gemini budget of {policy.budget:.0f}s spent after {attempts} attempts")
+            break
+        if not pending and (attempts >= policy.max_attempts or not launch()):
+            break
+
+        # Sleep until the next thing that needs attention
+        wake_at = min([deadline] + [started + policy.attempt_timeout for _, started in pending.values()])
+        hedge_at = None
+        if policy.hedge_after and len(pending) == 1 and attempts < policy.max_attempts:
+            hedge_at = next(iter(pending.values()))[1] + policy.hedge_after
+            wake_at = min(wake_at, hedge_at)
+        done, _ = wait(list(pending), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            model_name, _ = pending.pop(future)
+            try:
+                feedback_text = future.result()
+            except RateLimitExceeded as e:
+                manager.defer(model_name, e.retry_after)
+                continue
+            except Exception as e:
+                logger.warning(f"❌ {model_name} failed: {str(e)[:100]}")
+                failures += 1
+                error_class = manager.mark_failure(model_name, e)
+                if error_class == ERROR_TRANSIENT and not pending:
+                    time.sleep(min(policy.backoff(failures), max(0.0, deadline - time.monotonic())))
+                continue
+            for other in pending:
+                other.cancel()
+            manager.mark_success(model_name)
+            return feedback_text, model_name
+
+        now = time.monotonic()
+        for future, (model_name, started) in list(pending.items()):
+            if now - started >= policy.attempt_timeout:
+                del pending[future]
+                future.cancel()
+                failures += 1
+                manager.mark_failure(model_name, AttemptTimeout(f"Attempt timed out after {policy.attempt_timeout:.0f}s"))
+
+        if hedge_at is not None and len(pending) == 1 and now >= hedge_at:
+            logger.info("🏁 First attempt is slow, hedging with another model")
+            launch()
+
+    for future in pending:
+        future.cancel()
+    return None
+
+
+def _pump(model, prompt, pieces, stop):
+    """Move one streamed answer onto ``pieces`` as ('text', str), then ('done', None) or ('error', exc)"""
+    stream = gemini_client.generate_stream(model, prompt)
+    try:
+        for text in stream:
+            if stop.is_set():
+                return
+            pieces.put(('text', text))
+        pieces.put(('done', None))
+    except Exception as e:
+        pieces.put(('error', e))
+    finally:
+        stream.close()
+
+
+def stream_with_fallback(manager, prompt, policy=None):
+    """Stream ``prompt`` from the best healthy model, yielding ``(model_name, text)`` pieces.
+
+    Until the first piece arrives this walks the models like
+    generate_with_fallback, within the same budget and attempt timeout.
+    After that the answer is committed to one model: an error, or a gap
+    between pieces longer than ``attempt_timeout``, raises StreamInterrupted.
+    Yields nothing when no model starts answering in time. Closing the
+    generator abandons the upstream stream.
+    """
+    policy = policy or FallbackPolicy()
+    deadline = time.monotonic() + policy.budget
+    attempts = 0
+    failures = 0
+
+    while attempts < policy.max_attempts and time.monotonic() < deadline:
+        model = manager.get_working_model()
+        if model is None:
+            break
+        model_name = model.model_name.split('/')[-1]
+        attempts += 1
+        logger.info(f"📡 Streaming attempt {attempts} on {model_name}")
+        pieces = queue.Queue()
+        stop = threading.Event()
+        _attempt_pool.submit(_pump, model, prompt, pieces, stop)
+        started = False
+        try:
+            while True:
+                timeout = policy.attempt_timeout
+                if not started:
+                    timeout = min(timeout, deadline - time.monotonic())
+                try:
+                    kind, value = pieces.get(timeout=max(0.0, timeout))
+                except queue.Empty:
+                    kind, value = 'error', AttemptTimeout(f"No output for {policy.attempt_timeout:.0f}s")
+                if kind == 'text':
+                    started = True
+                    yield model_name, value
+                    continue
+                if kind == 'done':
+                    manager.mark_success(model_name)
+                    return
+                break
+        finally:
+            stop.set()
+
+        if isinstance(value, RateLimitExceeded):
+            manager.defer(model_name, value.retry_after)
+            continue
+        logger.warning(f"❌ {model_name} stream failed: {str(value)[:100]}")
+        failures += 1
+        error_class = manager.mark_failure(model_name, value)
+        if started:
+            raise StreamInterrupted(f"{model_name} stopped mid-answer: {value}") from value
+        if error_class == ERROR_TRANSIENT:
+            time.sleep(min(policy.backoff(failures), max(0.0, deadline - time.monotonic())))
@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = os.getenv('HEALTH_STORE_PATH', '/tmp/fitform_model_health.sqlite3')
+
+# Error classes cleared when the daily quota window rolls over
+QUOTA_ERROR_CLASS = 'quota'
+
+
+def roll_state(state):
+    """Start a fresh quota window for one model's state dict"""
+    state['window_requests'] = 0
+    if state.get('error_class') == QUOTA_ERROR_CLASS:
+        state['error_class'] = None
+        state['cooldown_until'] = 0.0
+        state['consecutive_failures'] = 0
+    return state
+
+
+class MemoryHealthStore:
+    """Process-local model health state (the default, single-worker setup).
+
+    Every store exposes the same four operations, which is all the registry
+    needs and what a shared service such as Redis would have to provide:
+
+    - ``load()``: ``{model name: state dict}`` for every stored model
+    - ``changed()``: cheap check whether another worker wrote since the last ``load()``
+    - ``update(name, mutate)``: atomically replace a model's state with
+      ``mutate(state)`` and return it; ``mutate`` may run more than once
+      under optimistic concurrency, so it must be free of side effects
+    - ``roll_window(now, next_end)``: if the quota window has ended, reset
+      every model with ``roll_state`` and start a window ending at
+      ``next_end``; returns the end of the current window
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._window_end = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            return {name: dict(state) for name, state in self._states.items()}
+
+    def changed(self):
+        return False
+
+    def update(self, name, mutate):
+        with self._lock:
+            state = mutate(dict(self._states.get(name, {})))
+            self._states[name] = state
+            return dict(state)
+
+    def roll_window(self, now, next_end):
+        with self._lock:
+            if self._window_end is None or self._window_end <= now:
+                if self._window_end is not None:
+                    for state in self._states.values():
+                        roll_state(state)
+                self._window_end = next_end
+            return self._window_end
+
+
+class SQLiteHealthStore:
+    """Model health shared by every worker process on a host.
+
+    Writes take SQLite's write lock (BEGIN IMMEDIATE) for the whole
+    read-modify-write, so concurrent failures from several workers never lose
+    an update. ``changed()`` uses PRAGMA data_version, which only moves when
+    another connection commits, so polling it costs no table reads.
+    """
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS model_health ("
+            " name TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS health_meta ("
+            " key TEXT PRIMARY KEY,"
+            " value REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly below
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.data_version = None
+        return conn
+
+    def _write(self, work):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load(self):
+        conn = self._connect()
+        self._local.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        return {name: json.loads(state) for name, state in conn.execute("SELECT name, state FROM model_health")}
+
+    def changed(self):
+        conn = self._connect()
+        return conn.execute("PRAGMA data_version").fetchone()[0] != self._local.data_version
+
+    def update(self, name, mutate):
+        def work(conn):
+            row = conn.execute("SELECT state FROM model_health WHERE name = ?", (name,)).fetchone()
+            state = mutate(json.loads(row[0]) if row else {})
+            conn.execute("INSERT OR REPLACE INTO model_health (name, state) VALUES (?, ?)",
+                         (name, json.dumps(state)))
+            return state
+        return self._write(work)
+
+    def roll_window(self, now, next_end):
+        def work(conn):
+            row = conn.execute("SELECT value FROM health_meta WHERE key = 'window_end'").fetchone()
+            if row is not None and row[0] > now:
+                return row[0]
+            if row is not None:
+                for name, state in conn.execute("SELECT name, state FROM model_health").fetchall():
+                    conn.execute("UPDATE model_health SET state = ? WHERE name = ?",
+                                 (json.dumps(roll_state(json.loads(state))), name))
+            conn.execute("INSERT OR REPLACE INTO health_meta (key, value) VALUES ('window_end', ?)", (next_end,))
+            return next_end
+        return self._write(work)
+
+
+def create_health_store(backend_name=None):
+    """Build the store configured by HEALTH_STORE_BACKEND (memory or sqlite)"""
+    backend_name = (backend_name or os.getenv('HEALTH_STORE_BACKEND', 'memory')).lower()
+    if backend_name == 'sqlite':
+        try:
+            return SQLiteHealthStore()
+        except Exception as e:
+            logger.warning(f"⚠️ SQLite health store unavailable, using memory: {e}")
+    return MemoryHealthStore()
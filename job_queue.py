@@ -0,0 +1,176 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+DEFAULT_QUEUE_DEPTH = int(os.getenv('JOB_QUEUE_DEPTH', '8'))
+DEFAULT_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '600'))
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+
+class Job:
+    """A queued analysis and the stage events it has reported so far"""
+
+    def __init__(self, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = JOB_QUEUED
+        self.stage = JOB_QUEUED
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def report(self, stage, **data):
+        """Record a progress stage; wakes up anyone streaming this job's events"""
+        with self._changed:
+            self.stage = stage
+            self.events.append({'stage': stage, 'time': round(time.time() - self.created_at, 3), **data})
+            self._changed.notify_all()
+
+    def _finish(self, status, result=None, error=None):
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.stage = status
+            self.events.append({'stage': status, 'time': round(self.finished_at - self.created_at, 3)})
+            self._changed.notify_all()
+
+    def wait_for_events(self, seen, timeout):
+        """Block until there are more than ``seen`` events or the job finishes"""
+        with self._changed:
+            if len(self.events) <= seen and not self.finished:
+                self._changed.wait(timeout)
+            return self.events[seen:]
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'events': list(self.events),
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool for background analyses.
+
+    ``submit`` raises QueueFullError instead of blocking when ``max_queued``
+    jobs are already waiting. Finished jobs are kept for ``result_ttl``
+    seconds so clients can poll for the result.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queued=DEFAULT_QUEUE_DEPTH, result_ttl=DEFAULT_RESULT_TTL):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self.rejected = 0
+        self.closed = False
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'analysis-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func(job, *args, **kwargs)``; the job is passed first for progress reports"""
+        if self.closed:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError("Analysis queue is shutting down")
+        self._start()
+        self._evict_finished()
+        job = Job(func, args, kwargs)
+        job.report(JOB_QUEUED, position=self._queue.qsize() + 1)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(f"Analysis queue is full ({self.max_queued} waiting)")
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = JOB_RUNNING
+            try:
+                result = job.func(job, *job.args, **job.kwargs)
+                job._finish(JOB_DONE, result=result)
+            except Exception as e:
+                logger.exception(f"❌ Job {job.id} failed: {e}")
+                job._finish(JOB_FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def drain(self, timeout):
+        """Stop accepting jobs and wait for the queued and running ones; False if ``timeout`` ran out first"""
+        self.closed = True
+        deadline = time.monotonic() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                done.wait(remaining)
+        return True
+
+    def _evict_finished(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == JOB_RUNNING)
+            return {
+                'workers': self.workers,
+                'queue_depth': self._queue.qsize(),
+                'max_queued': self.max_queued,
+                'running': running,
+                'tracked_jobs': len(self._jobs),
+                'rejected': self.rejected,
+            }
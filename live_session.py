@@ -0,0 +1,351 @@
+import importlib.util
+import logging
+import os
+import threading
+import time
+import uuid
+
+from rep_counter import (ASYMMETRY_NOTE_DEGREES, DOWN_LEVEL, FAST_DESCENT_SECONDS, MIN_RANGE_DEGREES,
+                         PARALLEL_KNEE_ANGLE, SMOOTHING_SECONDS, UP_LEVEL, angles_from_keypoints,
+                         build_analysis_data, sides_measured)
+
+logger = logging.getLogger(__name__)
+
+# Live mode needs a long-running server; serverless hosts cannot keep a WebSocket open
+LIVE_MODE_AVAILABLE = importlib.util.find_spec('flask_sock') is not None
+
+LIVE_MAX_SESSIONS = int(os.getenv('LIVE_MAX_SESSIONS', '8'))
+LIVE_IDLE_TIMEOUT = float(os.getenv('LIVE_IDLE_TIMEOUT', '20'))
+LIVE_MAX_FPS = float(os.getenv('LIVE_MAX_FPS', '15'))
+LIVE_RING_SECONDS = float(os.getenv('LIVE_RING_SECONDS', '12'))
+LIVE_MAX_FRAME_BYTES = int(os.getenv('LIVE_MAX_FRAME_KB', '128')) * 1024
+LIVE_MAX_REPS = 100
+
+# Frame mode: frames kept for the background plate, and how often it is rebuilt
+BACKGROUND_FRAMES = 48
+BACKGROUND_REFRESH = 16
+CALIBRATION_FRAMES = 24
+
+# Ring buffer columns
+T, KNEE_L, KNEE_R, HIP_L, HIP_R = range(5)
+
+
+class LiveCapacityError(Exception):
+    """Raised when every live session slot is taken"""
+
+
+class AngleRing:
+    """Fixed-size ring buffer of (time, knee L/R, hip L/R) samples"""
+
+    def __init__(self, capacity):
+        import numpy as np
+        self._data = np.full((capacity, 5), np.nan)
+        self.capacity = capacity
+        self.count = 0
+
+    def append(self, t, knee, hip):
+        self._data[self.count % self.capacity] = (t, knee[0], knee[1], hip[0], hip[1])
+        self.count += 1
+
+    def recent(self, n=None):
+        """Last ``n`` samples (all buffered ones by default), oldest first"""
+        import numpy as np
+        size = min(self.count, self.capacity)
+        n = size if n is None else min(n, size)
+        end = self.count % self.capacity
+        index = (np.arange(end - n, end)) % self.capacity
+        return self._data[index]
+
+
+class OnlineRepDetector:
+    """count_reps' hysteresis state machine, run one sample at a time.
+
+    The top and bottom of the angle range are percentiles of the ring buffer
+    rather than of the whole clip, so thresholds adapt as the set goes on.
+    Completed reps carry the same fields as count_reps' rep_details.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.in_rep = False
+        self.reps = []
+        self._descent_start = None
+        self._bottom = None
+        self._asymmetry = [0.0, 0]  # running sum and count of |left - right| since the descent began
+
+    def update(self, fps):
+        import numpy as np
+        window = max(1, int(round(fps * SMOOTHING_SECONDS)))
+        recent = self.ring.recent(window)
+        t = recent[-1, T]
+        knee = np.nanmean(recent[:, KNEE_L:KNEE_R + 1], axis=0)
+        hip = np.nanmean(recent[:, HIP_L:HIP_R + 1], axis=0)
+        combined = float(knee.mean())
+
+        history = self.ring.recent()[:, KNEE_L:KNEE_R + 1].mean(axis=1)
+        top, bottom = np.nanpercentile(history, 95), np.nanpercentile(history, 5)
+        span = top - bottom
+        if span < MIN_RANGE_DEGREES:
+            # Not enough movement yet to tell the top from the bottom
+            self._descent_start = t
+            return None, combined
+
+        if not self.in_rep and combined > bottom + UP_LEVEL * span:
+            # Still at the top: the next descent starts from here
+            self._descent_start = t
+            self._asymmetry = [0.0, 0]
+        self._asymmetry[0] += abs(knee[0] - knee[1])
+        self._asymmetry[1] += 1
+        if not self.in_rep and combined < bottom + DOWN_LEVEL * span:
+            self.in_rep = True
+            self._bottom = None
+        if self.in_rep:
+            if self._bottom is None or combined < self._bottom[1]:
+                self._bottom = (t, combined, knee, float(hip.mean()))
+            if combined > bottom + UP_LEVEL * span:
+                self.in_rep = False
+                return self._complete(t), combined
+        return None, combined
+
+    def _complete(self, t):
+        bottom_t, depth, knee, hip = self._bottom
+        start = self._descent_start if self._descent_start is not None else bottom_t
+        rep = {
+            'rep': len(self.reps) + 1,
+            'start_time': round(start, 2),
+            'bottom_time': round(bottom_t, 2),
+            'knee_depth': round(depth, 1),
+            'knee_left': round(float(knee[0]), 1),
+            'knee_right': round(float(knee[1]), 1),
+            'hip_depth': round(hip, 1),
+            'eccentric_s': round(bottom_t - start, 2),
+            'concentric_s': round(t - bottom_t, 2),
+            'asymmetry': round(float(self._asymmetry[0] / max(1, self._asymmetry[1])), 1),
+        }
+        self._descent_start = t
+        self._asymmetry = [0.0, 0]
+        if len(self.reps) < LIVE_MAX_REPS:
+            self.reps.append(rep)
+        return rep
+
+
+def rep_cues(rep):
+    """Short coaching cues for one rep, from the same thresholds as the clip notes"""
+    cues = []
+    if rep['knee_depth'] > PARALLEL_KNEE_ANGLE:
+        cues.append('Go deeper: aim for thighs parallel')
+    if rep['asymmetry'] > ASYMMETRY_NOTE_DEGREES:
+        cues.append('Even out: one knee is bending more than the other')
+    if rep['eccentric_s'] < FAST_DESCENT_SECONDS:
+        cues.append('Slow the descent down')
+    return cues or ['Good rep']
+
+
+class LiveSession:
+    """Per-connection state: angle ring buffer, online rep detector and, in frame mode, the pose backend state"""
+
+    def __init__(self, analysis_width=160):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+        self.closed = False
+        self.close_reason = None
+        self.frames = 0
+        self.dropped = 0
+        self.ring = AngleRing(max(16, int(LIVE_RING_SECONDS * LIVE_MAX_FPS)))
+        self.detector = OnlineRepDetector(self.ring)
+        self.analysis_width = analysis_width
+        self._frame_ring = None
+        self._pose_state = {}
+        self._last_t = None
+        self._clock_offset = None
+        self._set_span = None  # (first, last) sample time of the current set
+
+    @property
+    def reps(self):
+        return self.detector.reps
+
+    def touch(self):
+        self.last_seen = time.time()
+
+    def _timestamp(self, client_ms):
+        """Seconds since the session started, from the client's capture time when it sends one"""
+        now = time.time() - self.created_at
+        if client_ms is None:
+            return now
+        if self._clock_offset is None:
+            self._clock_offset = now - client_ms / 1000.0
+        return client_ms / 1000.0 + self._clock_offset
+
+    def _admit(self, t):
+        """Drop samples arriving faster than LIVE_MAX_FPS to bound CPU per session"""
+        if self._last_t is not None and t - self._last_t < 0.9 / LIVE_MAX_FPS:
+            self.dropped += 1
+            return False
+        self._last_t = t
+        return True
+
+    def _fps(self):
+        recent = self.ring.recent(8)
+        if len(recent) < 2 or recent[-1, T] <= recent[0, T]:
+            return LIVE_MAX_FPS
+        return (len(recent) - 1) / (recent[-1, T] - recent[0, T])
+
+    def add_keypoints(self, keypoints, client_ms=None, aspect=1.0):
+        """One frame of client-computed keypoints (pose_engine.KEYPOINT_NAMES order, normalized)"""
+        import numpy as np
+        t = self._timestamp(client_ms)
+        if not self._admit(t):
+            return None
+        knee, hip, valid = _angles(np.asarray(keypoints, dtype=np.float64).reshape(1, -1, 3), aspect)
+        if valid < 1.0:
+            return {'type': 'state', 'reps': len(self.reps), 'tracking': False}
+        return self._add_angles(t, knee, hip)
+
+    def add_frame(self, jpeg_bytes, client_ms=None):
+        """One low-resolution JPEG frame; keypoints come from the configured pose backend"""
+        import numpy as np
+        import video_engine
+        from pose_engine import get_pose_backend
+
+        t = self._timestamp(client_ms)
+        if not self._admit(t):
+            return None
+        video_engine.load_video_libs()
+        cv2 = video_engine.cv2
+        backend = get_pose_backend()
+        if backend is None:
+            raise ValueError('Frame mode needs a pose backend; send keypoints instead')
+
+        gray = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError('Frame is not a decodable image')
+        height = max(1, round(gray.shape[0] * self.analysis_width / gray.shape[1]))
+        if self._frame_ring is None or self._frame_ring.shape[1:] != (height, self.analysis_width):
+            self._frame_ring = np.empty((BACKGROUND_FRAMES, height, self.analysis_width), dtype=np.uint8)
+            self._pose_state = {}
+            self.frames = 0
+        slot = self._frame_ring[self.frames % BACKGROUND_FRAMES]
+        cv2.resize(gray, (self.analysis_width, height), dst=slot, interpolation=cv2.INTER_AREA)
+        self.frames += 1
+
+        buffered = self._frame_ring[:min(self.frames, BACKGROUND_FRAMES)]
+        if self.frames < CALIBRATION_FRAMES:
+            return {'type': 'calibrating', 'progress': round(self.frames / CALIBRATION_FRAMES, 2)}
+        if self.frames % BACKGROUND_REFRESH == 0 or 'background' not in self._pose_state:
+            # Same plate the offline backend uses (per-pixel median), over a sliding window
+            self._pose_state = {}
+            backend.prepare(buffered, self._pose_state)
+
+        keypoints = backend.infer(slot[None], self._pose_state)
+        knee, hip, valid = _angles(keypoints, self.analysis_width / height)
+        if valid < 1.0:
+            return {'type': 'state', 'reps': len(self.reps), 'tracking': False}
+        return self._add_angles(t, knee, hip)
+
+    def _add_angles(self, t, knee, hip):
+        self._set_span = (self._set_span[0] if self._set_span else t, t)
+        self.ring.append(t, knee, hip)
+        rep, combined = self.detector.update(self._fps())
+        if rep is not None:
+            return {'type': 'rep', 'reps': len(self.reps), 'rep': rep, 'cues': rep_cues(rep), 'knee': round(combined, 1)}
+        return {'type': 'state', 'reps': len(self.reps), 'tracking': True,
+                'phase': 'down' if self.detector.in_rep else 'up', 'knee': round(combined, 1)}
+
+    def reset_set(self):
+        """Start the next set; the background plate in frame mode carries over"""
+        self.ring = AngleRing(self.ring.capacity)
+        self.detector = OnlineRepDetector(self.ring)
+        self._set_span = None
+
+    def set_summary(self):
+        """The set so far as the video_analysis dict score_form and the Gemini prompt take"""
+        import numpy as np
+        reps = self.reps
+        duration = self._set_span[1] - self._set_span[0] if self._set_span else 0.0
+        analysis_data = None
+        if reps:
+            bottoms = np.array([[rep['knee_left'], rep['knee_right']] for rep in reps])
+            hips = np.array([[rep['hip_depth']] * 2 for rep in reps])
+            if not sides_measured(bottoms):
+                # A mirrored pose source: left/right differences are not measured
+                reps = [dict(rep, asymmetry=None) for rep in reps]
+            rep_result = {
+                'reps': len(reps),
+                'avg_knee_depth': float(np.mean([rep['knee_depth'] for rep in reps])),
+                'max_asymmetry': max((rep['asymmetry'] for rep in reps if rep['asymmetry'] is not None), default=None),
+                'avg_eccentric_s': float(np.mean([rep['eccentric_s'] for rep in reps])),
+                'bottom_frames': list(range(len(reps))),
+            }
+            analysis_data = build_analysis_data(rep_result, bottoms, hips)
+        return {
+            'exercise': 'squat',  # Online rep detection follows the knee
+            'reps_detected': len(reps),
+            'squats_detected': len(reps),
+            'rep_details': list(reps),
+            'analysis_data': analysis_data,
+            'duration': float(duration),
+            'frames_processed': self.ring.count,
+        }
+
+
+def _angles(keypoints, aspect):
+    knee, hip, valid = angles_from_keypoints(keypoints, aspect)
+    return knee[0], hip[0], valid
+
+
+class LiveSessionRegistry:
+    """Bounded set of open live sessions; idle ones are evicted to make room"""
+
+    def __init__(self, max_sessions=LIVE_MAX_SESSIONS, idle_timeout=LIVE_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.rejected = 0
+        self.evicted = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def open(self, **kwargs):
+        with self._lock:
+            self._evict_idle(time.time())
+            if len(self._sessions) >= self.max_sessions:
+                self.rejected += 1
+                raise LiveCapacityError(f"All {self.max_sessions} live sessions are in use")
+            session = LiveSession(**kwargs)
+            self._sessions[session.id] = session
+            return session
+
+    def close(self, session, reason='closed'):
+        with self._lock:
+            session.closed = True
+            session.close_reason = session.close_reason or reason
+            self._sessions.pop(session.id, None)
+
+    def evict_idle(self):
+        with self._lock:
+            return self._evict_idle(time.time())
+
+    def _evict_idle(self, now):
+        idle = [s for s in self._sessions.values() if now - s.last_seen > self.idle_timeout]
+        for session in idle:
+            # The connection's handler sees ``closed`` on its next receive and hangs up
+            session.closed = True
+            session.close_reason = 'idle'
+            del self._sessions[session.id]
+            self.evicted += 1
+        if idle:
+            logger.info(f"🧹 Evicted {len(idle)} idle live session(s)")
+        return len(idle)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'idle_timeout_s': self.idle_timeout,
+                'rejected': self.rejected,
+                'evicted': self.evicted,
+            }
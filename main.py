@@ -1,46 +1,127 @@
-import google.generativeai as genai  # Add this import
+import logging
+
+from exercises import get_exercise
+from feedback_cache import canonical_analysis_data, create_feedback_cache, feedback_key, warm_feature_grid
+from gemini_client import gemini_client, get_genai
+
+logger = logging.getLogger(__name__)
+
+# Warm-up gives up once the model looks unavailable rather than burning quota
+WARM_MAX_CONSECUTIVE_FAILURES = 3
 
 class FitnessAI:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, feedback_cache=None):
         self.api_key = api_key
         self.ai_enabled = api_key is not None
+        self.feedback_cache = feedback_cache if feedback_cache is not None else create_feedback_cache()
         
         if self.ai_enabled:
             try:
+                genai = get_genai()
                 genai.configure(api_key=self.api_key)
                 self.model = genai.GenerativeModel('gemini-pro')
-                print("✅ Gemini AI configured successfully")
+                logger.info("✅ Gemini AI configured successfully")
             except Exception as e:
-                print(f"❌ Gemini configuration failed: {e}")
+                logger.error(f"❌ Gemini configuration failed: {e}")
                 self.ai_enabled = False
+    @property
+    def model_name(self):
+        return getattr(self.model, 'model_name', 'gemini-pro')
+
     def get_ai_feedback(self, analysis_data):
-        """Get AI-powered fitness feedback from Gemini"""
+        """Get AI-powered fitness feedback from Gemini for the exercise ``analysis_data`` was measured as.
+
+        Angles are quantized and notes normalized first; answers are cached
+        per (features, model), so near-identical clips share one API call.
+        """
         if not self.ai_enabled:
             return None
-            
+
         try:
-            prompt = f"""
-            As an expert fitness coach with 10+ years experience, analyze this squat form data and provide specific, actionable feedback:
+            canonical = canonical_analysis_data(analysis_data)
+            key = feedback_key(canonical, self.model_name)
+            cached = self.feedback_cache.get(key)
+            if cached is not None:
+                return cached['feedback']
+            return self._generate_feedback(canonical, key)
+
+        except Exception as e:
+            logger.warning(f"Gemini AI feedback error: {e}")
+            return None
+
+    def _generate_feedback(self, canonical, key):
+        exercise = get_exercise(canonical['exercise'])
+        measured = "\n".join(f"            {line}" for line in exercise.measured_lines(canonical))
+        focus = "\n".join(f"            {number}. {area}" for number, area in enumerate(exercise.focus, 1))
+        prompt = f"""
+            As an expert fitness coach with 10+ years experience, analyze this {exercise.noun} form data and provide specific, actionable feedback:
 
-            SQUAT FORM ANALYSIS DATA:
-            - Knee Angles: Left {analysis_data['knee_angles']['left']}°, Right {analysis_data['knee_angles']['right']}°
-            - Hip Angles: Left {analysis_data['hip_angles']['left']}°, Right {analysis_data['hip_angles']['right']}°
-            - Current Notes: {', '.join(analysis_data['notes'])}
+            {exercise.noun.upper()} FORM ANALYSIS DATA:
+{measured}
             
             Provide 2-3 specific, actionable recommendations focusing on:
-            1. Depth and range of motion improvement
-            2. Balance and symmetry between sides
-            3. Upper body positioning and core engagement
-            4. Safety considerations and injury prevention
+{focus}
             
             Keep the response concise, professional, and encouraging. Focus on practical fixes the user can implement immediately.
             
             Format your response as bullet points starting with •
             """
 
-            response = self.model.generate_content(prompt)
-            return response.text
-                
-        except Exception as e:
-            print(f"Gemini AI feedback error: {e}")
-            return None
\ No newline at end of file
+        response = gemini_client.generate(self.model, prompt)
+        self.feedback_cache.set(key, {'feedback': response.text})
+        return response.text
+
+    def warm_feedback_cache(self, samples=None, limit=None):
+        """Precompute feedback for common feature buckets ahead of traffic.
+
+        ``samples`` is an iterable of analysis_data dicts (e.g. replayed from
+        logs); the built-in depth/lean/notes grid is used when omitted.
+        Buckets already cached are skipped. Returns counts per outcome.
+        """
+        counts = {'generated': 0, 'cached': 0, 'failed': 0}
+        if not self.ai_enabled:
+            return counts
+
+        failures_in_a_row = 0
+        seen = set()
+        for analysis_data in (samples if samples is not None else warm_feature_grid()):
+            if limit is not None and counts['generated'] >= limit:
+                break
+            canonical = canonical_analysis_data(analysis_data)
+            key = feedback_key(canonical, self.model_name)
+            if key in seen:
+                continue
+            seen.add(key)
+            if self.feedback_cache.get(key) is not None:
+                counts['cached'] += 1
+                continue
+            try:
+                self._generate_feedback(canonical, key)
+                counts['generated'] += 1
+                failures_in_a_row = 0
+            except Exception as e:
+                logger.warning(f"⚠️ Feedback warm-up failed for {canonical}: {e}")
+                counts['failed'] += 1
+                failures_in_a_row += 1
+                if failures_in_a_row >= WARM_MAX_CONSECUTIVE_FAILURES:
+                    logger.error("❌ Gemini keeps failing, stopping feedback warm-up")
+                    break
+        logger.info(f"🔥 Feedback cache warmed: {counts}")
+        return counts
+
+
+if __name__ == '__main__':
+    # python main.py warm-cache [samples.jsonl]  (use FEEDBACK_CACHE_BACKEND=sqlite to keep the result)
+    import json
+    import os
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] != ['warm-cache']:
+        sys.exit("usage: python main.py warm-cache [samples.jsonl]")
+    samples = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            samples = [json.loads(line) for line in f if line.strip()]
+    fitness_ai = FitnessAI(os.getenv('GEMINI_API_KEY'))
+    print(json.dumps(fitness_ai.warm_feedback_cache(samples)))
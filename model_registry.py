@@ -0,0 +1,326 @@
+import logging
+import threading
+import time
+
+from health_store import MemoryHealthStore
+
+logger = logging.getLogger(__name__)
+
+# Error classes and how long a model sits out after each one (seconds).
+# Quota errors are special-cased to wait until the daily quota reset.
+ERROR_QUOTA = 'quota'
+ERROR_RATE = 'rate'
+ERROR_NOT_FOUND = 'not_found'
+ERROR_AUTH = 'auth'
+ERROR_TRANSIENT = 'transient'
+
+TRANSIENT_BASE_COOLDOWN = 30
+RATE_COOLDOWN = 60
+TRANSIENT_MAX_COOLDOWN = 600
+NOT_FOUND_COOLDOWN = 6 * 3600
+AUTH_COOLDOWN = 3600
+
+# How often the registry checks a shared store for other workers' updates
+STORE_SYNC_INTERVAL = 1.0
+
+# ModelHealth attributes kept in the health store
+STATE_FIELDS = ('last_success', 'last_failure', 'error_class', 'last_error', 'cooldown_until',
+                'consecutive_failures', 'total_successes', 'total_failures', 'window_requests')
+
+
+def classify_error(error):
+    """Map a Gemini exception (or message) to one of the registry error classes"""
+    error_msg = str(error).lower()
+    if 'perminute' in error_msg or 'per minute' in error_msg or 'rate limit' in error_msg:
+        return ERROR_RATE
+    if 'quota' in error_msg or '429' in error_msg or 'resource exhausted' in error_msg:
+        return ERROR_QUOTA
+    if '404' in error_msg or 'not found' in error_msg or 'is not supported' in error_msg:
+        return ERROR_NOT_FOUND
+    if '401' in error_msg or '403' in error_msg or 'api key' in error_msg or 'permission' in error_msg:
+        return ERROR_AUTH
+    return ERROR_TRANSIENT
+
+
+class ModelHealth:
+    """Health record for a single Gemini model"""
+
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self.last_success = None
+        self.last_failure = None
+        self.error_class = None
+        self.last_error = None
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.total_successes = 0
+        self.total_failures = 0
+        self.window_requests = 0
+
+    def dump_state(self):
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+    def load_state(self, state):
+        for field in STATE_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
+
+    def is_available(self, now):
+        return now >= self.cooldown_until
+
+    def to_dict(self, now):
+        return {
+            'priority': self.priority,
+            'available': self.is_available(now),
+            'last_success': _format_ts(self.last_success),
+            'last_failure': _format_ts(self.last_failure),
+            'error_class': self.error_class,
+            'last_error': self.last_error,
+            'cooldown_remaining': max(0, int(self.cooldown_until - now)),
+            'consecutive_failures': self.consecutive_failures,
+            'total_successes': self.total_successes,
+            'total_failures': self.total_failures,
+            'requests_this_window': self.window_requests,
+        }
+
+
+def _format_ts(ts):
+    if ts is None:
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+class ModelHealthRegistry:
+    """Model health registry backed by a pluggable health store.
+
+    Picks the best available model without touching the network. The choice is
+    cached and only recomputed when a model's state changes or the earliest
+    cooldown expires, so ``best_model()`` is O(1) on the request path. Models
+    whose cooldown has expired become eligible again; an optional background
+    prober re-checks them as soon as their cooldown ends.
+
+    State changes go through ``store`` atomically, so with a shared store
+    (see health_store.py) every worker sees the others' failures within
+    ``sync_interval`` seconds. When ``quota_reset_fn`` is given, request
+    counters and quota cooldowns reset when the quota window ends rather than
+    when a process restarts.
+    """
+
+    def __init__(self, model_names, probe=None, quota_reset_fn=None, clock=time.time,
+                 store=None, sync_interval=STORE_SYNC_INTERVAL):
+        self._lock = threading.Lock()
+        self._health = {name: ModelHealth(name, i) for i, name in enumerate(model_names)}
+        self._order = list(model_names)
+        self._probe = probe
+        self._quota_reset_fn = quota_reset_fn
+        self._clock = clock
+        self._best = None
+        self._next_expiry = float('inf')
+        self._wakeup = threading.Condition(self._lock)
+        self._prober = None
+        self._store = store or MemoryHealthStore()
+        self._sync_interval = sync_interval
+        self._next_sync = 0.0
+        self._window_end = None
+        self._sync(self._clock(), force=True)
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+    def _recompute(self, now):
+        """Refresh cached best model and the next cooldown expiry (lock held)"""
+        best = None
+        next_expiry = float('inf')
+        for name in self._order:
+            health = self._health[name]
+            if health.is_available(now):
+                if best is None:
+                    best = name
+            else:
+                next_expiry = min(next_expiry, health.cooldown_until)
+        self._best = best
+        self._next_expiry = next_expiry
+
+    def best_model(self, exclude=()):
+        """Return the highest-priority available model name, or None"""
+        now = self._clock()
+        if now >= self._next_sync:
+            self._sync(now)
+        if now >= self._next_expiry:
+            with self._lock:
+                if now >= self._next_expiry:
+                    self._recompute(now)
+        if not exclude or self._best not in exclude:
+            return self._best
+        # Rare path (hedged requests): skip models already in flight
+        for name in self._order:
+            if name not in exclude and self._health[name].is_available(now):
+                return name
+        return None
+
+    def available_models(self):
+        now = self._clock()
+        return [name for name in self._order if self._health[name].is_available(now)]
+
+    def unavailable_models(self):
+        now = self._clock()
+        return [name for name in self._order if not self._health[name].is_available(now)]
+
+    def priority_of(self, name):
+        return self._health[name].priority
+
+    # ------------------------------------------------------------------
+    # State updates
+    # ------------------------------------------------------------------
+    def mark_success(self, name):
+        def succeed(health, now):
+            health.last_success = now
+            health.consecutive_failures = 0
+            health.total_successes += 1
+            health.window_requests += 1
+            health.error_class = None
+            health.cooldown_until = 0.0
+        self._apply(name, succeed)
+
+    def mark_failure(self, name, error, cooldown_until=None):
+        """Record a failure and put the model into cooldown based on error class"""
+        error_class = classify_error(error)
+
+        def fail(health, now):
+            health.last_failure = now
+            health.error_class = error_class
+            health.last_error = str(error)[:200]
+            health.consecutive_failures += 1
+            health.total_failures += 1
+            health.window_requests += 1
+            until = cooldown_until
+            if until is None:
+                until = now + self._cooldown_for(error_class, health.consecutive_failures)
+            health.cooldown_until = max(health.cooldown_until, until)
+        self._apply(name, fail)
+
+        with self._lock:
+            self._wakeup.notify_all()
+        self._ensure_prober()
+        return error_class
+
+    def _cooldown_for(self, error_class, failures):
+        if error_class == ERROR_QUOTA:
+            if self._quota_reset_fn is not None:
+                return max(TRANSIENT_BASE_COOLDOWN, self._quota_reset_fn())
+            return TRANSIENT_MAX_COOLDOWN
+        if error_class == ERROR_RATE:
+            return RATE_COOLDOWN
+        if error_class == ERROR_NOT_FOUND:
+            return NOT_FOUND_COOLDOWN
+        if error_class == ERROR_AUTH:
+            return AUTH_COOLDOWN
+        return min(TRANSIENT_MAX_COOLDOWN, TRANSIENT_BASE_COOLDOWN * (2 ** (failures - 1)))
+
+    def defer(self, name, seconds):
+        """Skip a model for a while without counting it as failed (e.g. local rate limit)"""
+        def postpone(health, now):
+            health.cooldown_until = max(health.cooldown_until, now + seconds)
+        self._apply(name, postpone)
+
+    def reset(self, names=None):
+        """Clear cooldowns (e.g. after the daily quota reset)"""
+        def clear(health, now):
+            health.cooldown_until = 0.0
+            health.consecutive_failures = 0
+            health.error_class = None
+        for name in names or self._order:
+            self._apply(name, clear)
+
+    def snapshot(self):
+        now = self._clock()
+        with self._lock:
+            return {name: self._health[name].to_dict(now) for name in self._order}
+
+    # ------------------------------------------------------------------
+    # Health store
+    # ------------------------------------------------------------------
+    def _apply(self, name, change):
+        """Apply ``change(health, now)`` to the stored record, then mirror it locally"""
+        now = self._clock()
+        priority = self._health[name].priority
+
+        def mutate(state):
+            health = ModelHealth(name, priority)
+            health.load_state(state)
+            change(health, now)
+            return health.dump_state()
+
+        try:
+            state = self._store.update(name, mutate)
+        except Exception as e:
+            # Keep serving from local state if the shared store is unreachable
+            logger.warning(f"⚠️ Model health store write failed: {e}")
+            state = mutate(self._health[name].dump_state())
+        with self._lock:
+            self._health[name].load_state(state)
+            self._recompute(now)
+
+    def _sync(self, now, force=False):
+        """Pick up other workers' updates and roll the quota window when it ends"""
+        self._next_sync = now + self._sync_interval
+        try:
+            rolled = False
+            if self._quota_reset_fn is not None and (self._window_end is None or now >= self._window_end):
+                window_end = self._store.roll_window(now, now + self._quota_reset_fn())
+                rolled = window_end != self._window_end
+                self._window_end = window_end
+            if not (force or rolled or self._store.changed()):
+                return
+            states = self._store.load()
+        except Exception as e:
+            logger.warning(f"⚠️ Model health store read failed: {e}")
+            states = {}
+        with self._lock:
+            for name, state in states.items():
+                if name in self._health:
+                    self._health[name].load_state(state)
+            self._recompute(now)
+
+    # ------------------------------------------------------------------
+    # Background re-checks
+    # ------------------------------------------------------------------
+    def _ensure_prober(self):
+        if self._probe is None:
+            return
+        with self._lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name='model-health-prober', daemon=True)
+            self._prober.start()
+
+    def _next_due(self, now):
+        """Model whose cooldown expired and has not been re-checked yet (lock held)"""
+        for name in self._order:
+            health = self._health[name]
+            if health.error_class is not None and health.is_available(now):
+                return name
+        return None
+
+    def _probe_loop(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                name = self._next_due(now)
+                while name is None:
+                    pending = [h.cooldown_until for h in self._health.values() if h.error_class is not None]
+                    if not pending:
+                        self._prober = None
+                        return
+                    self._wakeup.wait(timeout=max(1.0, min(pending) - now))
+                    now = self._clock()
+                    name = self._next_due(now)
+            try:
+                self._probe(name)
+            except Exception as e:
+                logger.info(f"🩺 Background check failed for {name}: {str(e)[:100]}")
+                self.mark_failure(name, e)
+            else:
+                logger.info(f"🩺 Background check passed for {name}")
+                self.mark_success(name)
@@ -0,0 +1,338 @@
+import logging
+import os
+import threading
+
+from video_engine import VIDEO_ENGINE_AVAILABLE, get_sampler, load_video_libs
+
+logger = logging.getLogger(__name__)
+
+np = None
+
+# Keypoints every backend reports, as (x, y, confidence) with x and y
+# normalized to the frame width and height. Arms come last so clients that
+# send only the first nine (legs and torso) keep working; backends that
+# cannot see them report confidence 0.
+KEYPOINT_NAMES = (
+    'nose', 'left_shoulder', 'right_shoulder', 'left_hip', 'right_hip',
+    'left_knee', 'right_knee', 'left_ankle', 'right_ankle',
+    'left_elbow', 'right_elbow', 'left_wrist', 'right_wrist',
+)
+KEYPOINT_INDEX = {name: i for i, name in enumerate(KEYPOINT_NAMES)}
+
+POSE_BACKEND = os.getenv('POSE_BACKEND', 'silhouette')  # 'none' disables the stage
+KEYPOINT_CACHE_DIR = os.getenv('KEYPOINT_CACHE_DIR', '/tmp/fitform_keypoints')
+KEYPOINT_CACHE_MAX_BYTES = int(os.getenv('KEYPOINT_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        load_video_libs()
+        import numpy
+        np = numpy
+
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+class SilhouettePoseBackend:
+    """CPU-only keypoint estimate from the lifter's silhouette; needs no model weights.
+
+    Segments the lifter against a background plate (the per-pixel median of the
+    clip) and the border colour, then fits a two-segment leg of fixed length
+    between the ankles (lowest foreground row) and the hips (a fixed upper-body
+    length below the top of the head). Good enough for a side-on, static camera
+    and a standing lifter; arms are not tracked (elbows and wrists sit on the
+    shoulders with confidence 0). A learned model can be registered under
+    another name for anything harder.
+    """
+
+    name = 'silhouette'
+    batch_size = 64
+
+    # Body proportions as fractions of standing height
+    HIP_HEIGHT = 0.53
+    SHOULDER_DROP = 0.18
+    NOSE_DROP = 0.06
+    THRESHOLD = 25
+    MIN_ROW_FRACTION = 0.02
+    MIN_HEIGHT_FRACTION = 0.1
+
+    def prepare(self, frames, state):
+        """Fill per-video state (background plate, standing height) on first sight of a clip"""
+        _load_numpy()
+        if 'background' not in state:
+            plate = np.median(frames, axis=0).astype(np.uint8)
+            border = np.concatenate([plate[0], plate[-1], plate[:, 0], plate[:, -1]])
+            state['background'] = plate
+            state['border_level'] = np.array(np.median(border), dtype=np.float32)
+        if 'standing_height' not in state:
+            top, bottom, _, _ = self._extent(frames, state)
+            heights = bottom - top
+            state['standing_height'] = np.array(max(1.0, float(np.percentile(heights, 95))), dtype=np.float32)
+
+    def _extent(self, frames, state):
+        """Per-frame (top row, bottom row, centre column, facing direction) of the silhouette"""
+        frames = frames.astype(np.int16)
+        mask = (np.abs(frames - state['background']) > self.THRESHOLD) | \
+               (np.abs(frames - state['border_level']) > self.THRESHOLD)
+        n, height, width = mask.shape
+
+        rows = mask.sum(axis=2) > max(1, self.MIN_ROW_FRACTION * width)
+        present = rows.any(axis=1)
+        top = np.where(present, rows.argmax(axis=1), 0).astype(np.float32)
+        bottom = np.where(present, height - 1 - rows[:, ::-1].argmax(axis=1), 0).astype(np.float32)
+
+        columns = np.arange(width, dtype=np.float32)
+        mass = mask.sum(axis=1).astype(np.float32)
+        total = np.maximum(mass.sum(axis=1), 1.0)
+        centre = (mass * columns).sum(axis=1) / total
+
+        # Knees travel forward: compare the lower half's centroid to the whole body's
+        lower = mask[:, height // 2:, :].sum(axis=1).astype(np.float32)
+        lower_centre = (lower * columns).sum(axis=1) / np.maximum(lower.sum(axis=1), 1.0)
+        facing = np.where(lower_centre >= centre, 1.0, -1.0).astype(np.float32)
+        return top, np.where(present, bottom, top), centre, facing
+
+    def infer(self, frames, state):
+        n, height, width = frames.shape
+        top, bottom, centre, facing = self._extent(frames, state)
+        standing = float(state['standing_height'])
+        body = bottom - top
+
+        leg = standing * self.HIP_HEIGHT / 2
+        hip_height = np.clip(body - standing * (1 - self.HIP_HEIGHT), 0.0, 2 * leg)
+        half_knee = np.arcsin(np.clip(hip_height / (2 * leg), 0.0, 1.0))
+
+        ankle_y = bottom
+        hip_y = bottom - hip_height
+        knee_y = bottom - hip_height / 2
+        knee_x = centre + facing * leg * np.cos(half_knee)
+        shoulder_y = top + standing * self.SHOULDER_DROP
+        nose_y = top + standing * self.NOSE_DROP
+
+        confidence = np.where(body >= self.MIN_HEIGHT_FRACTION * height, 0.5, 0.0).astype(np.float32)
+        keypoints = np.empty((n, len(KEYPOINT_NAMES), 3), dtype=np.float32)
+        for side in ('left', 'right'):
+            keypoints[:, KEYPOINT_INDEX[f'{side}_shoulder'], 0] = centre
+            keypoints[:, KEYPOINT_INDEX[f'{side}_shoulder'], 1] = shoulder_y
+            keypoints[:, KEYPOINT_INDEX[f'{side}_hip'], 0] = centre
+            keypoints[:, KEYPOINT_INDEX[f'{side}_hip'], 1] = hip_y
+            keypoints[:, KEYPOINT_INDEX[f'{side}_knee'], 0] = knee_x
+            keypoints[:, KEYPOINT_INDEX[f'{side}_knee'], 1] = knee_y
+            keypoints[:, KEYPOINT_INDEX[f'{side}_ankle'], 0] = centre
+            keypoints[:, KEYPOINT_INDEX[f'{side}_ankle'], 1] = ankle_y
+            for arm in ('elbow', 'wrist'):
+                keypoints[:, KEYPOINT_INDEX[f'{side}_{arm}'], 0] = centre
+                keypoints[:, KEYPOINT_INDEX[f'{side}_{arm}'], 1] = shoulder_y
+        keypoints[:, KEYPOINT_INDEX['nose'], 0] = centre
+        keypoints[:, KEYPOINT_INDEX['nose'], 1] = nose_y
+        keypoints[:, :, 0] /= width
+        keypoints[:, :, 1] /= height
+        keypoints[:, :, 2] = confidence[:, None]
+        for side in ('left', 'right'):
+            keypoints[:, KEYPOINT_INDEX[f'{side}_elbow'], 2] = 0.0
+            keypoints[:, KEYPOINT_INDEX[f'{side}_wrist'], 2] = 0.0
+        return keypoints
+
+
+POSE_BACKENDS = {'silhouette': SilhouettePoseBackend}
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def register_pose_backend(name, factory):
+    """Make a backend available as POSE_BACKEND=name.
+
+    A backend has ``name``, ``batch_size``, ``prepare(frames, state)`` and
+    ``infer(frames, state) -> (n, len(KEYPOINT_NAMES), 3)`` arrays, where
+    ``frames`` is a uint8 grayscale stack and ``state`` a dict of NumPy
+    arrays kept per video alongside the cached keypoints.
+    """
+    POSE_BACKENDS[name] = factory
+
+
+def get_pose_backend(name=None):
+    """Shared backend instance, or None when the stage is disabled or unavailable"""
+    name = name or POSE_BACKEND
+    if name == 'none' or not VIDEO_ENGINE_AVAILABLE or name not in POSE_BACKENDS:
+        return None
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = POSE_BACKENDS[name]()
+                _backends[name] = backend
+    return backend
+
+
+# ----------------------------------------------------------------------
+# Keypoint cache
+# ----------------------------------------------------------------------
+class KeypointFile:
+    """Memory-mapped (frame_count, keypoints, 3) float16 array for one clip and backend.
+
+    Rows are indexed by absolute frame number and stay NaN until inferred, so
+    any sampling stride can reuse the frames a previous stride already covered.
+    """
+
+    def __init__(self, path, frame_count):
+        self.path = path
+        self.state_path = path[:-len('.npy')] + '.state.npz'
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float16,
+                                              shape=(frame_count, len(KEYPOINT_NAMES), 3))
+            array[:] = np.nan
+            array.flush()
+            del array
+            os.replace(tmp_path, path)
+        self.array = np.lib.format.open_memmap(path, mode='r+')
+        if self.array.shape[0] != frame_count:
+            raise ValueError(f"Keypoint cache {os.path.basename(path)} has {self.array.shape[0]} frames, expected {frame_count}")
+
+    def missing(self, indices):
+        return indices[np.isnan(self.array[indices, 0, 2])]
+
+    def write(self, indices, keypoints):
+        self.array[indices] = keypoints
+
+    def read(self, indices):
+        return self.array[indices].astype(np.float32)
+
+    def load_state(self):
+        try:
+            with np.load(self.state_path) as saved:
+                return {key: saved[key] for key in saved.files}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, state):
+        self.array.flush()
+        tmp_path = f"{self.state_path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, **state)
+        os.replace(tmp_path, self.state_path)
+
+
+class KeypointStore:
+    """Directory of KeypointFiles keyed by video hash and backend, trimmed by total size"""
+
+    def __init__(self, directory=KEYPOINT_CACHE_DIR, max_bytes=KEYPOINT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, video_hash, backend_name, frame_count):
+        _load_numpy()
+        # Keyed by the keypoint count too, so files written before a keypoint was added are never misread
+        path = os.path.join(self.directory, f"{video_hash}_{backend_name}_k{len(KEYPOINT_NAMES)}.npy")
+        created = not os.path.exists(path)
+        kp_file = KeypointFile(path, frame_count)
+        if created:
+            self._evict(keep=path)
+        else:
+            os.utime(path)
+        return kp_file
+
+    def _evict(self, keep):
+        """Drop least recently used clips once the directory is over budget"""
+        try:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.npy'):
+                    path = os.path.join(self.directory, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                for stale in (path, path[:-len('.npy')] + '.state.npz'):
+                    if os.path.exists(stale):
+                        os.remove(stale)
+                total -= size
+        except OSError as e:
+            logger.warning(f"⚠️ Keypoint cache eviction failed: {e}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_keypoint_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = KeypointStore()
+    return _store
+
+
+# ----------------------------------------------------------------------
+# Stage
+# ----------------------------------------------------------------------
+def extract_keypoints(video_path, video_hash=None, sampler=None, backend=None, store=None, on_decoded=None,
+                      info=None, deadline=None):
+    """Keypoints for the clip's sampled frames, decoding and inferring only uncached ones.
+
+    Returns ``(info, stride, indices, keypoints, stats)``; ``keypoints`` is a
+    float32 ``(len(indices), len(KEYPOINT_NAMES), 3)`` array and ``stats``
+    says how many frames were reused from the cache and how many inferred.
+    ``on_decoded(indices, frames)`` sees the decoded grayscale frames, so
+    other per-frame work can share this decode. ``info`` skips probing the
+    clip again and decoding stops at ``deadline`` (see FrameSampler.decode).
+    """
+    _load_numpy()
+    sampler = sampler or get_sampler()
+    backend = backend or get_pose_backend()
+    if backend is None:
+        raise RuntimeError("No pose backend available")
+
+    info = info or sampler.probe(video_path, deadline)
+    stride, indices = sampler.plan(info)
+    kp_file = None
+    if video_hash:
+        try:
+            kp_file = (store or get_keypoint_store()).open(video_hash, backend.name, info.frame_count)
+        except Exception as e:
+            logger.warning(f"⚠️ Keypoint cache unavailable: {e}")
+
+    missing = kp_file.missing(indices) if kp_file is not None else indices
+    inferred = {}
+    if len(missing):
+        decoded, frames = sampler.decode(video_path, info, missing, deadline)
+        if on_decoded is not None:
+            on_decoded(decoded, frames)
+        state = kp_file.load_state() if kp_file is not None else {}
+        backend.prepare(frames, state)
+        for start in range(0, len(decoded), backend.batch_size):
+            batch = slice(start, start + backend.batch_size)
+            keypoints = backend.infer(frames[batch], state)
+            if kp_file is not None:
+                kp_file.write(decoded[batch], keypoints)
+            else:
+                inferred.update(zip(decoded[batch].tolist(), keypoints))
+        if kp_file is not None:
+            kp_file.save(state)
+
+    if kp_file is not None:
+        keypoints = kp_file.read(indices)
+    else:
+        empty = np.full((len(KEYPOINT_NAMES), 3), np.nan, dtype=np.float32)
+        keypoints = np.stack([inferred.get(int(i), empty) for i in indices]) if len(indices) else \
+            np.empty((0, len(KEYPOINT_NAMES), 3), dtype=np.float32)
+
+    # Frames the decoder never reached (time budget, truncated stream) stay NaN
+    valid = ~np.isnan(keypoints[:, 0, 2])
+    stats = {'backend': backend.name, 'reused': int(len(indices) - len(missing)),
+             'inferred': int(len(missing)), 'frames': int(valid.sum())}
+    logger.info(f"🦴 Keypoints: {stats['inferred']} inferred, {stats['reused']} reused ({backend.name})")
+    return info, stride, indices[valid], keypoints[valid], stats
+
+
+def keypoint_aspect(info):
+    """Width/height ratio that turns normalized keypoints back into square units"""
+    return info.width / info.height if info.height else 1.0
@@ -0,0 +1,269 @@
+
+# Hysteresis levels as a fraction of the observed angle range: a rep starts
+# when the knee angle drops below DOWN_LEVEL and completes when it climbs
+# back above UP_LEVEL.
+DOWN_LEVEL = 0.35
+UP_LEVEL = 0.70
+MIN_RANGE_DEGREES = 15.0
+SMOOTHING_SECONDS = 0.2
+
+# Thresholds used to turn metrics into coaching notes
+PARALLEL_KNEE_ANGLE = 100.0
+ASYMMETRY_NOTE_DEGREES = 8.0
+FAST_DESCENT_SECONDS = 1.0
+
+
+def _as_sides(angles):
+    """Return an (N, 2) float array of left/right angles"""
+    import numpy as np
+    angles = np.asarray(angles, dtype=np.float64)
+    if angles.ndim == 1:
+        return np.repeat(angles[:, None], 2, axis=1)
+    if angles.ndim != 2 or angles.shape[1] != 2:
+        raise ValueError("Angle series must have shape (N,) or (N, 2)")
+    return angles
+
+
+def sides_measured(angles):
+    """Whether an (N, 2) angle series tells left from right (1-D input and mirrored sources do not)"""
+    import numpy as np
+    angles = _as_sides(angles)
+    return bool(len(angles)) and bool(np.any(np.abs(angles[:, 0] - angles[:, 1]) > 1e-6))
+
+
+def smooth(series, window):
+    """Centered moving average along axis 0 with edge padding"""
+    import numpy as np
+    window = max(1, int(window))
+    if window == 1 or len(series) < window:
+        return np.asarray(series, dtype=np.float64)
+    series = np.asarray(series, dtype=np.float64)
+    pad = window // 2
+    padded = np.pad(series, [(pad, window - 1 - pad)] + [(0, 0)] * (series.ndim - 1), mode='edge')
+    csum = np.cumsum(padded, axis=0)
+    csum = np.concatenate([np.zeros((1,) + series.shape[1:]), csum], axis=0)
+    return (csum[window:] - csum[:-window]) / window
+
+
+def _segment_mean(values, starts, ends):
+    """Mean of values[start:end] for each segment, without a per-frame loop"""
+    import numpy as np
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    return (csum[ends] - csum[starts]) / np.maximum(1, ends - starts)
+
+
+def count_reps(knee_angles, hip_angles=None, fps=30.0, names=('knee', 'hip'),
+               down_level=DOWN_LEVEL, up_level=UP_LEVEL, min_range=MIN_RANGE_DEGREES):
+    """Count reps from per-frame angles of the joint that bends (and an optional second joint).
+
+    ``knee_angles`` and ``hip_angles`` are arrays of shape (N,) or (N, 2)
+    (left, right) in degrees; other exercises pass their own primary and
+    secondary joints, named by ``names`` in the output keys. Returns a dict
+    with the rep count, per-rep depth/tempo/asymmetry and session averages;
+    asymmetry is None when the two sides are the same series.
+    """
+    import numpy as np
+    primary, secondary = names
+    sides = sides_measured(knee_angles)
+    knee = smooth(_as_sides(knee_angles), round(fps * SMOOTHING_SECONDS))
+    hip = smooth(_as_sides(hip_angles), round(fps * SMOOTHING_SECONDS)) if hip_angles is not None else None
+    n = len(knee)
+    result = {'reps': 0, 'rep_details': [], 'frames': n, 'fps': fps}
+    if n < 3:
+        return result
+
+    combined = knee.mean(axis=1)
+    top = np.percentile(combined, 95)
+    bottom = np.percentile(combined, 5)
+    span = top - bottom
+    if span < min_range:
+        return result
+
+    # Hysteresis state machine, vectorized: forward-fill the last threshold hit
+    down = combined < bottom + down_level * span
+    up = combined > bottom + up_level * span
+    frame_index = np.arange(n)
+    last_event = np.maximum.accumulate(np.where(down | up, frame_index, -1))
+    in_rep = np.where(last_event >= 0, down[np.maximum(last_event, 0)], False)
+
+    edges = np.diff(in_rep.astype(np.int8))
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+    if len(starts) == 0 or len(ends) == 0:
+        return result
+    ends = ends[ends > starts[0]]
+    starts = starts[:len(ends)]
+    if len(starts) == 0:
+        return result
+
+    # Eccentric phase starts where the lifter last left the top zone
+    last_up = np.maximum.accumulate(np.where(up, frame_index, 0))
+    descent_starts = last_up[starts]
+    bottoms = np.array([s + np.argmin(combined[s:e]) for s, e in zip(starts, ends)])
+
+    depth = combined[bottoms]
+    left_right = np.abs(knee[:, 0] - knee[:, 1])
+    asymmetry = _segment_mean(left_right, descent_starts, ends)
+    eccentric = (bottoms - descent_starts) / fps
+    concentric = (ends - bottoms) / fps
+    hip_depth = hip.mean(axis=1)[bottoms] if hip is not None else None
+
+    details = []
+    for i in range(len(starts)):
+        details.append({
+            'rep': i + 1,
+            'start_time': round(float(descent_starts[i] / fps), 2),
+            'bottom_time': round(float(bottoms[i] / fps), 2),
+            f'{primary}_depth': round(float(depth[i]), 1),
+            f'{primary}_left': round(float(knee[bottoms[i], 0]), 1),
+            f'{primary}_right': round(float(knee[bottoms[i], 1]), 1),
+            f'{secondary}_depth': round(float(hip_depth[i]), 1) if hip_depth is not None else None,
+            'eccentric_s': round(float(eccentric[i]), 2),
+            'concentric_s': round(float(concentric[i]), 2),
+            'asymmetry': round(float(asymmetry[i]), 1) if sides else None,
+        })
+
+    result.update({
+        'reps': len(details),
+        'rep_details': details,
+        f'avg_{primary}_depth': round(float(depth.mean()), 1),
+        f'avg_{secondary}_depth': round(float(hip_depth.mean()), 1) if hip_depth is not None else None,
+        'avg_eccentric_s': round(float(eccentric.mean()), 2),
+        'avg_concentric_s': round(float(concentric.mean()), 2),
+        'max_asymmetry': round(float(asymmetry.max()), 1) if sides else None,
+        'bottom_frames': bottoms.tolist(),
+    })
+    return result
+
+
+def squat_notes(rep_result):
+    """Coaching notes for a squat set"""
+    notes = []
+    if rep_result['reps'] == 0:
+        notes.append("No complete repetitions detected")
+    else:
+        notes.append(f"{rep_result['reps']} repetitions detected")
+        if (rep_result.get('avg_knee_depth') or 0) > PARALLEL_KNEE_ANGLE:
+            notes.append("Average depth above parallel")
+        if (rep_result.get('max_asymmetry') or 0) > ASYMMETRY_NOTE_DEGREES:
+            notes.append(f"Left/right knee asymmetry up to {rep_result['max_asymmetry']}°")
+        if rep_result['avg_eccentric_s'] < FAST_DESCENT_SECONDS:
+            notes.append("Fast, uncontrolled descent")
+    return notes
+
+
+def without_angles(rep_result, names=('knee', 'hip')):
+    """Blank the joint angles of a count_reps result counted on angles_from_extension.
+
+    Only the rep timing of a motion signal is real; its depths and sides are
+    the nominal mapping, so they are reported as not measured (None).
+    """
+    primary, secondary = names
+    angle_keys = (f'{primary}_depth', f'{primary}_left', f'{primary}_right', f'{secondary}_depth', 'asymmetry')
+    for rep in rep_result['rep_details']:
+        rep.update(dict.fromkeys(angle_keys))
+    if rep_result['reps']:
+        rep_result.update(dict.fromkeys((f'avg_{primary}_depth', f'avg_{secondary}_depth', 'max_asymmetry')))
+    return rep_result
+
+
+def build_analysis_data(rep_result, knee_angles, hip_angles, names=('knee', 'hip'), notes=None):
+    """Shape rep metrics into the analysis_data dict FitnessAI.get_ai_feedback expects.
+
+    Angles at the bottom of the reps go under ``<joint>_angles`` for both
+    ``names``; ``notes`` default to the squat notes.
+    """
+    import numpy as np
+    knee = _as_sides(knee_angles)
+    hip = _as_sides(hip_angles if hip_angles is not None else knee_angles)
+    bottoms = rep_result.get('bottom_frames')
+    if bottoms:
+        knee_at_bottom = knee[bottoms].mean(axis=0)
+        hip_at_bottom = hip[bottoms].mean(axis=0)
+    else:
+        knee_at_bottom = knee.min(axis=0) if len(knee) else np.zeros(2)
+        hip_at_bottom = hip.min(axis=0) if len(hip) else np.zeros(2)
+
+    return {
+        f'{names[0]}_angles': {'left': round(float(knee_at_bottom[0]), 1), 'right': round(float(knee_at_bottom[1]), 1)},
+        f'{names[1]}_angles': {'left': round(float(hip_at_bottom[0]), 1), 'right': round(float(hip_at_bottom[1]), 1)},
+        'notes': squat_notes(rep_result) if notes is None else notes,
+    }
+
+
+def angles_from_extension(extension, primary=(90.0, 175.0), secondary=(80.0, 175.0)):
+    """Rough joint angle series from a 0..1 extension signal (1 = standing).
+
+    Used when only a motion signal is available: the rep phase is real, but
+    absolute depth is a nominal mapping onto the (bottom, top) angles of the
+    two joints, a parallel squat by default.
+    """
+    import numpy as np
+    extension = np.clip(np.asarray(extension, dtype=np.float64), 0.0, 1.0)
+    knee = primary[0] + (primary[1] - primary[0]) * extension
+    hip = secondary[0] + (secondary[1] - secondary[0]) * extension
+    return knee, hip
+
+
+def _joint_angle(a, b, c):
+    """Angle at ``b`` in degrees between segments b->a and b->c, for (N, 2) point arrays"""
+    import numpy as np
+    v1 = a - b
+    v2 = c - b
+    cos = (v1 * v2).sum(axis=-1) / np.maximum(np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1), 1e-9)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def _fill_gaps(series, valid):
+    """Linearly interpolate rows where ``valid`` is False"""
+    import numpy as np
+    if valid.all() or not valid.any():
+        return series
+    frames = np.arange(len(series))
+    filled = series.copy()
+    for column in range(series.shape[1]):
+        filled[~valid, column] = np.interp(frames[~valid], frames[valid], series[valid, column])
+    return filled
+
+
+# Squat joints: the angle at the middle keypoint, from the side prefixes of these names
+SQUAT_JOINTS = (('knee', ('hip', 'knee', 'ankle')), ('hip', ('shoulder', 'hip', 'knee')))
+LEG_KEYPOINTS = ('hip', 'knee', 'ankle')
+
+
+def joint_angles(keypoints, joints, required, aspect=1.0, min_confidence=0.1):
+    """Per-frame (left, right) angles for each ``(name, (a, b, c))`` joint, measured at ``b``.
+
+    ``keypoints`` is an (N, K, 3) array of normalized (x, y, confidence) in
+    pose_engine.KEYPOINT_NAMES order and ``aspect`` the frame's width/height.
+    Frames where any ``required`` keypoint (on either side) is below
+    ``min_confidence`` are interpolated from their neighbours. Returns
+    ``(list of (N, 2) arrays in joints order, valid_fraction)``.
+    """
+    import numpy as np
+    from pose_engine import KEYPOINT_INDEX
+
+    points = np.asarray(keypoints, dtype=np.float64)[:, :, :2] * np.array([aspect, 1.0])
+    confidence = np.asarray(keypoints, dtype=np.float64)[:, :, 2]
+
+    def joint(name):
+        return points[:, KEYPOINT_INDEX[name]]
+
+    angles = [np.stack([_joint_angle(joint(f'{side}_{a}'), joint(f'{side}_{b}'), joint(f'{side}_{c}'))
+                        for side in ('left', 'right')], axis=1)
+              for _, (a, b, c) in joints]
+
+    columns = [KEYPOINT_INDEX[f'{side}_{name}'] for name in required for side in ('left', 'right')]
+    valid = np.nan_to_num(confidence[:, columns], nan=0.0).min(axis=1) >= min_confidence
+    valid_fraction = float(valid.mean()) if len(valid) else 0.0
+    return [_fill_gaps(series, valid) for series in angles], valid_fraction
+
+
+def angles_from_keypoints(keypoints, aspect=1.0, min_confidence=0.1):
+    """Per-frame (left, right) knee and hip angles from pose keypoints.
+
+    Frames where a leg keypoint is below ``min_confidence`` are
+    interpolated (see joint_angles). Returns ``(knee, hip, valid_fraction)``.
+    """
+    (knee, hip), valid_fraction = joint_angles(keypoints, SQUAT_JOINTS, LEG_KEYPOINTS, aspect, min_confidence)
+    return knee, hip, valid_fraction
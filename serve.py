@@ -0,0 +1,157 @@
+"""Production entry point: a tuned multi-process server in front of app.app.
+
+    python serve.py                 # gunicorn (gthread) when installed, else a threaded werkzeug server
+    python serve.py --print-plan    # show the worker/thread sizing and exit
+
+Unlike ``python app.py`` it runs no debugger or reloader and no Gemini model
+diagnostics; probes go to /healthz (liveness) and /readyz (readiness).
+SIGTERM drains: new uploads are shed with 503, in-flight requests and queued
+analyses finish, then the upload folder is cleaned.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '5000'))
+# 0 = size from the machine (see worker_plan)
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '0'))
+WEB_THREADS = int(os.getenv('WEB_THREADS', '0'))
+MAX_THREADS = 16
+# Share of an analysis request's wall time spent waiting on Gemini rather than on the CPU
+GEMINI_IO_SHARE = float(os.getenv('GEMINI_IO_SHARE', '0.6'))
+# Threads kept free of analyses so probes and status pages answer under load
+SPARE_THREADS = 1
+# Each /live WebSocket holds a thread for its whole session, so every session
+# slot gets a thread of its own (flask-sock missing = no live mode)
+LIVE_SESSIONS = (int(os.getenv('LIVE_MAX_SESSIONS', '8'))
+                 if importlib.util.find_spec('flask_sock') is not None else 0)
+REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', '120'))
+SHUTDOWN_TIMEOUT = int(os.getenv('SHUTDOWN_TIMEOUT', '30'))
+
+GUNICORN_AVAILABLE = importlib.util.find_spec('gunicorn') is not None
+
+
+def worker_plan(cpus=None, io_share=GEMINI_IO_SHARE):
+    """Processes, and threads per process, for this machine.
+
+    Decoding and pose work hold the GIL, so there is one process per core.
+    Each request spends ``io_share`` of its time waiting on Gemini, so a
+    process overlaps 1 / (1 - io_share) analyses to keep its core busy. On
+    top of those come a thread per live session slot and the spare threads,
+    so open WebSockets never take the threads analyses and probes need.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    io_share = min(max(io_share, 0.0), 0.95)
+    analyses = WEB_THREADS or min(MAX_THREADS, math.ceil(1 / (1 - io_share)))
+    return {
+        'cpus': cpus,
+        'io_share': io_share,
+        'workers': WEB_WORKERS or cpus,
+        'analysis_threads': analyses,
+        'live_sessions': LIVE_SESSIONS,
+        'threads': analyses + LIVE_SESSIONS + SPARE_THREADS,
+    }
+
+
+def configure(plan):
+    """Settings app.py reads at import: admission and live slots sized to the plan, warm-up off the request path"""
+    os.environ.setdefault('ADMISSION_MAX_INFLIGHT', str(plan['analysis_threads']))
+    os.environ.setdefault('LIVE_MAX_SESSIONS', str(plan['live_sessions']))
+    os.environ.setdefault('SHUTDOWN_TIMEOUT', str(SHUTDOWN_TIMEOUT))
+    os.environ.setdefault('WARM_UP_ON_START', '1')
+
+
+def run_gunicorn(plan, host, port):
+    from gunicorn.app.base import BaseApplication
+    from upload_spool import clean_upload_folder
+
+    def worker_exit(server, worker):
+        # Requests have finished by now; wait for the analyses still queued in this worker
+        from app import shutdown_gracefully
+        shutdown_gracefully(clean_uploads=False)
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': plan['workers'],
+        'threads': plan['threads'],
+        'worker_class': 'gthread',
+        'timeout': REQUEST_TIMEOUT,
+        # In-flight requests, then queued analyses (worker_exit), each get SHUTDOWN_TIMEOUT
+        'graceful_timeout': SHUTDOWN_TIMEOUT * 2,
+        'keepalive': 5,
+        # Workers share the upload folder, so only the master cleans it
+        'on_starting': lambda server: clean_upload_folder(),
+        'on_exit': lambda server: clean_upload_folder(),
+        'worker_exit': worker_exit,
+    }
+
+    class FitFormServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    FitFormServer().run()
+
+
+def run_werkzeug(plan, host, port):
+    from werkzeug.serving import make_server
+    from app import app, shutdown_gracefully
+    from upload_spool import clean_upload_folder
+
+    if plan['workers'] > 1:
+        logger.warning(f"⚠️ gunicorn is not installed: serving from one process instead of {plan['workers']}")
+    clean_upload_folder(app.config['UPLOAD_FOLDER'])
+    server = make_server(host, port, app, threaded=True)
+
+    def drain_and_stop():
+        shutdown_gracefully()
+        server.shutdown()
+
+    def on_signal(signum, frame):
+        logger.info(f"🛑 Received signal {signum}")
+        threading.Thread(target=drain_and_stop, name='shutdown', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--print-plan', action='store_true', help='print the worker/thread sizing and exit')
+    args = parser.parse_args()
+
+    plan = worker_plan()
+    if args.print_plan:
+        print(json.dumps(plan, indent=2))
+        return
+    configure(plan)
+
+    from observability import configure_logging
+    configure_logging()
+    server = 'gunicorn' if GUNICORN_AVAILABLE else 'werkzeug'
+    logger.info(f"🏭 Serving on {args.host}:{args.port} with {server}: {plan['workers']} worker(s) x "
+                f"{plan['threads']} thread(s) ({plan['analysis_threads']} analyses, {plan['live_sessions']} live), "
+                f"{plan['cpus']} CPU(s), Gemini I/O share {plan['io_share']}")
+    if GUNICORN_AVAILABLE:
+        run_gunicorn(plan, args.host, args.port)
+    else:
+        run_werkzeug(plan, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, ServiceUnavailable
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = '/tmp/uploads'
+
+# Total bytes all in-flight uploads may occupy in the upload folder, and the
+# free space that must remain on the volume after reserving one.
+SPOOL_BUDGET_BYTES = int(os.getenv('UPLOAD_SPOOL_BUDGET_MB', '512')) * 1024 * 1024
+MIN_FREE_DISK_BYTES = int(os.getenv('UPLOAD_MIN_FREE_DISK_MB', '64')) * 1024 * 1024
+SPOOL_RETRY_AFTER = 5
+
+
+class SpoolBudget:
+    """Process-wide accounting of upload bytes spooled to disk.
+
+    A file is charged what was reserved for it up front (a blob of known
+    size) and then, as it is written, whatever it grows beyond that, so a
+    multipart body with several files is charged its real bytes once.
+    """
+
+    def __init__(self, limit=SPOOL_BUDGET_BYTES):
+        self.limit = limit
+        self.in_use = 0
+        self.rejected = 0
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, path, size, folder):
+        with self._lock:
+            self._check(size, folder)
+            self._reserved[path] = size
+            self.in_use += size
+
+    def grow(self, path, size):
+        """Charge ``path`` for having ``size`` bytes written, beyond what it already holds"""
+        with self._lock:
+            extra = size - self._reserved.get(path, 0)
+            if extra <= 0:
+                return
+            self._check(extra, os.path.dirname(path))
+            self._reserved[path] = size
+            self.in_use += extra
+
+    def _check(self, size, folder):
+        try:
+            free = shutil.disk_usage(folder).free
+        except OSError:
+            free = None
+        if self.in_use + size > self.limit or (free is not None and free - size < MIN_FREE_DISK_BYTES):
+            self.rejected += 1
+            raise ServiceUnavailable("Upload storage is busy, please retry shortly",
+                                     retry_after=SPOOL_RETRY_AFTER)
+
+    def release(self, path):
+        with self._lock:
+            self.in_use -= self._reserved.pop(path, 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'spooled_mb': round(self.in_use / (1024 * 1024), 1),
+                'limit_mb': round(self.limit / (1024 * 1024), 1),
+                'active_uploads': len(self._reserved),
+                'rejected': self.rejected,
+            }
+
+
+spool_budget = SpoolBudget()
+
+
+class UploadSpool(io.FileIO):
+    """Upload file part written straight to its final path in the upload folder.
+
+    Each chunk from the multipart parser is hashed and size-checked as it
+    arrives, so the request body is written to disk exactly once and never
+    re-read before decoding. Unless the upload is claimed, closing the spool
+    deletes it, so aborted requests do not leak files.
+    """
+
+    def __init__(self, path, max_size):
+        super().__init__(path, 'w+b')
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+        self.claimed = False
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        spool_budget.grow(self.path, self.size)
+        self._digest.update(data)
+        return super().write(data)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def restart(self):
+        """Drop everything written so far, for a download that starts over"""
+        self.seek(0)
+        self.truncate()
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    def claim(self):
+        """Hand ownership of the file to the caller; it must call discard_upload()"""
+        self.claimed = True
+        return self.path, self.size, self.sha256
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            if not self.claimed:
+                discard_upload(self.path)
+
+
+def discard_upload(path):
+    """Delete a spooled upload and return its bytes to the budget"""
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    finally:
+        spool_budget.release(path)
+
+
+def clean_upload_folder(folder=UPLOAD_FOLDER):
+    """Delete every file left in the upload folder; only safe once no server process is using it"""
+    removed = 0
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            if os.path.isfile(path) or os.path.islink(path):
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            logger.warning(f"⚠️ Could not remove {path}: {e}")
+    if removed:
+        logger.info(f"🧹 Removed {removed} leftover upload(s) from {folder}")
+    return removed
+
+
+class StreamingRequest(Request):
+    """Flask request that spools file uploads directly into the upload folder"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        folder = current_app.config['UPLOAD_FOLDER']
+        name = secure_filename(filename or '') or 'upload'
+        path = os.path.join(folder, f"{uuid.uuid4().hex}_{name}")
+        # Parts rarely declare their own length and the request total covers
+        # every part, so the spool is charged as it is written
+        spool_budget.reserve(path, content_length or 0, folder)
+        try:
+            return UploadSpool(path, current_app.config.get('MAX_CONTENT_LENGTH'))
+        except Exception:
+            spool_budget.release(path)
+            raise
@@ -0,0 +1,563 @@
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# OpenCV and NumPy are imported on first use to keep them off the cold-start
+# path; availability is checked without importing. Builds without OpenCV
+# fall back to file-size estimates.
+cv2 = None
+np = None
+VIDEO_ENGINE_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('cv2', 'numpy'))
+_load_lock = threading.Lock()
+
+
+def load_video_libs():
+    """Import OpenCV and NumPy into this module"""
+    global cv2, np
+    if cv2 is None:
+        with _load_lock:
+            if cv2 is None:
+                import numpy
+                import cv2 as opencv
+                np = numpy
+                cv2 = opencv
+
+
+# Sampling defaults (overridable through the environment)
+DEFAULT_FRAME_STRIDE = int(os.getenv('ANALYSIS_FRAME_STRIDE', '0'))  # 0 = auto from max samples
+DEFAULT_MAX_SAMPLES = int(os.getenv('ANALYSIS_MAX_SAMPLES', '240'))
+DEFAULT_ANALYSIS_WIDTH = int(os.getenv('ANALYSIS_FRAME_WIDTH', '160'))
+DEFAULT_TIME_BUDGET = float(os.getenv('ANALYSIS_TIME_BUDGET', '20'))
+# Headerless streams are walked to count their frames for at most this long;
+# a longer clip is analyzed up to where the walk stopped
+STREAM_SCAN_SECONDS = float(os.getenv('ANALYSIS_SCAN_SECONDS', '5'))
+
+# Analysis proxy: what the analysis actually needs, advertised to clients so
+# they can downscale/trim before upload, and built server-side otherwise
+PROXY_MODE = os.getenv('ANALYSIS_PROXY', 'auto').lower()  # auto | off
+PROXY_WIDTH = int(os.getenv('ANALYSIS_PROXY_WIDTH', '320'))
+PROXY_FPS = float(os.getenv('ANALYSIS_PROXY_FPS', '15'))
+PROXY_MAX_SECONDS = float(os.getenv('ANALYSIS_MAX_SECONDS', '60'))
+# Only transcode when the upload exceeds the spec by this factor and is big
+# enough that freeing it early is worth the extra encode (~20% of a decode)
+PROXY_TRIGGER = 1.5
+# Share of the analysis deadline the transcode may use; decoding the proxy gets the rest
+PROXY_BUDGET_SHARE = 0.75
+PROXY_MIN_BYTES = int(float(os.getenv('ANALYSIS_PROXY_MIN_MB', '20')) * 1024 * 1024)
+
+# Strides at or below this are cheaper to walk with grab() than to seek,
+# since a seek decodes forward from the previous keyframe anyway.
+SEEK_STRIDE_THRESHOLD = 12
+
+# Container frame rates above this are timebases, not real frame rates
+MAX_PLAUSIBLE_FPS = 240
+
+# The motion fallback only counts reps when the frames really move (RMS change
+# in gray levels) and one component explains a good share of it; sensor noise
+# and static clips spread their variance evenly over every frame
+MIN_MOTION_ENERGY = float(os.getenv('ANALYSIS_MIN_MOTION_ENERGY', '1.5'))
+MIN_EXPLAINED_VARIANCE = float(os.getenv('ANALYSIS_MIN_EXPLAINED_VARIANCE', '0.1'))
+# Keypoint angles must move smoothly from frame to frame (1 = smooth, 0 = noise)
+MIN_ANGLE_COHERENCE = 0.5
+
+
+def analysis_deadline(budget=None):
+    """time.perf_counter() value by which probing, proxying and decoding one clip must be done"""
+    return time.perf_counter() + (DEFAULT_TIME_BUDGET if budget is None else budget)
+
+
+class VideoInfo:
+    """Container metadata read from the stream header"""
+
+    def __init__(self, frame_count, fps, width, height):
+        self.frame_count = frame_count
+        self.fps = fps
+        self.width = width
+        self.height = height
+
+    @property
+    def duration(self):
+        return self.frame_count / self.fps if self.fps > 0 else 0.0
+
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}"
+
+
+class FrameSampler:
+    """Strided frame decoder with reusable frame buffers.
+
+    Only every ``stride``-th frame is decoded; large strides seek directly to
+    the target frame. Decoded frames land in a preallocated BGR buffer and are
+    downscaled to grayscale into a preallocated sample stack, so a sampler
+    reused across requests does not allocate per frame.
+    """
+
+    def __init__(self, stride=None, max_samples=None, analysis_width=None, time_budget=None):
+        load_video_libs()
+        self.stride = DEFAULT_FRAME_STRIDE if stride is None else stride
+        self.max_samples = max_samples or DEFAULT_MAX_SAMPLES
+        self.analysis_width = analysis_width or DEFAULT_ANALYSIS_WIDTH
+        self.time_budget = DEFAULT_TIME_BUDGET if time_budget is None else time_budget
+        self._frame = None
+        self._gray = None
+        self._stack = None
+
+    @staticmethod
+    def probe(video_path, deadline=None):
+        """Read frame count, fps and resolution without decoding (headerless streams are scanned until ``deadline``)"""
+        load_video_libs()
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video: {os.path.basename(video_path)}")
+            return _read_info(cap, video_path, deadline)
+        finally:
+            cap.release()
+
+    def effective_stride(self, info):
+        """Configured stride, widened so the sample count stays within max_samples"""
+        min_stride = max(1, -(-info.frame_count // self.max_samples))
+        return max(self.stride or 1, min_stride)
+
+    def _buffers(self, info):
+        """Return (frame, gray, stack) buffers, reallocating only when the shape changes"""
+        frame_shape = (info.height, info.width, 3)
+        if self._frame is None or self._frame.shape != frame_shape:
+            self._frame = np.empty(frame_shape, dtype=np.uint8)
+            self._gray = np.empty(frame_shape[:2], dtype=np.uint8)
+
+        analysis_height = max(1, round(info.height * self.analysis_width / max(1, info.width)))
+        stack_shape = (self.max_samples, analysis_height, self.analysis_width)
+        if self._stack is None or self._stack.shape != stack_shape:
+            self._stack = np.empty(stack_shape, dtype=np.uint8)
+        return self._frame, self._gray, self._stack
+
+    def plan(self, info):
+        """Return ``(stride, indices)`` of the frames ``sample`` would decode"""
+        stride = self.effective_stride(info)
+        return stride, np.arange(0, info.frame_count, stride, dtype=np.int64)[:self.max_samples]
+
+    def sample(self, video_path, info=None, deadline=None):
+        """Decode the strided frames of a video.
+
+        Returns ``(info, stride, indices, frames)`` where ``frames`` is a view
+        into the reusable sample stack; copy it if it must outlive the next call.
+        ``info`` from an earlier probe skips reading the header again, and
+        decoding stops at ``deadline`` (default: the sampler's time budget).
+        """
+        deadline = deadline or analysis_deadline(self.time_budget)
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video: {os.path.basename(video_path)}")
+            info = info or _read_info(cap, video_path, deadline)
+            stride, targets = self.plan(info)
+            indices, frames = self._decode(cap, info, targets, deadline)
+            return info, stride, indices, frames
+        finally:
+            cap.release()
+
+    def decode(self, video_path, info, targets, deadline=None):
+        """Decode only the given ascending frame indices (at most ``max_samples``).
+
+        Returns ``(indices, frames)``; fewer frames come back if the stream ends
+        early or ``deadline`` (default: the sampler's time budget) passes.
+        """
+        deadline = deadline or analysis_deadline(self.time_budget)
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video: {os.path.basename(video_path)}")
+            return self._decode(cap, info, targets[:self.max_samples], deadline)
+        finally:
+            cap.release()
+
+    def _decode(self, cap, info, targets, deadline):
+        frame, gray, stack = self._buffers(info)
+        dsize = (stack.shape[2], stack.shape[1])
+
+        indices = np.empty(len(targets), dtype=np.int64)
+        count = 0
+        position = 0
+        for target in targets:
+            target = int(target)
+            if time.perf_counter() > deadline:
+                logger.warning(f"⏱️ Frame sampling hit time budget after {count} frames")
+                break
+
+            if target != position:
+                if target - position > SEEK_STRIDE_THRESHOLD or target < position:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                else:
+                    for _ in range(target - position):
+                        cap.grab()
+            ok, _ = cap.read(frame)
+            if not ok:
+                break
+            position = target + 1
+
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            cv2.resize(gray, dsize, dst=stack[count], interpolation=cv2.INTER_AREA)
+            indices[count] = target
+            count += 1
+
+        return indices[:count], stack[:count]
+
+
+def motion_extension_signal(frames):
+    """Per-frame extension estimate in [0, 1] from the dominant motion component, or None.
+
+    Projects the sampled frames onto their first principal component, which for
+    a static camera filming one lifter tracks the up/down phase of each rep.
+    Oriented so the clip's first frame (assumed standing) is near 1. Returns
+    None when there is no dominant motion: too little change between frames,
+    or a first component that explains no more than noise would.
+    """
+    load_video_libs()
+    n = len(frames)
+    if n < 3:
+        return None
+
+    data = frames.reshape(n, -1).astype(np.float32)
+    data -= data.mean(axis=0)
+    energy = float(np.sqrt(np.mean(np.square(data))))
+    # Gram matrix is n x n, far smaller than pixels x pixels
+    gram = data @ data.T
+    values, vectors = np.linalg.eigh(gram)
+    explained = float(values[-1] / values.sum()) if values.sum() > 0 else 0.0
+    if energy < MIN_MOTION_ENERGY or explained < max(MIN_EXPLAINED_VARIANCE, 3.0 / n):
+        logger.info(f"🫥 No dominant motion (energy {energy:.1f}, first component {explained:.0%})")
+        return None
+
+    score = vectors[:, -1]
+    extension = (score - score.min()) / (score.max() - score.min())
+    head = extension[:max(1, n // 20)].mean()
+    if head < 0.5:
+        extension = 1.0 - extension
+    return extension.astype(np.float32)
+
+
+def temporal_coherence(series):
+    """1 minus the von Neumann ratio of a series: near 1 when it moves smoothly, near 0 for noise"""
+    centered = series - series.mean()
+    total = float(np.square(centered).sum())
+    if total <= 1e-9:
+        return 1.0
+    return 1.0 - float(np.square(np.diff(centered)).sum()) / (2.0 * total)
+
+
+def _read_info(cap, video_path=None, deadline=None):
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = float(cap.get(cv2.CAP_PROP_FPS)) or 30.0
+    if video_path and (frame_count <= 0 or fps > MAX_PLAUSIBLE_FPS):
+        # Browser-recorded WebM (MediaRecorder) has no duration in its header and
+        # reports its timebase as the frame rate, so read both off the stream
+        frame_count, seconds = _scan_stream(video_path, deadline)
+        if frame_count > 1 and seconds > 0:
+            fps = (frame_count - 1) / seconds
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if frame_count <= 0 or width <= 0 or height <= 0:
+        raise ValueError("Video stream has no readable frames")
+    return VideoInfo(frame_count, fps, width, height)
+
+
+def _scan_stream(video_path, deadline=None):
+    """Frame count and timestamp of the last frame (seconds), by walking the stream.
+
+    The walk stops after STREAM_SCAN_SECONDS or at ``deadline``, whichever
+    comes first; the frames counted so far are then all that is analyzed.
+    """
+    stop = time.perf_counter() + STREAM_SCAN_SECONDS
+    if deadline is not None:
+        stop = min(stop, deadline)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        count, last_ms = 0, 0.0
+        while cap.grab():
+            count += 1
+            last_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            if time.perf_counter() > stop:
+                logger.warning(f"⏱️ Stream scan stopped after {count} frames ({last_ms / 1000.0:.1f}s of video)")
+                break
+        return count, last_ms / 1000.0
+    finally:
+        cap.release()
+
+
+NO_MOTION_NOTE = "No dominant motion detected"
+
+# Share of sampled frames with an exercise's keypoints confidently visible needed to trust the pose stage
+MIN_POSE_COVERAGE = 0.6
+
+
+class ClipSignals:
+    """The expensive per-clip work, done at most once and shared by every exercise analyzer.
+
+    ``keypoints()`` runs the pose stage (decode + inference, cached per
+    ``video_hash``) and ``motion()`` the motion fallback, which reuses the
+    pose stage's frames when it decoded all of them; each happens on first
+    request only. Both share the clip's ``info`` (probed once) and one
+    decode ``deadline``.
+    """
+
+    def __init__(self, video_path, sampler, video_hash=None, info=None, deadline=None):
+        self.video_path = video_path
+        self.sampler = sampler
+        self.video_hash = video_hash
+        self.info = info
+        self.deadline = deadline or analysis_deadline(sampler.time_budget)
+        self._keypoints = None
+        self._motion = None
+        self._frames = None
+
+    def keypoints(self):
+        """``(info, stride, indices, keypoints, stats)``, or None without a working pose stage"""
+        from pose_engine import extract_keypoints, get_pose_backend
+
+        if self._keypoints is None:
+            self._keypoints = False
+            if get_pose_backend() is not None:
+                try:
+                    self.info = self.info or self.sampler.probe(self.video_path, self.deadline)
+                    self._keypoints = extract_keypoints(self.video_path, self.video_hash, self.sampler,
+                                                        on_decoded=self._keep_frames, info=self.info,
+                                                        deadline=self.deadline)
+                except Exception as e:
+                    logger.warning(f"⚠️ Pose stage failed, using motion signal: {e}")
+        return self._keypoints or None
+
+    @property
+    def pose_stats(self):
+        return self._keypoints[4] if self._keypoints else None
+
+    def _keep_frames(self, indices, frames):
+        # The sample stack is reused by the next decode, so keep a copy (a few MB)
+        self._frames = (indices, frames.copy())
+
+    def motion(self):
+        """``(info, stride, indices, extension)`` from the dominant motion in the sampled frames (extension None without one)"""
+        if self._motion is None:
+            if self._keypoints and self._keypoints[4]['reused'] == 0 and self._frames is not None:
+                info, stride = self._keypoints[:2]
+                indices, frames = self._frames
+            else:
+                info, stride, indices, frames = self.sampler.sample(self.video_path, self.info, self.deadline)
+            self._motion = (info, stride, indices, motion_extension_signal(frames))
+            self._frames = None
+        return self._motion
+
+
+def _measure_exercise(exercise, signals):
+    """Reps and analysis_data for one exercise from the shared clip signals"""
+    from pose_engine import keypoint_aspect
+
+    primary = None
+    extracted = signals.keypoints()
+    if extracted is not None:
+        info, stride, indices, keypoints, _ = extracted
+        primary, secondary, coverage = exercise.angles(keypoints, keypoint_aspect(info))
+        combined = primary.mean(axis=1)
+        if (coverage < MIN_POSE_COVERAGE or np.ptp(combined) < exercise.min_range
+                or temporal_coherence(combined) < MIN_ANGLE_COHERENCE):
+            logger.info(f"🦴 Pose signal too weak for {exercise.name} (coverage {coverage:.0%}), using motion signal")
+            primary = None
+    angle_source = 'keypoints'
+    if primary is None:
+        angle_source = 'motion'
+        info, stride, indices, extension = signals.motion()
+        if extension is None:
+            # Nothing to count: no reps, and no angles made up for them
+            return (info, stride, indices), {
+                'exercise': exercise.name,
+                'reps_detected': 0,
+                'squats_detected': 0,
+                'rep_details': [],
+                'analysis_data': {'exercise': exercise.name, 'notes': [NO_MOTION_NOTE]},
+                'angle_source': 'none',
+            }
+        primary, secondary = exercise.angles_from_extension(extension)
+
+    # Motion-signal angles only time the reps; their depth and sides are nominal
+    measured = angle_source == 'keypoints'
+    reps = exercise.count_reps(primary, secondary, fps=info.fps / stride, angles_measured=measured)
+    logger.info(f"🏋️ {exercise.name.capitalize()} reps counted: {reps['reps']} ({angle_source})")
+    return (info, stride, indices), {
+        'exercise': exercise.name,
+        'reps_detected': reps['reps'],
+        'squats_detected': reps['reps'],  # Legacy name, kept for existing clients
+        'rep_details': reps['rep_details'],
+        'analysis_data': (exercise.analysis_data(reps, primary, secondary) if measured
+                          else exercise.analysis_data(reps)),
+        'angle_source': angle_source,
+    }
+
+
+def measure_video(video_path, sampler=None, video_hash=None, exercises=None, info=None, deadline=None):
+    """Decode a strided sample of the clip once and count reps for each exercise; raises if it cannot be decoded.
+
+    Joint angles come from the pose keypoint stage when it is enabled and
+    finds the lifter (keypoints are cached per ``video_hash``); otherwise
+    from the dominant motion in the sampled frames. Either is computed once
+    and shared by all ``exercises`` (names, default: the default exercise).
+    The result describes the first exercise; when several are asked for,
+    ``exercises`` maps each name to its own reps and analysis_data. ``info``
+    from make_analysis_proxy saves probing the clip again, and decoding
+    stops at ``deadline`` (default: the sampler's time budget from now).
+    """
+    from exercises import resolve_exercises
+
+    file_size = os.path.getsize(video_path)
+    signals = ClipSignals(video_path, sampler or get_sampler(), video_hash, info, deadline)
+    measured = {}
+    sampled = None
+    for exercise in resolve_exercises(exercises):
+        exercise_sampled, measured[exercise.name] = _measure_exercise(exercise, signals)
+        sampled = sampled or exercise_sampled
+    info, stride, indices = sampled
+    logger.info(f"🎞️ Sampled {len(indices)}/{info.frame_count} frames (stride {stride}) at {info.resolution}")
+
+    result = dict(next(iter(measured.values())))
+    result.update({
+        'frames_processed': len(indices),
+        'total_frames': info.frame_count,
+        'duration': info.duration,
+        'fps': info.fps,
+        'resolution': info.resolution,
+        'frame_stride': stride,
+        'file_size': file_size,
+        'keypoint_stats': signals.pose_stats,
+        'success': True
+    })
+    if len(measured) > 1:
+        result['exercises'] = measured
+    return result
+
+
+def analysis_spec():
+    """Resolution, frame rate and length the analysis needs (clients may send no more)"""
+    return {
+        'max_width': PROXY_WIDTH,
+        'fps': PROXY_FPS,
+        'max_duration_s': PROXY_MAX_SECONDS,
+        'max_samples': DEFAULT_MAX_SAMPLES,
+        'accepted_types': ['video/mp4', 'video/webm', 'video/quicktime', 'video/x-matroska', 'video/x-msvideo'],
+    }
+
+
+def needs_proxy(info, file_size=None):
+    if PROXY_MODE == 'off' or (file_size is not None and file_size < PROXY_MIN_BYTES):
+        return False
+    return (info.width > PROXY_WIDTH * PROXY_TRIGGER
+            or info.fps > PROXY_FPS * PROXY_TRIGGER
+            or info.duration > PROXY_MAX_SECONDS)
+
+
+def make_analysis_proxy(video_path, info=None, deadline=None):
+    """Transcode an oversized clip to a small MJPEG proxy matching ``analysis_spec()``.
+
+    Walks the source once at the proxy frame rate, or coarser when the
+    sampler would read fewer frames anyway (grab() or a seek for skipped
+    frames, so they are never converted to BGR), scales each kept frame
+    straight to the proxy width and stops at PROXY_MAX_SECONDS. Probing and
+    transcoding are charged to the analysis ``deadline``, of which the
+    transcode uses at most PROXY_BUDGET_SHARE. Returns ``(proxy_path,
+    source_info, covered_frames)``, where ``covered_frames`` is how many of the
+    original's frames the proxy spans (fewer than ``source_info.frame_count``
+    when it stopped at PROXY_MAX_SECONDS or the time budget), or ``(None,
+    source_info, None)`` when the clip is already within spec or the proxy
+    could not be written; measure_video can reuse ``source_info`` for the
+    original.
+    """
+    load_video_libs()
+    deadline = deadline or analysis_deadline()
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {os.path.basename(video_path)}")
+        info = info or _read_info(cap, video_path, deadline)
+        if not needs_proxy(info, os.path.getsize(video_path)):
+            return None, info, None
+
+        started = time.perf_counter()
+        stop = started + max(0.0, deadline - started) * PROXY_BUDGET_SHARE
+        last_frame = min(info.frame_count, int(PROXY_MAX_SECONDS * info.fps))
+        # Never keep more frames than the sampler would read from the original
+        step = max(1, int(round(info.fps / PROXY_FPS)), -(-last_frame // DEFAULT_MAX_SAMPLES))
+        width = min(PROXY_WIDTH, info.width)
+        height = max(2, int(round(info.height * width / info.width / 2)) * 2)
+
+        proxy_path = f"{os.path.splitext(video_path)[0]}.proxy.avi"
+        writer = cv2.VideoWriter(proxy_path, cv2.VideoWriter_fourcc(*'MJPG'), info.fps / step, (width, height))
+        if not writer.isOpened():
+            logger.warning("⚠️ Could not open proxy writer, analyzing the original")
+            return None, info, None
+
+        frame = np.empty((info.height, info.width, 3), dtype=np.uint8)
+        small = np.empty((height, width, 3), dtype=np.uint8)
+        # Big reductions: a cheap bilinear step to twice the proxy size, then
+        # INTER_AREA for the last 2x (about 3x faster than INTER_AREA from 4K/1080p)
+        halfway = np.empty((height * 2, width * 2, 3), dtype=np.uint8) if info.width > width * 2 else None
+        written = 0
+        position = 0
+        try:
+            for target in range(0, last_frame, step):
+                if target != position:
+                    if target - position > SEEK_STRIDE_THRESHOLD:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    else:
+                        for _ in range(target - position):
+                            cap.grab()
+                ok, _ = cap.read(frame)
+                if not ok:
+                    break
+                position = target + 1
+                if halfway is not None:
+                    cv2.resize(frame, (width * 2, height * 2), dst=halfway, interpolation=cv2.INTER_LINEAR)
+                    cv2.resize(halfway, (width, height), dst=small, interpolation=cv2.INTER_AREA)
+                else:
+                    cv2.resize(frame, (width, height), dst=small, interpolation=cv2.INTER_AREA)
+                writer.write(small)
+                written += 1
+                if time.perf_counter() > stop:
+                    logger.warning(f"⏱️ Proxy transcode hit time budget after {written} frames")
+                    break
+        finally:
+            writer.release()
+
+        if written < 3:
+            _remove_quietly(proxy_path)
+            return None, info, None
+        # Each kept frame stands for the ``step`` source frames up to the next one
+        covered = min(last_frame, position - 1 + step)
+        logger.info(f"🗜️ Analysis proxy: {info.resolution}@{info.fps:.0f}fps -> {width}x{height}@{info.fps / step:.0f}fps, "
+                    f"{written} frames in {time.perf_counter() - started:.2f}s")
+        if covered < info.frame_count:
+            logger.warning(f"✂️ Analysis proxy covers {covered / info.fps:.1f}s of {info.duration:.1f}s")
+        return proxy_path, info, covered
+    finally:
+        cap.release()
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_local = threading.local()
+
+
+def get_sampler():
+    """Per-thread sampler so frame buffers are reused across requests"""
+    sampler = getattr(_local, 'sampler', None)
+    if sampler is None:
+        sampler = FrameSampler()
+        _local.sampler = sampler
+    return sampler